@@ -0,0 +1,185 @@
+'''
+BatchRunner.py
+
+Created on: 19.10.2026
+    Author: SeaPlusPro
+   License: CC0 1.0 Universal
+'''
+import os
+import io
+import sys
+import json
+import time
+import shlex
+import socket
+import contextlib
+from Builder import Builder, CLIError, GlobalOptions
+
+
+class BatchRunner (Builder):
+    '''Executes many form2linux commands in one process: from a file, stdin or a local UNIX socket.
+    '''
+
+    def __init__(self, options: GlobalOptions, execute):
+        '''Constructor.
+        @param options: the global options
+        @param execute: the function executing one command: execute(argv) -> exit code, e.g. form2linux.main
+        '''
+        Builder.__init__(self, False, options)
+        self._execute = execute
+
+    def _handleConnection(self, connection) -> bool:
+        '''Executes the commands sent over one connection of the server.
+        Each command is one line. Each result is one line with a Json object.
+        @param connection: the accepted socket
+        @return: False: the server should stop ("shutdown" was sent)
+        '''
+        rc = True
+        # the own buffered messages must not be sent to the client:
+        self.flush()
+        # separate streams: a write into a 'rw' text stream would drop the read ahead lines
+        with connection, connection.makefile('r', encoding='utf-8') as reader, \
+                connection.makefile('w', encoding='utf-8') as writer:
+            for line in reader:
+                line = line.strip()
+                if line == 'shutdown':
+                    rc = False
+                    break
+                if line == '' or line.startswith('#'):
+                    continue
+                output = io.StringIO()
+                with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+                    exitCode, duration = self.runCommand(line)
+                writer.write(json.dumps({'Command': line, 'ExitCode': exitCode, 'Duration': round(duration, 6),
+                                         'Output': output.getvalue()}) + '\n')
+                writer.flush()
+        return rc
+
+    def argumentsOf(self, command) -> list:
+        '''Converts a command into an argument vector.
+        @param command: a command line (shell syntax) or a list of arguments.
+            A leading program name ("form2linux") is optional
+        @return: the argument vector: the program name followed by the arguments
+        '''
+        args = shlex.split(command, comments=True) if isinstance(command, str) else [str(item) for item in command]
+        if args and os.path.basename(args[0]) in ('form2linux', 'form2linux.py'):
+            args = args[1:]
+        if args and args[0] == 'batch':
+            raise CLIError('nested batch commands are not allowed')
+        return ['form2linux'] + self.globalArguments() + args
+
+    def commandsOf(self, text: str) -> list:
+        '''Returns the commands of a batch source.
+        @param text: a Json list of commands (strings or lists of arguments) or command lines (one per line)
+        @return: the list of commands (strings or lists)
+        '''
+        if text.lstrip().startswith('['):
+            rc = json.loads(text)
+            if not isinstance(rc, list) or any(not isinstance(item, (str, list)) for item in rc):
+                raise CLIError('the Json batch must be a list of strings or lists')
+        else:
+            rc = [line for line in text.split('\n') if line.strip() != '' and not line.lstrip().startswith('#')]
+        return rc
+
+    def globalArguments(self) -> list:
+        '''Returns the global options of the batch as arguments: they are valid for each command of the batch,
+        e.g. "form2linux -y batch ..." executes all commands in dry mode.
+        @return: the list of arguments, e.g. ['-y', '-v']
+        '''
+        options = self._options
+        rc = ['-v'] * (options.verbose or 0)
+        if options.dry:
+            rc.append('-y')
+        # see main(): no option -n/-R: needsRoot is False, -n: None
+        if options.needsRoot is None:
+            rc.append('-n')
+        elif options.needsRoot:
+            rc.append('-R')
+        if options.plan is not None:
+            rc.append(f'--plan={options.plan}')
+        if options.converge:
+            rc.append('--converge')
+        if options.jobs != 1:
+            rc.append(f'--jobs={options.jobs}')
+        if options.logJson:
+            rc.append('--log-json')
+        return rc
+
+    def run(self, source: str, stopOnError: bool=False, resultFile: str=None) -> int:
+        '''Executes the commands of a file.
+        @param source: the file with the commands, '-' for stdin
+        @param stopOnError: True: the execution stops after the first failing command
+        @param resultFile: None or a file where the results are stored as Json
+        @return: the number of failed commands
+        '''
+        if source == '-':
+            text = sys.stdin.read()
+        else:
+            with open(source, 'r', encoding='utf-8') as fp:
+                text = fp.read()
+        results = []
+        failed = 0
+        start = time.perf_counter()
+        for command in self.commandsOf(text):
+            exitCode, duration = self.runCommand(command)
+            description = command if isinstance(command, str) else shlex.join(command)
+            self.log(f'# exit code {exitCode} in {duration:.3f} sec: {description}')
+            results.append({'Command': description, 'ExitCode': exitCode, 'Duration': round(duration, 6)})
+            if exitCode != 0:
+                failed += 1
+                if stopOnError:
+                    break
+        self.log(f'# {len(results)} command(s), {failed} failed in {time.perf_counter() - start:.3f} sec')
+        self.flush()
+        if resultFile is not None:
+            with open(resultFile, 'w', encoding='utf-8') as fp:
+                json.dump({'Results': results}, fp, indent=1)
+        return failed
+
+    def runCommand(self, command):
+        '''Executes one command.
+        @param command: a command line or a list of arguments, e.g. ['service', 'check', 'x.json']
+        @return: a tuple (exitCode, duration): exitCode: 0: success 1: error of the command (CLIError)
+            2: other errors duration: the execution time in seconds
+        '''
+        start = time.perf_counter()
+        try:
+            exitCode = self._execute(self.argumentsOf(command))
+        except SystemExit as exc:
+            # argparse: --help or wrong arguments
+            exitCode = exc.code if isinstance(exc.code, int) else 2
+        except CLIError as exc:
+            self.error(str(exc))
+            exitCode = 1
+        # pylint: disable-next=broad-exception-caught
+        except Exception as exc:
+            self.error(f'{command}: {exc}')
+            exitCode = 2
+        return exitCode, time.perf_counter() - start
+
+    def serve(self, socketFile: str):
+        '''Executes the commands sent over a local UNIX socket until "shutdown" is sent.
+        Only the owner of the process can connect (file mode 0600).
+        The commands are executed one after the other: the output of each command is sent back.
+        @param socketFile: the path of the socket
+        '''
+        if os.path.exists(socketFile):
+            os.unlink(socketFile)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+            oldMask = os.umask(0o177)
+            try:
+                server.bind(socketFile)
+            finally:
+                os.umask(oldMask)
+            server.listen()
+            self.log(f'# listening on {socketFile}')
+            self.flush()
+            try:
+                while True:
+                    connection, _ = server.accept()
+                    if not self._handleConnection(connection):
+                        break
+            finally:
+                os.unlink(socketFile)
+        self.log('# server stopped')
+        self.flush()
@@ -6,19 +6,26 @@ Created on: 20.08.2023
    License: CC0 1.0 Universal
 '''
 import re
+import json
 import os.path
 import shutil
 import fnmatch
 import subprocess
 import time
+import contextlib
+import collections
+import concurrent.futures
 from typing import Sequence
 from text import JsonUtils
 from base import Const
-from base import MemoryLogger
+from base import StructuredLogger
 from base import ProcessHelper
 from base import StringUtils
 from base import FileHelper
-from text import TextProcessor
+from base import Plan
+from base import Fingerprints
+from base import DpkgStatus
+from base import Profiler
 
 
 class CLIError(Exception):
@@ -39,15 +46,24 @@ class GlobalOptions:
     '''Stores the global program arguments.
     '''
 
-    def __init__(self, verbose: bool, dry: bool, needsRoot: bool):
+    def __init__(self, verbose: bool, dry: bool, needsRoot: bool, plan: str=None, jobs: int=1,
+                 converge: bool=False, logJson: bool=False):
         '''Constructor.
         @param verbose: True: show info messages
         @param dry: say what to do but do not
         @param needsRoot: the task need root rights
+        @param plan: None or the file where the execution plan is stored instead of executing it
+        @param jobs: the maximal number of operations of a plan executed in parallel
+        @param converge: True: operations whose target already has the wanted state are skipped
+        @param logJson: True: the messages are written as Json lines
         '''
         self.verbose = verbose
         self.dry = dry
         self.needsRoot = needsRoot
+        self.plan = plan
+        self.jobs = jobs
+        self.converge = converge
+        self.logJson = logJson
 
 
 class BuilderStatus:
@@ -102,7 +118,10 @@ class Builder:
         self._files = {}
         self._links = {}
         self._baseDirectory = ''
-        self._logger = MemoryLogger.MemoryLogger(Const.LEVEL_DETAIL)
+        self._plan = None
+        self._planDepth = 0
+        self._dpkgStatusFile = DpkgStatus.STATUS_FILE
+        self._logger = StructuredLogger.StructuredLogger(Const.LEVEL_DETAIL, jsonLines=options.logJson)
         BuilderStatus.setLogger(self._logger)
         self._processHelper = ProcessHelper.ProcessHelper.__init__(
             self, self._logger)
@@ -129,15 +148,20 @@ class Builder:
         @param rules: the list of rules: NAME|VALUE or NAME|VALUE|ANCHOR
         @param needsRoot: <em>True</em>: file access needs root access
         '''
+        # imported on demand: TextProcessor is big and only needed here
+        # pylint: disable-next=import-outside-toplevel
+        from text import TextProcessor
         status = TextProcessor.ReplaceStatus()
         processor = TextProcessor.TextProcessor(self._logger)
         processor.readFile(filename, True)
+        changed = False
         for rule in rules:
             parts = rule.split('|')
             status.clear()
             if processor.adaptVariable(parts[0], parts[1], status):
                 if status.hasChanged:
-                    self.info(f'{parts[0]}: {status.oldValue} -> {parts[1]}')
+                    changed = True
+                    self.info('%s: %s -> %s', parts[0], status.oldValue, parts[1])
             else:
                 line = f'{parts[0]}={parts[1]}'
                 if len(parts) == 3:
@@ -148,10 +172,99 @@ class Builder:
                         processor.lines[last] = line
                     else:
                         processor.lines.append(line)
-                self.info(f'added: {line}')
-        if self.canWrite(needsRoot):
+                changed = True
+                self.info('added: %s', line)
+        if self._options.converge and not changed:
+            self.info(f'# unchanged: {filename}')
+        elif self.canWrite(needsRoot):
             processor.writeFile(filename, f'{int(time.time())}')
 
+    @Profiler.profiled('staging')
+    def _doCopy(self, source: str, target: str):
+        '''Executes the operation "copy": copies a file if the dry mode is not on.
+        @param source: the file to copy
+        @param target: the target name
+        '''
+        if self._dry:
+            self.log('sudo cp -a %s %s', source, target)
+        else:
+            shutil.copy2(source, target)
+
+    @Profiler.profiled('staging')
+    def _doEnsure(self, path: str, asRoot: bool):
+        '''Executes the operation "ensure": creates a directory if it does not exists.
+        @param path: the name of the directory
+        @param asRoot: <em>True</em>: the command must be executed as root
+        '''
+        if not os.path.exists(path):
+            if self.canWrite(asRoot):
+                FileHelper.ensureDirectory(path)
+            else:
+                self.log(f'sudo mkdir -p {path}')
+
+    @Profiler.profiled('staging')
+    def _doMkdir(self, path: str):
+        '''Executes the operation "mkdir": makes a directory (recursive) if the dry mode is not on.
+        @param path: the name of the directory to create
+        '''
+        if self._dry:
+            self.log(f'mkdir -p {path}')
+        else:
+            os.makedirs(path, 0o777)
+
+    @Profiler.profiled('staging')
+    def _doRemove(self, path: str):
+        '''Executes the operation "remove": removes a directory tree if the dry mode is not on.
+        @param path: the directory to remove
+        '''
+        if self._dry:
+            self.log(f'rm -rf {path}')
+        else:
+            shutil.rmtree(path)
+
+    def _doRun(self, command: str, asRoot: bool, verbose: bool, outputFile: str, separator: str):
+        '''Executes the operation "run": runs a program if it possible or print the command if not.
+        @param command: the command to execute
+        @param asRoot: <em>True</em>: the command must be executed as root
+        @param verbose: <em>True</em>: show the command
+        @param outputFile: <em>None</em> or the file where the program output is stored
+        @param separator: the separator of the arguments in command
+        '''
+        if self.canWrite(asRoot):
+            with Profiler.process(command):
+                output = subprocess.check_output(command.split(separator))
+            if outputFile is not None:
+                StringUtils.toFile(outputFile, output.decode('utf-8'))
+            elif verbose and output != b'':
+                self.log(output.decode('utf-8'))
+        else:
+            out = '' if outputFile is None else f' >{outputFile}'
+            self.log(f'sudo {command}{out}')
+
+    @Profiler.profiled('staging')
+    def _doSave(self, filename: str, asRoot: bool):
+        '''Executes the operation "save": renames a file to a file with a unique name.
+        @param filename: the file to save
+        @param asRoot: the file can only be written as root
+        '''
+        if os.path.exists(filename):
+            unique = int(time.time())
+            self._doRun(f'mv -v {filename} {filename}.{unique}', True, True, None, ' ')
+
+    @Profiler.profiled('write')
+    def _doWrite(self, filename: str, contents: str, asRoot: bool, evenDry: bool=False, fileMode: int=None):
+        '''Executes the operation "write": writes a file as root or print a message.
+        @param filename: the name of the file to write
+        @param contents: the contents of the file
+        @param asRoot: the file can only be written as root
+        @param evenDry: True: the file is written in dry mode too, e.g. a generated file to inspect
+        @param fileMode: None or the access rights of the file, e.g. 0o666
+        '''
+        if self.canWrite(asRoot) or evenDry:
+            StringUtils.toFile(filename, contents, fileMode=fileMode)
+        else:
+            self.log(f'# would write to {filename}')
+
     def archiveForm(self, command: str, form: str):
         '''Stores the form in the form archive for logging purpose.
         @param command: the command that received the form
@@ -268,15 +381,45 @@ class Builder:
                 raise CLIError(f'{name}: not 2 or 3 parts delimited by "|": {rule}"')
             target.append(rule)
 
+    def convergePlan(self, plan: Plan.Plan, fingerprints: Fingerprints.Fingerprints) -> int:
+        '''Marks the operations of a plan whose target already has the wanted state as skipped.
+        A file is not written (and not saved before) if it already has the wanted content.
+        A program is always run: a former run says nothing about the current state of its target
+        (e.g. a package removed since then). The builders plan a program only if the live state needs it,
+        e.g. the installation of missing packages only.
+        @param plan: the plan to inspect
+        @param fingerprints: the fingerprints of the former runs
+        @return: the number of skipped operations
+        '''
+        saves = {}
+        rc = 0
+        for operation in plan.operations:
+            args = operation.args
+            if operation.kind == 'save':
+                saves[args['filename']] = operation
+                continue
+            if operation.kind == 'write':
+                operation.skipped = fingerprints.hashOf(args['filename']) == Fingerprints.hashOfData(args['contents'])
+                save = saves.pop(args['filename'], None)
+                if save is not None and operation.skipped:
+                    save.skipped = True
+                    rc += 1
+            elif operation.kind == 'copy':
+                digest = fingerprints.hashOf(args['source'])
+                operation.skipped = digest != '' and fingerprints.hashOf(args['target']) == digest
+            if operation.skipped:
+                rc += 1
+        return rc
+
     def copyFile(self, source: str, target: str):
         '''Copies a file if the dry mode is not on.
         @param source: the file to copy
         @param target: the target name
         '''
-        if self._dry:
-            print(f'sudo cp -a {source} {target}')
+        if self._plan is None:
+            self._doCopy(source, target)
         else:
-            shutil.copy2(source, target)
+            self._plan.add('copy', f'cp -a {source} {target}', [source, target], source=source, target=target)
 
     def copyManyFiles(self, source: str, targetDirectory: str):
         '''Copies all files matching a pattern if the dry mode is not on.
@@ -289,7 +432,7 @@ class Builder:
             if fnmatch.fnmatch(node, pattern):
                 fullSource = os.path.join(baseSource, node)
                 fullTarget = os.path.join(targetDirectory, node)
-                self.info(f'{fullSource} -> {fullTarget}')
+                self.info('%s -> %s', fullSource, fullTarget)
                 self.copyFile(fullSource, fullTarget)
 
     def ensureDirectory(self, path: str, asRoot: bool=None):
@@ -299,12 +442,89 @@ class Builder:
         '''
         if asRoot is None:
             asRoot = self._needsRoot
-        if not os.path.exists(path):
-            if self.canWrite(asRoot):
-                FileHelper.ensureDirectory(path)
-            else:
-                self.log(f'sudo mkdir -p {path}')
+        if self._plan is None:
+            self._doEnsure(path, asRoot)
+        elif not self.exists(path):
+            self._plan.add('ensure', f'mkdir -p {path}', [path], path=path, asRoot=asRoot)
+
+    def executeOperation(self, operation: Plan.Operation):
+        '''Executes one operation of a plan and measures the execution time.
+        @param operation: the operation to execute
+        '''
+        start = time.time()
+        if not operation.skipped:
+            getattr(self, '_do' + operation.kind.capitalize())(**operation.args)
+        operation.duration = time.time() - start
+
+    def executeParallel(self, plan: Plan.Plan, workers: int):
+        '''Executes the operations of a plan in a pool of threads respecting the dependencies.
+        An operation is started when all operations it depends on are finished.
+        @param plan: the plan to execute
+        @param workers: the maximal number of operations running at the same time
+        '''
+        waiting = {operation.ident: set(operation.depends) for operation in plan.operations}
+        dependents = collections.defaultdict(list)
+        for operation in plan.operations:
+            for ident in operation.depends:
+                dependents[ident].append(operation.ident)
+        operations = {operation.ident: operation for operation in plan.operations}
+        ready = [ident for ident, depends in waiting.items() if not depends]
+        running = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            while ready or running:
+                for ident in sorted(ready):
+                    running[executor.submit(self.executeOperation, operations[ident])] = ident
+                ready = []
+                done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    ident = running.pop(future)
+                    # an exception stops the execution: no further operation is started
+                    future.result()
+                    for other in dependents[ident]:
+                        waiting[other].discard(ident)
+                        if not waiting[other]:
+                            ready.append(other)
+
+    def executePlan(self, plan: Plan.Plan):
+        '''Executes the operations of a plan: in parallel if the global option --jobs is greater than 1.
+        In convergence mode the operations already done are skipped.
+        @param plan: the plan to execute
+        '''
+        start = time.time()
+        fingerprints = None
+        if self._options.converge:
+            fingerprints = Fingerprints.Fingerprints(self.fingerprintFile())
+            fingerprints.load()
+            skipped = self.convergePlan(plan, fingerprints)
+            self.info(f'# converged: {skipped} of {len(plan.operations)} operation(s) skipped')
+        workers = max(1, self._options.jobs)
+        if workers == 1 or len(plan.operations) < 2:
+            for operation in plan.operations:
+                self.executeOperation(operation)
+        else:
+            self.executeParallel(plan, workers)
+        if self._verbose is not None and self._verbose > 1:
+            for operation in plan.operations:
+                self.log(f'# {operation.duration:.3f} sec: {operation.description}')
+            self.log(f'# {len(plan.operations)} operation(s) in {time.time() - start:.3f} sec with {workers} worker(s)')
+        if fingerprints is not None:
+            self.storeFingerprints(plan, fingerprints)
 
+    def exists(self, path: str) -> bool:
+        '''Tests whether a file exists, respecting the operations of the current plan.
+        @param path: the file to test
+        @return: <em>True</em>: the file exists or will be created by the plan
+        '''
+        state = None if self._plan is None else self._plan.stateOf(path)
+        return os.path.exists(path) if state is None else state
+
+    def fingerprintFile(self) -> str:
+        '''Returns the file storing the fingerprints of the convergence mode.
+        @return: the full filename in the state directory
+        '''
+        return os.path.join(self._stateDirectory, 'fingerprints.json')
+
+    @Profiler.profiled('variables')
     def finishVariables(self):
         '''Does the things if all variables are inserted: expand the variables in the values.
         '''
@@ -315,6 +535,11 @@ class Builder:
         if counter > 2:
             self.error('Ups')
 
+    def flush(self):
+        '''Writes the buffered messages of the logger.
+        '''
+        self._logger.flush()
+
     def handleDirectories(self):
         '''Handles the directories: all files will be copied.
         '''
@@ -322,10 +547,10 @@ class Builder:
         for item in self._dirs:
             subDir = os.path.join(self._baseDirectory,
                                   self.replaceVariables(item))
-            if not os.path.exists(subDir):
-                self.info(f'creating  {subDir}/')
+            if not self.exists(subDir):
+                self.info('creating  %s/', subDir)
                 self.makeDirectory(subDir)
-            elif not os.path.isdir(subDir):
+            elif not self.isDirectory(subDir):
                 self.error(f'not a directory: {subDir}')
 
     def handleFiles(self):
@@ -345,11 +570,11 @@ class Builder:
             else:
                 baseTarget = os.path.dirname(target)
                 nodeTarget = os.path.basename(target)
-            if not os.path.isdir(baseTarget):
+            if not self.isDirectory(baseTarget):
                 self.makeDirectory(baseTarget)
             if not hasWildcard:
                 target = os.path.join(baseTarget, nodeTarget)
-                self.info(f'{source} -> {target}')
+                self.info('%s -> %s', source, target)
                 self.copyFile(source, target)
             else:
                 self.copyManyFiles(source, baseTarget)
@@ -362,40 +587,69 @@ class Builder:
         rc = re.search(r'[*?\[\]]', pattern)
         return rc
 
-    def info(self, message):
-        '''Logs an error.
-        @param message: the message to log
+    def info(self, message, *args):
+        '''Logs an info message if the verbose mode is on.
+        @param message: the message to log, may contain %-placeholders: formatted only if needed
+        @param args: the arguments of the placeholders
         '''
         if self._verbose:
-            self._logger.info(message)
+            self._logger.info(message, *args)
 
-    def installPackages(self, packages: Sequence[str]):
-        '''Installs a set of packages.
-        @param packages: the array of packages
+    def installedPackages(self) -> dict:
+        '''Returns the installed packages (from the dpkg status database, cached in the state directory).
+        @return: a dictionary name -> version
         '''
+        return DpkgStatus.cachedStatus(self._dpkgStatusFile, os.path.join(self._stateDirectory, 'dpkg-status.pickle'))
+
+    def installPackages(self, packages: Sequence[str]):
+        '''Installs the missing packages of a set of packages.
+        Nothing is done (not even "apt-get update") if all packages are already installed.
+        @param packages: the array of packages, e.g. ['htop', 'nginx=1.22.1-9']: a given version must match
+        '''
+        missing = DpkgStatus.missingPackages(packages, self.installedPackages())
+        if not missing:
+            self.info(f'# all {len(packages)} package(s) already installed')
+            return
         current = time.time()
         self.updatePackages()
-        cmd = f"apt-get -y install {' '.join(self._packages)}"
+        cmd = f"apt-get -y install {' '.join(missing)}"
         self.runProgram(cmd, True, True)
-        for package in packages:
-            full = os.path.join(self._stateDirectory, 'installed', package)
-            with open(full, 'a') as fp:
-                fp.write(f'{current:0.0f}\n')
+        # the markers are written after the installation (in a plan: operations depending on it),
+        # not at all if the installation fails:
+        for package in missing:
+            full = os.path.join(self._stateDirectory, 'installed', package.partition('=')[0])
+            old = StringUtils.fromFile(full) if os.path.exists(full) else ''
+            self.writeFile(full, f'{old}{current:0.0f}\n', False)
+
+    def isDirectory(self, path: str) -> bool:
+        '''Tests whether a directory exists, respecting the operations of the current plan.
+        @param path: the directory to test
+        @return: <em>True</em>: the directory exists or will be created by the plan
+        '''
+        state = None if self._plan is None else self._plan.stateOf(path)
+        return os.path.isdir(path) if state is None else state
 
-    def log(self, message):
+    def isPlanOnly(self) -> bool:
+        '''Tests whether the plan should be stored instead of executed (global option --plan).
+        @return: <em>True</em>: nothing is changed on the system
+        '''
+        return self._options.plan is not None
+
+    def log(self, message, *args):
         '''Logs a message.
-        @param message: the message to log
+        @param message: the message to log, may contain %-placeholders: formatted only if needed
+        @param args: the arguments of the placeholders
         '''
-        self._logger.info(message)
+        self._logger.info(message, *args)
 
     def makeDirectory(self, name):
         '''Makes a directory (recursive) if the dry mode is not on.
         @param name: the name of the directory to create
         '''
-        if self._dry:
-            self.log(f'mkdir -p {name}')
-        else:
-            os.makedirs(name, 0o777)
+        if self._plan is None:
+            self._doMkdir(name)
+        elif not self._plan.stateOf(name):
+            self._plan.add('mkdir', f'mkdir -p {name}', [name], path=name)
 
     def needsRoot(self, needsRoot: bool):
         '''Tests whether being root is needed.
@@ -417,6 +671,50 @@ class Builder:
             not self.needsRoot(asRoot) or os.geteuid() == 0)
         return rc
 
+    @Profiler.profiled('form')
+    def parseForm(self, data: str):
+        '''Converts the contents of a form into Json data.
+        @param data: the contents of the form
+        @return: the Json data
+        '''
+        return json.loads(data)
+
+    @contextlib.contextmanager
+    def planning(self):
+        '''Collects the operations of the builder (directories, files, programs) into a plan.
+        At the end of the (outermost) block the plan is executed or stored (global option --plan).
+        Usage: with self.planning(): self.handleFiles()
+        @return: the plan
+        '''
+        if self._plan is None:
+            self._plan = Plan.Plan()
+        self._planDepth += 1
+        try:
+            yield self._plan
+        except Exception:
+            self._planDepth -= 1
+            if self._planDepth == 0:
+                self._plan = None
+            raise
+        self._planDepth -= 1
+        if self._planDepth == 0:
+            plan = self._plan
+            if self.isPlanOnly():
+                plan.save(self._options.plan)
+                self.info(f'# plan with {len(plan.operations)} operation(s) stored in {self._options.plan}')
+            else:
+                self._plan = None
+                self.executePlan(plan)
+
+    def removeTree(self, path: str):
+        '''Removes a directory with all its content if the dry mode is not on.
+        @param path: the directory to remove
+        '''
+        if self._plan is None:
+            self._doRemove(path)
+        else:
+            self._plan.add('remove', f'rm -rf {path}', None, path=path)
+
     def replaceVariables(self, value: str) -> str:
         '''Tests whether the value contains a variable. In this case it will be replaced by the variable value.
         @param value: the string to inspect
@@ -434,26 +732,25 @@ class Builder:
         @param asRoot: <em>True</em>: the command must be executed as root
         @param verbose: <em>True</em>: show the command
         @param outputFile: <em>None</em> or the file where the program output is stored
+        @param separator: the separator of the arguments in command
         '''
-        if self.canWrite(asRoot):
-            output = subprocess.check_output(command.split(separator))
-            if outputFile is not None:
-                StringUtils.toFile(outputFile, output.decode('utf-8'))
-            elif verbose and output != b'':
-                self.log(output.decode('utf-8'))
+        if self._plan is None:
+            self._doRun(command, asRoot, verbose, outputFile, separator)
         else:
             out = '' if outputFile is None else f' >{outputFile}'
-            self.log(f'sudo {command}{out}')
+            self._plan.add('run', f'{command}{out}', None, command=command, asRoot=asRoot, verbose=verbose,
+                           outputFile=outputFile, separator=separator)
 
     def saveFile(self, filename, asRoot: bool=None):
         '''Renames a file to a file with a unique name.
         @param filename: the file to save
         @param asRoot: the file can only be written as root
         '''
-        if os.path.exists(filename):
-            unique = int(time.time())
-            self.runProgram(
-                f'mv -v {filename} {filename}.{unique}', True, True)
+        if self._plan is None:
+            self._doSave(filename, asRoot)
+        elif self.exists(filename):
+            self._plan.add('save', f'mv -v {filename} {filename}.$(date +%s)', [filename],
+                           filename=filename, asRoot=asRoot)
 
     def setVariable(self, name, value):
         '''Sets a variable.
@@ -462,12 +759,37 @@ class Builder:
         '''
         self._variables[name] = value
 
+    def setDpkgStatusFile(self, filename: str):
+        '''Sets the status database of dpkg, e.g. of a mounted new system.
+        @param filename: the status file
+        '''
+        self._dpkgStatusFile = filename
+
     def setStateDirectory(self, directory: str):
         '''Sets the directory for logging / storing states.
         @param directory: the directory to set
         '''
         self._stateDirectory = directory
 
+    def storeFingerprints(self, plan: Plan.Plan, fingerprints: Fingerprints.Fingerprints):
+        '''Stores the fingerprints of the executed operations of a plan for the next run.
+        @param plan: the executed plan
+        @param fingerprints: the fingerprints to update
+        '''
+        if self._dry:
+            return
+        for operation in plan.operations:
+            if operation.skipped:
+                continue
+            if operation.kind == 'write':
+                fingerprints.hashOf(operation.args['filename'])
+            elif operation.kind == 'copy':
+                fingerprints.hashOf(operation.args['target'])
+        try:
+            fingerprints.save()
+        except OSError as exc:
+            self.info(f'# cannot store the fingerprints: {exc}')
+
     def updatePackages(self, force: bool=False):
         '''Starts the "apt-get update" command if needed.
         @param force: <em>False</em>: starts only if the last update is older than one day
@@ -480,8 +802,9 @@ class Builder:
             fileTime = os.path.getmtime(latest)
         if fileTime + 86400 < current:
             self.runProgram('apt-get update', True, True)
-            if self.canWrite(False):
-                StringUtils.toFile(latest, f'{current:0.0f}', 0o666)
+            # written after the update (in a plan: an operation depending on it),
+            # writable for all: other users may update the packages too
+            self.writeFile(latest, f'{current:0.0f}', False, fileMode=0o666)
         
     def valueOf(self, path: str, nodeType: str='s'):
         '''Gets a node of a Json tree.
@@ -493,13 +816,18 @@ class Builder:
         value = self.replaceVariables(value)
         return value
 
-    def writeFile(self, filename: str, contents: str, asRoot: bool=None):
+    def writeFile(self, filename: str, contents: str, asRoot: bool=None, evenDry: bool=False, fileMode: int=None):
         '''Writes a file as root or print a message.
         @param filename: the name of the file to write
         @param contents: the contents of the file
         @param asRoot: the file can only be written as root
+        @param evenDry: True: the file is written in dry mode too, e.g. a generated file to inspect
+        @param fileMode: None or the access rights of the file, e.g. 0o666
         '''
-        if self.canWrite(asRoot):
-            StringUtils.toFile(filename, contents)
+        if self._plan is None:
+            self._doWrite(filename, contents, asRoot, evenDry, fileMode)
         else:
-            self.log(f'# would write to {filename}')
+            # the mode is stored only if given: the plans of other writes are unchanged
+            extra = {} if fileMode is None else {'fileMode': fileMode}
+            self._plan.add('write', f'write {filename}', [filename], filename=filename, contents=contents,
+                           asRoot=asRoot, evenDry=evenDry, **extra)
@@ -7,7 +7,6 @@ Created on: 23.08.2023
 '''
 import re
 import os.path
-import json
 import pwd
 import grp
 import time
@@ -15,6 +14,7 @@ from typing import Sequence
 from text import JsonUtils
 from base import StringUtils
 from base import FileHelper
+from base import Profiler
 from Builder import Builder, CLIError, GlobalOptions
 from text import TextProcessor
 
@@ -35,7 +35,7 @@ class InstallBuilder (Builder):
         self._users = []
         self._modeSmtp = None
         self._baseSmtp = None
-        self._patternPackages = r'^[\w.+:-]+$'
+        self._patternPackages = r'^[\w.+:-]+(=[\w.+:~-]+)?$'
 
     def buildSsmtp(self):
         '''Builds the configuration of the package ssmtp.
@@ -71,13 +71,14 @@ TLS_CA_File=/etc/pki/tls/certs/ca-bundle.crt
                 contents.append(f'{user}:{self._senderSmtp}:{self._mailHub}\n')
         self.writeFile(full, ''.join(contents), needsRoot)
 
+    @Profiler.profiled('validation')
     def checkPhp(self, form: str):
         '''Checks the input data for the method adaptUsers() and stores the data that must be inserted.
         @param form: the filename of the form with the Json configuration
         '''
         with open(form, 'r', encoding='utf-8') as fp:
             data = fp.read()
-            self._root = root = json.loads(data)
+            self._root = root = self.parseForm(data)
             variables = root['Variables']
             for name in variables:
                 self.setVariable(name, variables[name])
@@ -103,13 +104,14 @@ TLS_CA_File=/etc/pki/tls/certs/ca-bundle.crt
             self.checkRules(root['FpmReplacements'], 'FpmReplacement', self._fpmRules)
             self.checkRules(root['CliReplacements'], 'CliReplacement', self._cliRules)
 
+    @Profiler.profiled('validation')
     def checkStandardHost(self, form: str):
         '''Checks the input data for the method adaptUsers() and stores the data that must be inserted.
         @param form: the filename of the form with the Json configuration
         '''
         with open(form, 'r', encoding='utf-8') as fp:
             data = fp.read()
-            self._root = root = json.loads(data)
+            self._root = root = self.parseForm(data)
             variables = root['Variables']
             for name in variables:
                 self.setVariable(name, variables[name])
@@ -258,8 +260,9 @@ TLS_CA_File=/etc/pki/tls/certs/ca-bundle.crt
         '''
         self.checkStandardHost(form)
         self.archiveForm('standard-host', form)
-        self.installPackages(self._packages)
-        needsRoot = self._baseDirectory.startswith('/etc')
-        self.ensureDirectory(self._baseDirectory, needsRoot)
-        self.buildSsmtp()
+        with self.planning():
+            self.installPackages(self._packages)
+            needsRoot = self._baseDirectory.startswith('/etc')
+            self.ensureDirectory(self._baseDirectory, needsRoot)
+            self.buildSsmtp()
 
@@ -8,10 +8,9 @@ Created on: 20.08.2023
 
 import os.path
 import subprocess
-import shutil
-import json
 import re
 from base import StringUtils
+from base import Profiler
 from text import JsonUtils
 from Builder import Builder, CLIError, GlobalOptions
 
@@ -48,25 +47,28 @@ class PackageBuilder (Builder):
         '''
         self.check(configuration)
         self._baseDirectory = f'{self._package}-{self._version}'
-        self.buildDirectories()
+        with self.planning():
+            self.buildDirectories()
+            self.handleFiles()
+        if self.isPlanOnly():
+            # the following steps need the built tree
+            return
         self.buildFiles()
         self.buildOtherFiles()
         self.checkLinksLate()
-        output = subprocess.check_output(['/usr/bin/dpkg', '-b', self._baseDirectory,
-                                          f'{self._baseDirectory}_{self._architecture}.deb'])
+        with Profiler.process(f'/usr/bin/dpkg -b {self._baseDirectory}'):
+            output = subprocess.check_output(['/usr/bin/dpkg', '-b', self._baseDirectory,
+                                              f'{self._baseDirectory}_{self._architecture}.deb'])
         self.log(output.decode('utf-8'))
 
     def buildDirectories(self):
         '''Handles the section "Directories".
         '''
-        if os.path.exists(self._baseDirectory):
+        if self.exists(self._baseDirectory):
             self.info(f'removing {self._baseDirectory}')
-            shutil.rmtree(self._baseDirectory)
-        if os.path.exists(self._baseDirectory):
-            self.error(f'cannot clear base directory: {self._baseDirectory}')
-        else:
-            self.info(f'creating {self._baseDirectory}/')
-            self.makeDirectory(self._baseDirectory)
+            self.removeTree(self._baseDirectory)
+        self.info(f'creating {self._baseDirectory}/')
+        self.makeDirectory(self._baseDirectory)
         self._dirs.append('DEBIAN')
         self.handleDirectories()
 
@@ -100,12 +102,11 @@ Maintainer: {self._maintainer}{depends}{suggests}
 Installed-size: {(self._sizeFiles + 1023) // 1024}
 Homepage: {self._homepage}
 Description: {desc}''')
-            self.info(f'written: {name}')
+            self.info('written: %s', name)
 
     def buildFiles(self):
-        '''Handles the section "Files".
+        '''Handles the section "Files": the files must be already copied (handleFiles()).
         '''
-        self.handleFiles()
         self.findFiles(self._baseDirectory)
         self.info(f'installed size: {self._sizeFiles}')
         self.buildControl()
@@ -150,7 +151,7 @@ if [ "$1" = configure ]; then
                     fp.write(contents)
                 fp.write('fi\n')
                 fp.write('exit 0\n')
-                self.info(f'written: {name}')
+                self.info('written: %s', name)
 
             os.chmod(name, 0o775)
 
@@ -185,7 +186,7 @@ PATH=/usr/bin:/bin:/usr/sbin:/sbin
                         if item not in self._standardDirectories:
                             fp.write(f'test -d /{item} && rmdir /{item}\n')
                 fp.write('exit 0\n')
-                self.info(f'written: {name}')
+                self.info('written: %s', name)
             os.chmod(name, 0o775)
 
     def buildOtherFiles(self):
@@ -194,13 +195,14 @@ PATH=/usr/bin:/bin:/usr/sbin:/sbin
         self.buildPostInstall()
         self.buildPostRm()
 
+    @Profiler.profiled('validation')
     def check(self, form: str):
         '''Checks the form and stores the data found there.
         @param form: the Json form with the package definition
         '''
         with open(form, 'r', encoding='utf-8') as fp:
             data = fp.read()
-            self._root = root = json.loads(data)
+            self._root = root = self.parseForm(data)
             path = 'Project:m Directories:a Files:m Links:m PostInstall:s PostRemove:s'
             JsonUtils.checkJsonMapAndRaise(
                 root, path, True, 'Variables:m Comment:s')
@@ -5,13 +5,63 @@ Created on: 20.08.2023
     Author: SeaPlusPro
    License: CC0 1.0 Universal
 '''
+import os
 import re
-import json
 import pwd
 import grp
+import subprocess
+import concurrent.futures
 from text import JsonUtils
+from text import UnitTemplate
 from Builder import Builder, CLIError, GlobalOptions
 from base import StringUtils
+from base import Profiler
+
+# the service types supported by SystemD:
+SERVICE_TYPES = ('simple', 'exec', 'forking', 'oneshot', 'notify', 'idle')
+# the entries of the section "Resources": name -> (type in the form, pattern of the value or (minimum, maximum))
+RESOURCES = {
+    'CPUQuota': ('s', r'^\d+%$'),
+    'CPUAffinity': ('s', r'^\d+(-\d+)?([ ,]\d+(-\d+)?)*$'),
+    'Nice': ('i', (-20, 19)),
+    'IOWeight': ('i', (1, 10000)),
+    'MemoryMax': ('s', r'^(\d+[KMGT]?|\d+(\.\d+)?%|infinity)$'),
+    'TasksMax': ('s', r'^(\d+%?|infinity)$'),
+    'LimitNOFILE': ('s', r'^(\d+(:\d+)?|infinity)$'),
+}
+
+# pylint: disable-next=too-few-public-methods
+class ServiceData:
+    '''Stores the properties of one service.
+    '''
+
+    def __init__(self, name: str):
+        '''Constructor.
+        @param name: the name of the service
+        '''
+        self.name = name
+        self.file = None
+        self.description = None
+        self.user = None
+        self.group = None
+        self.workingDirectory = None
+        self.environment = None
+        self.execStart = None
+        self.execReload = None
+        self.syslogId = None
+        self.output = None
+        self.error = None
+        self.restart = None
+        self.restartSec = None
+        self.template = None
+        self.type = None
+        # name -> value, e.g. 'CPUQuota': '150%'
+        self.resources = {}
+        # None or the address of the socket activating the service, e.g. '8080' or '/run/x.sock'
+        self.listen = None
+        self.socketFile = None
+        # 0: a single service Otherwise: the number of instances of the template unit name@.service
+        self.instances = 0
 
 
 class ServiceBuilder (Builder):
@@ -24,97 +74,219 @@ class ServiceBuilder (Builder):
         @param dry: <em>True</em>: says what to do, but do not change data
         '''
         Builder.__init__(self, True, options)
-        self._name = None
-        self._file = None
-        self._description = None
-        self._user = None
-        self._group = None
-        self._workingDirectory = None
-        self._environment = None
-        self._execStart = None
-        self._execReload = None
-        self._syslogId = None
-        self._output = None
-        self._error = None
-        self._restart = None
-        self._restartSec = None
-
-    def buildFile(self):
+        self._services = []
+
+    def _statusOf(self, name: str) -> str:
+        '''Returns the status of a service.
+        @param name: the name of the service
+        @return: the output of "systemctl status"
+        '''
+        # systemctl status returns an exit code != 0 for inactive services: no check
+        with Profiler.process(f'systemctl status --no-pager {name}'):
+            process = subprocess.run(['systemctl', 'status', '--no-pager', name], capture_output=True, check=False)
+        return process.stdout.decode('utf-8', 'replace')
+
+    def buildFile(self, service: ServiceData) -> bool:
         '''Creates the service definition file used from SystemD.
+        The file is only written if the rendered unit differs from the existing file.
+        @param service: the service to build
+        @return: True: the file has been (or will be) written False: the file is unchanged
         '''
-        with open(self._file, 'w', encoding='utf-8') as fp:
-            group = '' if self._group == '' else f'\nGroup={self._group}'
-            reload = f'ExecReload={self._execReload}'
-            if self._execReload == '':
-                reload = f'# {reload}'
-            fp.write(f'''[Unit]
-Description={self._description}
-After=syslog.target
-[Service]
-Type=simple
-User={self._user}{group}
-WorkingDirectory={self._workingDirectory}
-EnvironmentFile={self._environment}
-ExecStart={self._execStart}
-{reload}
-SyslogIdentifier={self._syslogId}
-StandardOutput={self._output}
-StandardError={self._error}
-Restart={self._restart}
-RestartSec={self._restartSec}
-[Install]
-WantedBy=multi-user.target
-''')
-            self.info(f'written: {self._file}')
+        if service.template == '':
+            template = UnitTemplate.templateOf('service')
+        else:
+            template = UnitTemplate.templateFromFile(service.template)
+        values = {'Description': service.description, 'Type': service.type, 'User': service.user,
+                  'Group': service.group, 'WorkingDirectory': service.workingDirectory,
+                  'EnvironmentFile': service.environment, 'ExecStart': service.execStart,
+                  'ExecReload': service.execReload, 'SyslogIdentifier': service.syslogId,
+                  'StandardOutput': service.output, 'StandardError': service.error,
+                  'Restart': service.restart, 'RestartSec': service.restartSec, 'Name': service.name,
+                  'Requires': None if service.listen is None else f'{service.name}.socket',
+                  'Resources': '\n'.join(f'{name}={value}' for name, value in service.resources.items())}
+        values.update(service.resources)
+        contents = template.render(values)
+        rc = UnitTemplate.hasChanged(service.file, contents)
+        if not rc:
+            self.info(f'unchanged: {service.file}')
+        else:
+            # the service file is written in dry mode too: it can be inspected
+            self.writeFile(service.file, contents, False, True)
+            self.info(f'written: {service.file}')
+        return rc
+
+    def buildSocket(self, service: ServiceData) -> bool:
+        '''Creates the socket unit activating a service.
+        The file is only written if the rendered unit differs from the existing file.
+        @param service: the service with a socket
+        @return: True: the file has been (or will be) written False: the file is unchanged
+        '''
+        contents = UnitTemplate.templateOf('socket').render({
+            'Description': f'Socket of {service.name}', 'ListenStream': service.listen,
+            'Service': f'{service.name}.service'})
+        rc = UnitTemplate.hasChanged(service.socketFile, contents)
+        if not rc:
+            self.info(f'unchanged: {service.socketFile}')
+        else:
+            self.writeFile(service.socketFile, contents, False, True)
+            self.info(f'written: {service.socketFile}')
+        return rc
 
+    @Profiler.profiled('validation')
     def check(self, configuration: str):
         '''Tests the configuration data and stores it.
         @param configuration: the Json file
         '''
         with open(configuration, 'r', encoding='utf-8') as fp:
             data = fp.read()
-            self._root = root = json.loads(data)
-            path = 'Service:m Directories:a Files:m Links:m'
-            JsonUtils.checkJsonMapAndRaise(root, path, True, 'Comment:s Variables:m')
-            service = root['Service']
-            path = 'Name:s Description:s File:s User:s Group:s WorkingDirectory:s EnvironmentFile:s' + \
-                ' ExecStart:s ExecReload:s SyslogIdentifier:s StandardOutput:s StandardError:s Restart:s RestartSec:i'
-            JsonUtils.checkJsonMapAndRaise(service, path, True, 'Comment:s')
+            self._root = root = self.parseForm(data)
+            path = 'Directories:a Files:m Links:m'
+            JsonUtils.checkJsonMapAndRaise(root, path, True, 'Comment:s Variables:m Service:m Services:a')
+            if ('Service' in root) == ('Services' in root):
+                raise CLIError('exactly one of "Service" and "Services" is needed')
             variables = root['Variables']
             for name in variables:
                 self.setVariable(name, variables[name])
             self.finishVariables()
-            self._name = self.valueOf('Service Name')
-            if not re.match(r'^[\w-]+$', self._name):
-                raise CLIError(f'wrong Service.Name: {self._name}')
-            self._file = self.valueOf('Service File')
-            if re.search(r'\s', self._file):
-                raise CLIError(f'wrong Service.File: {self._file}')
-            self._description = self.valueOf('Service Description')
-            self._user = self.valueOf('Service User')
-            if self._user == '':
-                self._user = 'nobody'
-            if not re.match(r'^[\w-]+$', self._user):
-                raise CLIError(f'wrong Service.User: {self._user}')
-            self._group = self.valueOf('Service Group')
-            if self._group != '' and not re.match(r'^[\w-]+$', self._group):
-                raise CLIError(f'wrong Service.Group: {self._group}')
-            self._environment = self.valueOf('Service EnvironmentFile')
-            if re.search(r'\s', self._environment):
-                raise CLIError(
-                    f'wrong Service.EnvironmentFile: {self._environment}')
-            self._execStart = self.valueOf('Service ExecStart')
-            self._execReload = self.valueOf('Service ExecReload')
-            self._syslogId = self.valueOf('Service SyslogIdentifier')
-            self._output = self.valueOf('Service StandardOutput')
-            self._error = self.valueOf('Service StandardError')
-            self._restart = self.valueOf('Service Restart')
-            self._restartSec = self.valueOf('Service RestartSec', 'i')
+            if 'Service' in root:
+                self._services.append(self.checkService('Service'))
+            else:
+                for ix in range(len(root['Services'])):
+                    self._services.append(self.checkService(f'Services [{ix}]'))
+            names = [service.name for service in self._services]
+            for name in names:
+                if names.count(name) > 1:
+                    raise CLIError(f'service defined twice: {name}')
             self.log(f'= configuration syntax is OK: {configuration}')
             self.checkFiles()
             self.checkDirectories()
             self.checkLinks()
 
+    def checkInstances(self, path: str, service: ServiceData):
+        '''Tests the instance definition of a service and stores it.
+        @param path: the path of the service in the form, e.g. "Services [2]"
+        @param service: the service to complete
+        '''
+        prefix = path.replace(' ', '')
+        node = JsonUtils.nodeOfJsonTree(self._root, path, 'm')
+        value = node['Instances']
+        cpus = os.cpu_count() or 1
+        if isinstance(value, str):
+            value = self.replaceVariables(value)
+            if value == 'per-core':
+                value = cpus
+            elif re.match(r'^\d+$', value):
+                value = int(value)
+        if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+            raise CLIError(f'wrong {prefix}.Instances: {value} Use: a number > 0 or "per-core"')
+        service.instances = value
+        if service.listen is not None:
+            raise CLIError(f'{prefix}: Instances cannot be combined with Socket')
+        if not service.file.endswith('.service'):
+            raise CLIError(f'{prefix}: File must end with ".service": {service.file}')
+        if not service.file.endswith('@.service'):
+            service.file = service.file[0:-8] + '@.service'
+        if JsonUtils.optionalBoolNode(node, 'Pinned'):
+            if 'CPUAffinity' in service.resources:
+                raise CLIError(f'{prefix}: Pinned cannot be combined with Resources.CPUAffinity')
+            if service.instances > cpus:
+                raise CLIError(f'{prefix}: Pinned: only {cpus} CPU(s) for {service.instances} instances')
+            # the instance name is the CPU number:
+            service.resources['CPUAffinity'] = '%i'
+
+    def checkResources(self, path: str, service: ServiceData):
+        '''Tests the resource control entries of a service and stores them.
+        @param path: the path of the section in the form, e.g. "Services [2] Resources"
+        @param service: the service to complete
+        '''
+        node = JsonUtils.nodeOfJsonTree(self._root, path, 'm')
+        JsonUtils.checkJsonMapAndRaise(node, None, True, ' '.join(f'{name}:{spec[0]}' for name, spec in RESOURCES.items()))
+        prefix = path.replace(' Resources', '.Resources').replace(' ', '')
+        for name, (nodeType, check) in RESOURCES.items():
+            if name in node:
+                value = self.valueOf(f'{path} {name}', nodeType)
+                if nodeType == 'i':
+                    if value < check[0] or value > check[1]:
+                        raise CLIError(f'wrong {prefix}.{name}: {value} Use: {check[0]}..{check[1]}')
+                elif not re.match(check, value):
+                    raise CLIError(f'wrong {prefix}.{name}: {value}')
+                service.resources[name] = value
+
+    def checkSocket(self, path: str, service: ServiceData):
+        '''Tests the socket definition of a service and stores it.
+        @param path: the path of the section in the form, e.g. "Services [2] Socket"
+        @param service: the service to complete
+        '''
+        node = JsonUtils.nodeOfJsonTree(self._root, path, 'm')
+        JsonUtils.checkJsonMapAndRaise(node, 'ListenStream:s', True)
+        prefix = path.replace(' Socket', '.Socket').replace(' ', '')
+        service.listen = self.valueOf(f'{path} ListenStream')
+        # a port, an IPv4/IPv6 address with port or a UNIX socket:
+        if not re.match(r'^(\d{1,5}|[\d.]+:\d{1,5}|\[[\da-fA-F:]+\]:\d{1,5}|/\S+)$', service.listen):
+            raise CLIError(f'wrong {prefix}.ListenStream: {service.listen}')
+        if not service.file.endswith('.service'):
+            raise CLIError(f'{prefix}: File must end with ".service": {service.file}')
+        service.socketFile = service.file[0:-8] + '.socket'
+
+    def checkService(self, path: str) -> ServiceData:
+        '''Tests the definition of one service.
+        @param path: the path of the service in the form, e.g. "Service" or "Services [2]"
+        @return: the service data
+        '''
+        node = JsonUtils.nodeOfJsonTree(self._root, path, 'm')
+        entries = 'Name:s Description:s File:s User:s Group:s WorkingDirectory:s EnvironmentFile:s' + \
+            ' ExecStart:s ExecReload:s SyslogIdentifier:s StandardOutput:s StandardError:s Restart:s RestartSec:i'
+        # "Instances" may be a number or a string: checked in checkInstances()
+        JsonUtils.checkJsonMapAndRaise({key: value for key, value in node.items() if key != 'Instances'}, entries, True,
+                                       'Comment:s Template:s Type:s Resources:m Socket:m Pinned:b')
+        prefix = path.replace(' ', '')
+        service = ServiceData(self.valueOf(f'{path} Name'))
+        if not re.match(r'^[\w-]+$', service.name):
+            raise CLIError(f'wrong {prefix}.Name: {service.name}')
+        service.file = self.valueOf(f'{path} File')
+        if re.search(r'\s', service.file):
+            raise CLIError(f'wrong {prefix}.File: {service.file}')
+        service.description = self.valueOf(f'{path} Description')
+        service.user = self.valueOf(f'{path} User')
+        if service.user == '':
+            service.user = 'nobody'
+        if not re.match(r'^[\w-]+$', service.user):
+            raise CLIError(f'wrong {prefix}.User: {service.user}')
+        service.group = self.valueOf(f'{path} Group')
+        if service.group != '' and not re.match(r'^[\w-]+$', service.group):
+            raise CLIError(f'wrong {prefix}.Group: {service.group}')
+        service.workingDirectory = self.valueOf(f'{path} WorkingDirectory')
+        service.environment = self.valueOf(f'{path} EnvironmentFile')
+        if re.search(r'\s', service.environment):
+            raise CLIError(
+                f'wrong {prefix}.EnvironmentFile: {service.environment}')
+        service.execStart = self.valueOf(f'{path} ExecStart')
+        service.execReload = self.valueOf(f'{path} ExecReload')
+        service.syslogId = self.valueOf(f'{path} SyslogIdentifier')
+        service.output = self.valueOf(f'{path} StandardOutput')
+        service.error = self.valueOf(f'{path} StandardError')
+        service.restart = self.valueOf(f'{path} Restart')
+        service.restartSec = self.valueOf(f'{path} RestartSec', 'i')
+        service.type = 'simple'
+        if 'Type' in node:
+            service.type = self.valueOf(f'{path} Type')
+            if service.type not in SERVICE_TYPES:
+                raise CLIError(f'wrong {prefix}.Type: {service.type} Use: {"|".join(SERVICE_TYPES)}')
+        if 'Resources' in node:
+            self.checkResources(f'{path} Resources', service)
+        if 'Socket' in node:
+            self.checkSocket(f'{path} Socket', service)
+        if 'Instances' in node:
+            self.checkInstances(path, service)
+        elif 'Pinned' in node:
+            raise CLIError(f'{prefix}.Pinned needs {prefix}.Instances')
+        service.template = ''
+        if 'Template' in node:
+            service.template = self.valueOf(f'{path} Template')
+            if not os.path.isfile(service.template):
+                raise CLIError(f'missing {prefix}.Template: {service.template}')
+        return service
+
     def example(self, filename: str):
         '''Shows the example for the configuration file of "package".
         @param filename: None or the file to store
@@ -140,7 +312,12 @@ WantedBy=multi-user.target
     "StandardOutput": "syslog",
     "StandardError": "syslog",
     "Restart": "always",
-    "RestartSec": 5
+    "RestartSec": 5,
+    "Type": "simple",
+    "Resources": {
+      "Nice": 5,
+      "MemoryMax": "1G"
+    }
   },
   "Directories": [
     "/usr/local/bin",
@@ -159,28 +336,71 @@ WantedBy=multi-user.target
         else:
             StringUtils.toFile(filename, message)
 
-    def install(self, configuration: str):
-        '''Installs the service.
+    def install(self, configuration: str, status: int=4):
+        '''Installs the services: writes all changed unit files, reloads SystemD once (only if a unit has been
+        changed) and enables/starts all services with one call of systemctl. A socket activated service is not
+        started: its socket is enabled and started instead.
         @param configuration: the Json file
+        @param status: the number of parallel status queries after the start. 0: the status is not shown
         '''
         self.check(configuration)
-        self.handleFiles()
-        self.handleDirectories()
-        self.buildFile()
-        self.prepareUser()
-        self.runProgram(f'systemctl enable {self._name}', True)
-        self.runProgram(f'systemctl start {self._name}', True)
-        self.runProgram(f'systemctl status {self._name}', True)
-
-    def prepareUser(self):
-        '''Creates a user/group if needed.
+        with self.planning():
+            self.handleFiles()
+            self.handleDirectories()
+            changed = [service.name for service in self._services if self.buildFile(service)]
+            changed += [service.name for service in self._services
+                        if service.listen is not None and self.buildSocket(service)]
+            self.prepareUsers()
+            if changed:
+                self.runProgram('systemctl daemon-reload', True)
+            names = ' '.join(self.unitsToStart())
+            self.runProgram(f'systemctl enable --now {names}', True)
+        if status > 0 and not self.isPlanOnly():
+            self.showStatus(status)
+
+    def prepareUsers(self):
+        '''Creates the users/groups of the services if needed.
+        '''
+        done = set()
+        for service in self._services:
+            if service.user not in done:
+                done.add(service.user)
+                try:
+                    pwd.getpwnam(service.user)
+                except KeyError:
+                    self.runProgram(
+                        f'useradd --system -m --no-user-group -s /usr/sbin/nologin {service.user}', True)
+            if service.group != '' and ':' + service.group not in done:
+                done.add(':' + service.group)
+                try:
+                    grp.getgrnam(service.group)
+                except KeyError:
+                    self.runProgram(f'groupadd --system {service.group}', True)
+
+    def showStatus(self, parallel: int=4):
+        '''Shows the status of the services: the status queries run in parallel.
+        @param parallel: the maximal number of parallel queries
+        '''
+        names = self.unitsToStart()
+        if not self.canWrite(True):
+            for name in names:
+                self.log(f'sudo systemctl status {name}')
+        else:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, parallel)) as executor:
+                for output in executor.map(self._statusOf, names):
+                    self.log(output)
+
+    def unitsToStart(self) -> list:
+        '''Returns the units to enable and start: the services, the instances of template services
+        or (for socket activated services) the sockets.
+        @return: the list of the unit names
         '''
-        try:
-            pwd.getpwnam(self._user)
-        except KeyError:
-            self.runProgram(
-                f'useradd --system -m --no-user-group -s /usr/sbin/nologin {self._user}', True)
-        try:
-            grp.getgrnam(self._group)
-        except KeyError:
-            self.runProgram(f'groupadd --system {self._user}', True)
+        rc = []
+        for service in self._services:
+            if service.instances > 0:
+                rc += [f'{service.name}@{ix}' for ix in range(service.instances)]
+            elif service.listen is not None:
+                rc.append(f'{service.name}.socket')
+            else:
+                rc.append(service.name)
+        return rc
@@ -11,9 +11,21 @@ import json
 import pwd
 import grp
 import time
+import shutil
+import tarfile
+import subprocess
+import concurrent.futures
 from text import JsonUtils
 from base import StringUtils
 from base import FileHelper
+from base import AccountFiles
+from base import LinuxUtils
+from base import Sampler
+from base import Archiver
+from base import ChunkStore
+from base import Restorer
+from base import Plan
+from base import Profiler
 from Builder import Builder, CLIError, GlobalOptions
 
 
@@ -55,6 +67,28 @@ class GroupData:
         self.members = members
 
 
+# the collectors of "system-info" working in-process (without an external program):
+COLLECTORS = ('@blockdevices', '@diskio', '@disks', '@load', '@mdstat', '@memory', '@mounts')
+
+
+# pylint: disable-next=too-few-public-methods
+class CommandResult:
+    '''Stores the result of a command of "system-info".
+    '''
+
+    def __init__(self, command: str, output: str):
+        '''Constructor.
+        @param command: the command
+        @param output: '' or the file storing the output of the command
+        '''
+        self.command = command
+        self.output = output
+        self.exitCode = None
+        self.status = 'ok'
+        self.duration = 0.0
+        self.message = ''
+
+
 class SetupBuilder (Builder):
     '''Processes the "setup" command.
     '''
@@ -76,6 +110,17 @@ class SetupBuilder (Builder):
         self._shadowSaved = {}
         self._command = None
         self._commands = {}
+        self._etcDirectory = '/etc'
+        self._parallel = 4
+        self._timeout = 60
+        self._summary = ''
+        self._archive = ''
+        self._compression = 'auto'
+        self._readAhead = 4
+        self._attributes = False
+        self._incremental = False
+        self._repository = ''
+        self._hash = False
 
     def _byGroupId(self, gid: int):
         '''Get the group info given by the id.
@@ -124,69 +169,231 @@ class SetupBuilder (Builder):
                 break
         return rc
 
-    def adaptUsers(self, passwd: str, group: str, shadow: str):
+    def _batchAccounts(self, groups, users, passwords):
+        '''Inserts groups and users with one rewrite of each account file instead of one process per entry.
+        @param groups: a list of GroupData: the groups to insert
+        @param users: a list of UserData: the users to insert
+        @param passwords: a dictionary user -> encoded password
+        '''
+        known = set(entry.pw_name for entry in self._activeUsers)
+        known.update(user.name for user in users)
+        groupLines = []
+        gshadowLines = []
+        memberships = 0
+        for group in groups:
+            members = []
+            for member in group.members.split(','):
+                if member == '':
+                    continue
+                if member not in known:
+                    self.error(f'unknown member {member} of group {group.name}')
+                else:
+                    members.append(member)
+            memberships += len(members)
+            groupLines.append(f'{group.name}:x:{group.gid}:{",".join(members)}')
+            gshadowLines.append(f'{group.name}:!::{",".join(members)}')
+        passwdLines = []
+        shadowLines = []
+        days = AccountFiles.daysSinceEpoch()
+        for user in users:
+            passwdLines.append(f'{user.name}:x:{user.uid}:{user.gid}:{user.desk}:{user.home}:{user.shell}')
+            passwd = passwords.get(user.name, '')
+            if len(passwd) <= 5:
+                passwd = '!'
+            shadowLines.append(f'{user.name}:{passwd}:{days}:0:99999:7:::')
+        self.info(f'# batch: {len(groups)} group(s) {len(users)} user(s) {memberships} membership(s)')
+        changes = (('group', groupLines), ('gshadow', gshadowLines),
+                   ('passwd', passwdLines), ('shadow', shadowLines))
+        needsRoot = not os.access(self._etcDirectory, os.W_OK)
+        if not self.canWrite(needsRoot):
+            for node, lines in changes:
+                if node in ('group', 'passwd'):
+                    for line in lines:
+                        self.log(f'+{os.path.join(self._etcDirectory, node)}: {line}')
+        else:
+            try:
+                with AccountFiles.AccountLock(self._etcDirectory):
+                    for node, lines in changes:
+                        full = os.path.join(self._etcDirectory, node)
+                        if node in ('passwd', 'group') or os.path.exists(full):
+                            AccountFiles.appendEntries(full, lines)
+                            self.info(f'# written: {full}')
+            except TimeoutError as exc:
+                raise CLIError(str(exc)) from exc
+            for user in users:
+                self._createHome(user)
+
+    def _createHome(self, user: UserData):
+        '''Creates the home directory of a new user (from the skeleton directory) if it does not exist.
+        The home is created below the root of the target system: the parent of the account file directory.
+        @param user: the user data
+        '''
+        root = os.path.dirname(os.path.normpath(self._etcDirectory))
+        home = os.path.join(root, user.home.lstrip('/'))
+        if not os.path.exists(home):
+            skeleton = os.path.join(self._etcDirectory, 'skel')
+            if os.path.isdir(skeleton):
+                shutil.copytree(skeleton, home, symlinks=True)
+            else:
+                os.makedirs(home, 0o755)
+            if os.geteuid() == 0:
+                uid, gid = int(user.uid), int(user.gid)
+                for base, dirs, files in os.walk(home):
+                    os.lchown(base, uid, gid)
+                    for node in dirs + files:
+                        os.lchown(os.path.join(base, node), uid, gid)
+            self.info(f'# created: {home}')
+
+    def adaptUsers(self, passwd: str, group: str, shadow: str, batch: bool=False):
         '''Compares two passwd/group files:
         If the 2nd file contains a member not known in the system user/group file 
         that member will be inserted with "useradd" or "groupadd"
         @param passwd: the name of the 2nd password file
         @param group: the name of the 2nd group file
         @param shadow: the name of the 2nd shadow password file
+        @param batch: <em>True</em>: all changes are written with one rewrite of the account files
         '''
         self.checkAdaptUsers(passwd, group, shadow)
-        for group2, entry in self._groups.items():
-            gid = int(entry.gid)
-            system = '' if gid < 1000 else '--system '
-            self.runProgram(f'groupadd {system}-g {gid} {group2}', True)
-        for user, entry in self._users.items():
-            system = '' if int(entry.uid) < 1000 else '--system '
-            self.runProgram(
-                f'useradd {system}-m --no-user-group -g {entry.uid} -c "{entry.desk}" -d {entry.home} -s {entry.shell} {user}',
-                True)
-            passwd = '' if user not in self._shadowSaved else self._shadowSaved[user]
-            if len(passwd) > 5:
-                if os.geteuid() == 0:
-                    self.patchShadow(user, passwd, shadow)
-                else:
-                    self.log(
-                        f"sudo form2linux setup patch-shadow {user} '{passwd}'")
-        for group2, entry in self._groups.items():
-            gid = entry.gid
-            members = entry.members
-            for member in members.split(','):
-                if member != '':
-                    self.runProgram(f'usermod -a -G {group2} {member}', True)
+        if batch:
+            self._batchAccounts(list(self._groups.values()), list(self._users.values()), self._shadowSaved)
+        else:
+            for group2, entry in self._groups.items():
+                gid = int(entry.gid)
+                system = '' if gid < 1000 else '--system '
+                self.runProgram(f'groupadd {system}-g {gid} {group2}', True)
+            passwords = {}
+            for user, entry in self._users.items():
+                system = '' if int(entry.uid) < 1000 else '--system '
+                self.runProgram(
+                    f'useradd {system}-m --no-user-group -g {entry.uid} -c "{entry.desk}" -d {entry.home} -s {entry.shell} {user}',
+                    True)
+                passwd = '' if user not in self._shadowSaved else self._shadowSaved[user]
+                if len(passwd) > 5:
+                    if os.geteuid() == 0:
+                        passwords[user] = passwd
+                    else:
+                        self.log(
+                            f"sudo form2linux setup patch-shadow {user} '{passwd}'")
+            if len(passwords) > 0:
+                self.patchShadows(passwords, os.path.join(self._etcDirectory, 'shadow'))
+            for group2, entry in self._groups.items():
+                gid = entry.gid
+                members = entry.members
+                for member in members.split(','):
+                    if member != '':
+                        self.runProgram(f'usermod -a -G {group2} {member}', True)
 
-    def addStandardUsers(self, form):
+    def addStandardUsers(self, form, batch: bool=False):
         '''Compares the form entries with the system user/group files.
         If the form contains a member not known in the system user/group file 
         that member will be inserted with "useradd" or "groupadd"
         @param form: the name of the form with Json format
+        @param batch: <em>True</em>: all changes are written with one rewrite of the account files
         '''
         self.checkStandardUsers(form)
         self.archiveForm('add-standard-users', form)
-        for group, gid in self._groups.items():
-            system = '' if gid < 1000 else '--system '
-            self.runProgram(f'groupadd {system}-g {gid} {group}', True)
-        for user, entry in self._users.items():
-            system = '' if entry.uid < 1000 else '--system '
-            self.runProgram(
-                f'useradd {system}-m --no-user-group -g {entry.uid} -c "{entry.desk}" -d {entry.home} -s {entry.shell} {user}',
-                True)
-
-    def archive(self, form: str, filesList: str):
-        '''Stores files into a archive using a user defined command.
+        if batch:
+            groups = [GroupData(name, gid, '') for name, gid in self._groups.items()]
+            self._batchAccounts(groups, list(self._users.values()), {})
+        else:
+            for group, gid in self._groups.items():
+                system = '' if gid < 1000 else '--system '
+                self.runProgram(f'groupadd {system}-g {gid} {group}', True)
+            for user, entry in self._users.items():
+                system = '' if entry.uid < 1000 else '--system '
+                self.runProgram(
+                    f'useradd {system}-m --no-user-group -g {entry.uid} -c "{entry.desk}" -d {entry.home} -s {entry.shell} {user}',
+                    True)
+
+    def archive(self, form: str, filesList: str, full: bool=False):
+        '''Stores files into a archive using a user defined command or the built-in archiver.
         @param form: the name of the form with Json format
         @param filesList: the name of the file storing the full filenames to archive
+        @param full: True: an incremental archive starts a new restore chain with a full archive
         '''
-        if filesList == '*':
-            filesList = f'/tmp/f2l.files.{int(time.time())%86400}.lst'
         self.checkArchive(form)
-        with open(filesList, 'w', encoding='utf-8') as fp:
-            for file in self._files:
-                # write without preceding '/'
-                fp.write(f'{file[1:]}\n')
-        command = self._command.replace('%FILE%', filesList)
-        self.runProgram(command, True, True)
+        if self._repository != '':
+            self.archiveChunks(form)
+        elif self._incremental:
+            self.archiveIncremental(form, full)
+        elif self._archive != '':
+            self.archiveNative()
+        else:
+            if filesList == '*':
+                filesList = f'/tmp/f2l.files.{int(time.time())%86400}.lst'
+            with open(filesList, 'w', encoding='utf-8') as fp:
+                for file in self._files:
+                    # write without preceding '/'
+                    fp.write(f'{file[1:]}\n')
+            command = self._command.replace('%FILE%', filesList)
+            self.runProgram(command, True, True)
+
+    def archiveChunks(self, form: str):
+        '''Stores the files found by checkArchive() as deduplicated chunks into a repository.
+        Only new chunks are written, a manifest lists the files of the run.
+        @param form: the name of the form: defines the name of the manifest
+        '''
+        needsRoot = not os.access(self._repository if os.path.exists(self._repository)
+                                  else os.path.dirname(self._repository) or '.', os.W_OK)
+        if not self.canWrite(needsRoot):
+            self.log(f'# would store {len(self._files)} entries into {self._repository}')
+        else:
+            name = os.path.splitext(os.path.basename(form))[0]
+            start = time.time()
+            with ChunkStore.ChunkStore(self._repository, self._logger) as store:
+                manifest = store.store(Archiver.expandEntries(self._files), name, {'Form': os.path.abspath(form)})
+            duration = time.time() - start
+            self.info(f'# {manifest}: {store.files} entries {store.bytes} byte(s) unchanged files: {store.unchangedFiles}'
+                      f' chunks: {store.newChunks} new {store.knownChunks} known stored: {store.storedBytes} byte(s)'
+                      f' errors: {store.errors} {duration:.3f} sec')
+
+    def archiveIncremental(self, form: str, full: bool):
+        '''Stores only the files changed since the last run of the form (with the built-in archiver).
+        The state of the archived files is stored in the snapshot index of the form.
+        @param form: the name of the form: defines the name of the snapshot index
+        @param full: True: a new restore chain is started with a full archive
+        '''
+        index = Archiver.SnapshotIndex(self.snapshotIndexOf(form))
+        if not full:
+            index.load()
+        aType = 'full' if len(index.chain) == 0 else 'incremental'
+        if any(item['Archive'] == self._archive for item in index.chain):
+            raise CLIError(f'{self._archive} is already part of the restore chain. Use %datetime% in "Archive"')
+        current, changed, deleted = index.scan(Archiver.expandEntries(self._files), self._hash)
+        self.info(f'# {aType}: {len(changed)} changed {len(deleted)} deleted'
+                  f' {len(current) - len(changed)} unchanged')
+        writer = self.archiveNative(changed, {'F2L.type': aType, 'F2L.deleted': '\n'.join(deleted)})
+        if writer is not None:
+            for name in writer.failed:
+                # the file will be archived in the next run:
+                current.pop(name, None)
+            index.files = current
+            index.chain.append({'Archive': self._archive, 'Type': aType,
+                                'Time': time.strftime('%Y-%m-%d %H:%M:%S'),
+                                'Files': writer.files, 'Deleted': deleted})
+            index.save()
+
+    def archiveNative(self, names=None, headers=None):
+        '''Stores files with the built-in archiver (without an external tar).
+        @param names: None: the files found by checkArchive() (recursively) otherwise: the files to store
+        @param headers: None or the global pax headers of the archive
+        @return: None (dry mode) or the Archiver.TarWriter instance (with statistics)
+        '''
+        writer = None
+        files = self._files if names is None else names
+        needsRoot = not os.access(os.path.dirname(self._archive) or '.', os.W_OK)
+        if not self.canWrite(needsRoot):
+            self.log(f'# would archive {len(files)} entries into {self._archive}')
+        else:
+            try:
+                with Archiver.TarWriter(self._archive, self._compression, self._readAhead, self._attributes,
+                                        self._logger, headers) as writer:
+                    writer.add(files, names is None)
+            except ValueError as exc:
+                raise CLIError(str(exc)) from exc
+            self.info(f'# {self._archive}: {writer.files} entries {writer.bytes} byte(s) errors: {writer.errors}'
+                      f' {writer.duration():.3f} sec {writer.throughput() / 1E6:.1f} MB/sec')
+        return writer
 
     def checkAdaptUsers(self, passwd: str, group: str, shadow: str):
         '''Checks the input data for the method adaptUsers() and stores the data that must be inserted.
@@ -238,7 +445,7 @@ class SetupBuilder (Builder):
                     self.error(
                         f'user {user} already exists with another uid: {uid} / {uidActive}')
                 else:
-                    self.info(f'# user {user} already exists')
+                    self.info('# user %s already exists', user)
         for group2, entry in self._nameGroupSaved.items():
             gid = entry.gid
             entry2 = self._byGroupId(gid)
@@ -254,8 +461,9 @@ class SetupBuilder (Builder):
                     self.error(
                         f'group {group2} already exists with another uid: {gid} / {gidActive}')
                 else:
-                    self.info(f'# group {group2} already exists')
+                    self.info('# group %s already exists', group2)
 
+    @Profiler.profiled('validation')
     def checkArchive(self, form: str):
         '''Checks the data for the method addStandardUsers and store the data that must be inserted.
         @param form: the name of the form with Json format
@@ -263,32 +471,50 @@ class SetupBuilder (Builder):
         self._files = []
         with open(form, 'r', encoding='utf-8') as fp:
             data = fp.read()
-            self._root = root = json.loads(data)
-            path = 'Files:m Command:s Variables:m'
-            JsonUtils.checkJsonMapAndRaise(root, path, True, 'Comment:s')
+            self._root = root = self.parseForm(data)
+            path = 'Files:m Variables:m'
+            JsonUtils.checkJsonMapAndRaise(root, path, True, 'Comment:s Command:s Archive:s Repository:s'
+                                           + ' Compression:s ReadAhead:i Attributes:b Incremental:b Hash:b')
             variables = root['Variables']
-            self._command = self.valueOf('Command')
-            if self._command.find('%FILE%') < 0:
-                raise CLIError(f'missing %FILE% in Command: {self._command}')
             for name in variables:
                 self.setVariable(name, variables[name])
             self.finishVariables()
+            if [key in root for key in ('Command', 'Archive', 'Repository')].count(True) != 1:
+                raise CLIError(f'{form}: exactly one of "Command", "Archive" and "Repository" must be defined')
+            if 'Repository' in root:
+                self._repository = self.valueOf('Repository')
+            elif 'Command' in root:
+                self._command = self.valueOf('Command')
+                if self._command.find('%FILE%') < 0:
+                    raise CLIError(f'missing %FILE% in Command: {self._command}')
+            else:
+                self._archive = FileHelper.expandPathPlaceholders(self.valueOf('Archive'), form)
+                self._compression = root.get('Compression', 'auto')
+                if self._compression not in Archiver.COMPRESSIONS + ('auto',):
+                    raise CLIError(f'{form}: unknown Compression: {self._compression}')
+                self._readAhead = JsonUtils.optionalIntNode(root, 'ReadAhead', self._readAhead)
+                if self._readAhead < 1:
+                    raise CLIError(f'{form}: wrong ReadAhead: {self._readAhead}')
+                self._attributes = root.get('Attributes', False)
+                self._incremental = root.get('Incremental', False)
+                self._hash = root.get('Hash', False)
             files = root['Files']
             for path in files:
                 path2 = self.replaceVariables(path)
                 if not path2.startswith('/'):
                     self.error(f'path is not absolute: {path}')
-                fileList = self.valueOf(f'Files {path2}')
+                fileList = self.replaceVariables(files[path])
                 # # pylint: disable-next=no-member
                 FileHelper.expandWildcards(path2, fileList, self._files)
 
+    @Profiler.profiled('validation')
     def checkStandardUsers(self, form):
         '''Tests the form of the command "add-standard-users" and store the data.
         @param form: the name of the form with Json format
         '''
         with open(form, 'r', encoding='utf-8') as fp:
             data = fp.read()
-            self._root = root = json.loads(data)
+            self._root = root = self.parseForm(data)
             path = 'Users:m Groups:m Variables:m'
             JsonUtils.checkJsonMapAndRaise(root, path, True, 'Comment:s')
             variables = root['Variables']
@@ -307,7 +533,7 @@ class SetupBuilder (Builder):
                     raise CLIError(f'missing shell: {shell}')
                 uid = self.valueOf(f'Users {user} Uid', 'i')
                 gid = self.valueOf(f'Users {user} Gid', 'i')
-                home = self.valueOf(f'Users {user} Shell')
+                home = self.valueOf(f'Users {user} Home')
                 if home == '*':
                     home = f'/home/{user}'
                 desc = self.valueOf(f'Users {user} Desc')
@@ -326,7 +552,7 @@ class SetupBuilder (Builder):
                         self.error(
                             f'user {user} already exists with another uid: {uid} / {uidActive}')
                     else:
-                        self.info(f'# user {user} already exists')
+                        self.info('# user %s already exists', user)
             groups = root['Groups']
             for group in groups:
                 if not re.match(r'^[a-z][\w-]*$', group):
@@ -345,21 +571,29 @@ class SetupBuilder (Builder):
                         self.error(
                             f'group {group} already exists with another uid: {gid} / {gidActive}')
                     else:
-                        self.info(f'# group {group} already exists')
+                        self.info('# group %s already exists', group)
 
+    @Profiler.profiled('validation')
     def checkSystemInfo(self, form):
         '''Tests the form of the command "system-info".
         @param form: the name of the form with Json format
         '''
         with open(form, 'r', encoding='utf-8') as fp:
             data = fp.read()
-            self._root = root = json.loads(data)
+            self._root = root = self.parseForm(data)
             path = 'Commands:m Variables:m'
-            JsonUtils.checkJsonMapAndRaise(root, path, True, 'Comment:s')
+            JsonUtils.checkJsonMapAndRaise(root, path, True, 'Comment:s Parallel:i Timeout:i Summary:s')
             variables = root['Variables']
             for name in variables:
                 self.setVariable(name, variables[name])
             self.finishVariables()
+            self._parallel = JsonUtils.optionalIntNode(root, 'Parallel', self._parallel)
+            if self._parallel < 1:
+                raise CLIError(f'{form}: wrong Parallel: {self._parallel}')
+            self._timeout = JsonUtils.optionalIntNode(root, 'Timeout', self._timeout)
+            if self._timeout < 1:
+                raise CLIError(f'{form}: wrong Timeout: {self._timeout}')
+            self._summary = self.replaceVariables(root.get('Summary', ''))
             commands = root['Commands']
             for key in commands:
                 key2 = self.replaceVariables(key)
@@ -367,6 +601,8 @@ class SetupBuilder (Builder):
                     continue
                 if key2 in self._commands:
                     raise CLIError(f'{form}: duplicate entry: {key}')
+                if key2.startswith('@') and key2 not in COLLECTORS:
+                    raise CLIError(f'{form}: unknown collector: {key} Use one of {" ".join(COLLECTORS)}')
                 self._commands[key2] = self.replaceVariables(commands[key])
 
     def exampleArchive(self, filename: str):
@@ -402,19 +638,22 @@ class SetupBuilder (Builder):
   "Variables": {
     "STORAGE": "/home/sysinfo"
   },
+  "Parallel": 4,
+  "Timeout": 60,
+  "Summary": "%(STORAGE)/summary.json",
   "Commands": {
     "# Command": "# stored in",
     "fdisk -l": "%(STORAGE)/fdisk.txt",
     "lsblk": "%(STORAGE)/lsblk.txt",
     "blkid": "%(STORAGE)/blkid.txt",
-    "mount": "%(STORAGE)/mount.txt",
-    "df -h": "%(STORAGE)/df.txt",
-    "free": "%(STORAGE)/free.txt",
+    "@mounts": "%(STORAGE)/mounts.json",
+    "@disks": "%(STORAGE)/disks.json",
+    "@memory": "%(STORAGE)/memory.json",
     "smartctl -a /dev/nvme0n1": "%(STORAGE)/smartctl.nvme0n1.txt",
     "smartctl -a /dev/sda": "%(STORAGE)/smartctl.sda.txt",
     "ps aux": "%(STORAGE)/ps.txt",
     "systemctl list-units": "%(STORAGE)/systemctl.list-units.txt",
-    "#cat /proc/mdstat": "%(STORAGE)/mdstat.txt"
+    "@mdstat": "%(STORAGE)/mdstat.json"
   }
 }
 '''
@@ -455,39 +694,305 @@ class SetupBuilder (Builder):
         else:
             StringUtils.toFile(filename, message)
 
+    def monitor(self, output: str, interval: float=10.0, count: int=0, disks: str='[sv]d[a-z]$|nvme\\d+n\\d+$',
+                interfaces: str='(?!lo$)', capacity: int=60):
+        '''Samples the load of the system (disk and network throughput, load, memory) periodically
+        and stores the rolling statistics.
+        @param output: the Json file storing the statistics (rewritten after each sample). '': log the statistics
+        @param interval: the time between two samples in seconds
+        @param count: the number of samples. 0: unlimited
+        @param disks: a regular expression of the disks to observe
+        @param interfaces: a regular expression of the network interfaces to observe
+        @param capacity: the statistics are built from that number of the last samples
+        '''
+        if interval <= 0 or count < 0 or capacity < 1:
+            raise CLIError(f'wrong interval/count/capacity: {interval}/{count}/{capacity}')
+        try:
+            sampler = Sampler.Sampler(disks, interfaces, capacity)
+        except ValueError as exc:
+            raise CLIError(str(exc)) from exc
+        with sampler:
+            sampler.sample()
+            start = time.time()
+            while count == 0 or sampler.samples() < count:
+                time.sleep(interval)
+                sampler.sample()
+                info = {'Start': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start)),
+                        'Interval': interval, 'Samples': sampler.samples(), 'Capacity': capacity,
+                        'Statistics': sampler.statistics()}
+                data = json.dumps(info, indent=1)
+                if output == '':
+                    self.log(data)
+                else:
+                    temp = output + '+'
+                    StringUtils.toFile(temp, data + '\n')
+                    os.replace(temp, output)
+
     def patchShadow(self, user: str, passwd: str, shadow: str):
         '''Replaces in the shadow file a encoded password with a given value.
         @param user: the password of that user will be changed
         @param passwd: the new value of the encoded password
         @param shadow: the name of the shadow file
         '''
-        with open(shadow, 'r', encoding='utf-8') as fp:
-            lines = []
-            found = False
-            changed = False
-            for line in fp:
-                parts = line.split(':')
-                if parts[0] == user:
-                    changed = parts[1] != passwd
-                    parts[1] = passwd
-                    line = ':'.join(parts)
-                    found = True
-                lines.append(line)
-        if found:
-            self.info("# user found")
-            if changed:
-                if self._dry:
-                    self.log(f'# dry mode: not written {shadow}')
-                else:
-                    with open(shadow, 'w', encoding='utf-8') as fp:
-                        fp.write(''.join(lines))
-                        self.info('# written: {shadow}')
+        self.patchShadows({user: passwd}, shadow)
+
+    def patchShadows(self, passwords, shadow: str):
+        '''Replaces in the shadow file the encoded passwords of many users in one pass.
+        The shadow file is locked while changing (like the shadow tools) and written once.
+        In dry mode nothing is locked or written: the changes are only counted.
+        @param passwords: a dictionary user -> encoded password
+        @param shadow: the name of the shadow file
+        '''
+        try:
+            if self._dry:
+                unchanged, changed, missing = AccountFiles.patchEntries(shadow, passwords, 1, False)
+            else:
+                with AccountFiles.AccountLock(os.path.dirname(shadow), (os.path.basename(shadow),)):
+                    unchanged, changed, missing = AccountFiles.patchEntries(shadow, passwords, 1)
+        except OSError as exc:
+            # e.g. a timeout of the lock or missing permissions (not root):
+            raise CLIError(f'{shadow}: {exc}') from exc
+        for user in missing:
+            self.info(f'# user not found: {user}')
+        self.log(f'# {shadow}: changed: {len(changed)} unchanged: {len(unchanged)} missing: {len(missing)}')
+        if len(changed) > 0:
+            if self._dry:
+                self.log(f'# dry mode: not written {shadow}')
+            else:
+                self.info(f'# written: {shadow}')
+
+    def patchShadowFromFile(self, filename: str, shadow: str):
+        '''Replaces in the shadow file the encoded passwords given by a file.
+        @param filename: a file with lines "user:encoded-password", e.g. a saved shadow file
+        @param shadow: the name of the shadow file
+        '''
+        passwords = {}
+        for line in AccountFiles.readEntries(filename):
+            parts = line.split(':')
+            if len(parts) >= 2 and parts[1] != '' and not line.startswith('#'):
+                passwords[parts[0]] = parts[1]
+        self.patchShadows(passwords, shadow)
+
+    def planDiff(self, oldPlan: str, newPlan: str) -> int:
+        '''Shows the differences of two execution plans stored with the global option --plan.
+        @param oldPlan: the plan of the last run
+        @param newPlan: the current plan
+        @return: the number of differences
+        '''
+        for name in (oldPlan, newPlan):
+            if not os.path.exists(name):
+                raise CLIError(f'missing plan: {name}')
+        lines = Plan.Plan.load(newPlan).diff(Plan.Plan.load(oldPlan))
+        for line in lines:
+            self.log(line)
+        self.info(f'# differences: {len(lines)}')
+        return len(lines)
+
+    def restore(self, sources, target: str='/', patterns=None, parallel: int=4):
+        '''Restores files from archives created by "archive": tar archives or manifests of a repository.
+        @param sources: the archives to restore, e.g. the restore chain of an incremental archive
+        @param target: the base directory of the restored files
+        @param patterns: None or a list of shell patterns: only matching files are restored
+        @param parallel: the number of threads writing files
+        '''
+        for source in sources:
+            if not os.path.exists(source):
+                raise CLIError(f'archive not found: {source}')
+        if parallel < 1:
+            raise CLIError(f'wrong parallel: {parallel}')
+        existing = os.path.abspath(target)
+        while not os.path.exists(existing):
+            existing = os.path.dirname(existing)
+        needsRoot = not os.access(existing, os.W_OK) or os.path.realpath(target) == '/'
+        if not self.canWrite(needsRoot):
+            for source in sources:
+                self.log(f'# would restore {source} into {target}')
+        else:
+            start = time.time()
+            with Restorer.Restorer(target, patterns, parallel, self._logger) as restorer:
+                for source in sources:
+                    try:
+                        restorer.restore(source)
+                    except (ValueError, tarfile.TarError) as exc:
+                        raise CLIError(f'{source}: {exc}') from exc
+            self.info(f'# restored: {restorer.restored} unchanged: {restorer.unchanged} deleted: {restorer.deleted}'
+                      f' {restorer.bytes} byte(s) errors: {restorer.errors} {time.time() - start:.3f} sec')
+
+    def restoreChain(self, form: str):
+        '''Shows the archives needed to restore the files of an incremental archive form.
+        @param form: the name of the form
+        @return: the list of archive names: the full archive first, then the incremental archives
+        '''
+        index = Archiver.SnapshotIndex(self.snapshotIndexOf(form))
+        index.load()
+        if len(index.chain) == 0:
+            raise CLIError(f'no incremental archive found for {form}')
+        rc = []
+        for item in index.chain:
+            rc.append(item['Archive'])
+            self.log(f'{item["Archive"]} {item["Type"]} {item["Time"]} files: {item["Files"]}'
+                     f' deleted: {len(item["Deleted"])}')
+        return rc
+
+    def setEtcDirectory(self, directory: str):
+        '''Sets the directory of the account files, e.g. the /etc of a mounted system to set up.
+        The known users and groups are read from that directory.
+        @param directory: the directory containing passwd, group, shadow and gshadow
+        '''
+        self._etcDirectory = directory
+        self._activeUsers = []
+        for line in AccountFiles.readEntries(os.path.join(directory, 'passwd')):
+            parts = line.split(':')
+            if len(parts) >= 7:
+                self._activeUsers.append(pwd.struct_passwd(
+                    (parts[0], parts[1], int(parts[2]), int(parts[3]), parts[4], parts[5], parts[6])))
+        self._activeGroups = []
+        for line in AccountFiles.readEntries(os.path.join(directory, 'group')):
+            parts = line.split(':')
+            if len(parts) >= 4:
+                self._activeGroups.append(grp.struct_group(
+                    (parts[0], parts[1], int(parts[2]), [x for x in parts[3].split(',') if x != ''])))
+
+    def snapshotIndexOf(self, form: str) -> str:
+        '''Returns the name of the snapshot index of an archive form.
+        @param form: the name of the form
+        @return: the file storing the state of the last incremental archive
+        '''
+        node = os.path.splitext(os.path.basename(form))[0]
+        return os.path.join(self._stateDirectory, 'snapshots', f'{node}.json')
+
+    def _collect(self, name: str):
+        '''Collects system info in-process from /proc, /sys and statvfs().
+        @param name: the name of the collector, e.g. '@memory'
+        @return: the info as Json compatible data
+        '''
+        if name == '@blockdevices':
+            rc = [{'Name': item[0], 'Size': item[1], 'Removable': item[2], 'ReadOnly': item[3], 'Model': item[4]}
+                  for item in LinuxUtils.blockDevices()]
+        elif name == '@diskio':
+            rc = [{'Id': item[0], 'Name': item[1], 'ReadSectors': int(item[2]), 'WriteSectors': int(item[3]),
+                   'DiscardSectors': int(item[4])} for item in LinuxUtils.diskIo()]
+        elif name == '@disks':
+            rc = [{'Path': item[0], 'Total': item[1], 'Free': item[2], 'Available': item[3]}
+                  for item in LinuxUtils.diskFree()]
+        elif name == '@load':
+            item = LinuxUtils.load()
+            rc = {'Load1': item[0], 'Load5': item[1], 'Load15': item[2], 'Running': item[3], 'Processes': item[4]}
+        elif name == '@mdstat':
+            rc = [{'Name': item[0], 'Type': item[1], 'Members': item[2].split(), 'Blocks': int(item[3]), 'Status': item[4]}
+                  for item in LinuxUtils.mdadmInfo()]
+        elif name == '@memory':
+            rc = LinuxUtils.memoryValues()
+        elif name == '@mounts':
+            rc = [{'Device': item[0], 'Path': item[1], 'Type': item[2], 'Options': item[3]}
+                  for item in LinuxUtils.mountInfo()]
+        else:
+            raise CLIError(f'unknown collector: {name}')
+        return rc
+
+    def _runCollector(self, result: CommandResult):
+        '''Runs one collector of "system-info" and stores the info as Json.
+        @param result: IN: the collector and the target file OUT: status and duration
+        @return: the result
+        '''
+        start = time.time()
+        try:
+            data = json.dumps(self._collect(result.command), indent=2) + '\n'
+            if result.output == '':
+                self.log(data)
+            else:
+                with open(result.output, 'w', encoding='utf-8') as fp:
+                    fp.write(data)
+        except (OSError, ValueError, TypeError, IndexError) as exc:
+            result.status = 'error'
+            result.message = str(exc)
+        result.duration = time.time() - start
+        return result
+
+    def _runCommand(self, result: CommandResult):
+        '''Runs one command of "system-info": the output is streamed into the target file.
+        Note: called in a worker thread: no logging here.
+        @param result: IN: the command and the target file OUT: exit code, status and duration
+        @return: the result
+        '''
+        start = time.time()
+        try:
+            if result.output == '':
+                with Profiler.process(result.command):
+                    process = subprocess.run(result.command.split(' '), stdout=subprocess.PIPE,
+                                             stderr=subprocess.PIPE, timeout=self._timeout, check=False)
+                result.message = process.stdout.decode('utf-8', errors='replace')
+            else:
+                with open(result.output, 'wb') as fp, Profiler.process(result.command):
+                    process = subprocess.run(result.command.split(' '), stdout=fp,
+                                             stderr=subprocess.PIPE, timeout=self._timeout, check=False)
+            result.exitCode = process.returncode
+            if process.returncode != 0:
+                result.status = 'error'
+                result.message = process.stderr.decode('utf-8', errors='replace').strip()
+        except subprocess.TimeoutExpired:
+            result.status = 'timeout'
+            result.message = f'killed after {self._timeout} sec'
+        except OSError as exc:
+            result.status = 'error'
+            result.message = str(exc)
+        result.duration = time.time() - start
+        return result
+
+    def collectSystemInfo(self):
+        '''Runs the commands of "system-info" concurrently.
+        Commands without a target file (e.g. "mkdir -p ...") are executed first, one after another.
+        '''
+        start = time.time()
+        results = []
+        for command, output in self._commands.items():
+            if output == '' and not command.startswith('@'):
+                result = self._runCommand(CommandResult(command, output))
+                if result.message != '' and result.status == 'ok':
+                    self.log(result.message)
+                results.append(result)
+        for directory in set(os.path.dirname(output) for output in self._commands.values()):
+            if directory != '' and not os.path.isdir(directory):
+                os.makedirs(directory)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self._parallel) as executor:
+            futures = [executor.submit(self._runCommand, CommandResult(command, output))
+                       for command, output in self._commands.items() if output != '' and not command.startswith('@')]
+            # the collectors work in-process while the programs are running:
+            for command, output in self._commands.items():
+                if command.startswith('@'):
+                    results.append(self._runCollector(CommandResult(command, output)))
+            for future in concurrent.futures.as_completed(futures):
+                results.append(future.result())
+        for result in results:
+            if result.status != 'ok':
+                self.error(f'{result.command}: {result.status} {result.exitCode} {result.message}')
+            else:
+                self.info('%s: %.3f sec', result.command, result.duration)
+        if self._summary != '':
+            summary = {
+                'Start': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start)),
+                'Duration': round(time.time() - start, 3),
+                'Parallel': self._parallel,
+                'Timeout': self._timeout,
+                'Commands': [{'Command': result.command, 'Output': result.output, 'Status': result.status,
+                              'ExitCode': result.exitCode, 'Duration': round(result.duration, 3),
+                              'Message': result.message if result.status != 'ok' else ''}
+                             for result in results]
+            }
+            StringUtils.toFile(self._summary, json.dumps(summary, indent=2) + '\n', ensureParent=True)
+            self.info(f'# summary: {self._summary}')
 
     def systemInfo(self, form: str):
         '''Starts programs defined in a configuration to collect information about the system state.
         @param form: the name of the form with Json format
         '''
         self.checkSystemInfo(form)
-        for command, output in self._commands.items():
-            self.runProgram(command, True, True,
-                            output if output != '' else None)
+        if self.canWrite(True):
+            self.collectSystemInfo()
+        else:
+            for command, output in self._commands.items():
+                if command.startswith('@'):
+                    self.log(f'# collect {command}{"" if output == "" else " >" + output}')
+                else:
+                    self.runProgram(command, True, True,
+                                    output if output != '' else None)
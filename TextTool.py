@@ -6,11 +6,11 @@ Created on: 20.08.2023
    License: CC0 1.0 Universal
 '''
 import re
-import json
 import os.path
 from Builder import Builder, CLIError, GlobalOptions
 from text import JsonUtils
 from base import StringUtils
+from base import Profiler
 
 class RuleSet:
     '''Stores a file and the associated rules.
@@ -38,13 +38,14 @@ class TextTool (Builder):
         for ruleSet in self._ruleSets:
             self._adaptVariables(ruleSet.filename, ruleSet.rules, False)
 
+    @Profiler.profiled('validation')
     def checkAdaptVariables(self, form):
         '''Checks the form of the command 'adapt-variables'.
         @param form: the file with the form
         '''
         with open(form, 'r', encoding='utf-8') as fp:
             data = fp.read()
-            self._root = root = json.loads(data)
+            self._root = root = self.parseForm(data)
             variables = root['Variables']
             for name in variables:
                 self.setVariable(name, variables[name])
@@ -0,0 +1,230 @@
+'''
+AccountFiles.py
+
+Created on: 19.10.2026
+    Author: SeaPlusPro
+   License: CC0 1.0 Universal
+'''
+import os
+import time
+import fcntl
+import shutil
+import contextlib
+
+# the lock file used by lckpwdf() of the libc:
+PWD_LOCK = '.pwd.lock'
+ACCOUNT_FILES = ('passwd', 'group', 'shadow', 'gshadow')
+
+
+class AccountLock:
+    '''Locks the account files (passwd, group, shadow, gshadow) like the shadow tools do:
+    a lock of /etc/.pwd.lock (lckpwdf()) and a &lt;file&gt;.lock for each account file.
+    Usage: with AccountLock('/etc'): ...
+    '''
+
+    def __init__(self, etcDirectory: str='/etc', files=ACCOUNT_FILES, timeout: float=15.0):
+        '''Constructor.
+        @param etcDirectory: the directory containing the account files
+        @param files: the nodes of the files to lock
+        @param timeout: the maximal time in seconds to wait for the lock
+        '''
+        self._etcDirectory = etcDirectory
+        self._files = files
+        self._timeout = timeout
+        self._fd = None
+        self._locked = []
+
+    def __enter__(self):
+        self.lock()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.unlock()
+
+    def _lockFile(self, filename: str, end: float):
+        '''Creates the lock file of an account file (like the shadow tools).
+        @param filename: the account file to lock
+        @param end: the time when waiting for the lock ends
+        '''
+        lockFile = filename + '.lock'
+        while True:
+            try:
+                fd = os.open(lockFile, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+                os.write(fd, f'{os.getpid()}'.encode())
+                os.close(fd)
+                self._locked.append(lockFile)
+                break
+            except FileExistsError as exc:
+                if _isStaleLock(lockFile):
+                    os.unlink(lockFile)
+                elif time.time() > end:
+                    raise TimeoutError(f'cannot lock {filename}: locked by another process') from exc
+                else:
+                    time.sleep(0.1)
+
+    def lock(self):
+        '''Locks the account files.
+        @raise TimeoutError: the lock could not be set in the given time
+        '''
+        end = time.time() + self._timeout
+        self._fd = os.open(os.path.join(self._etcDirectory, PWD_LOCK), os.O_WRONLY | os.O_CREAT, 0o600)
+        while True:
+            try:
+                fcntl.lockf(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except OSError as exc:
+                if time.time() > end:
+                    os.close(self._fd)
+                    self._fd = None
+                    raise TimeoutError(f'cannot lock {self._etcDirectory}/{PWD_LOCK}') from exc
+                time.sleep(0.1)
+        try:
+            for node in self._files:
+                full = os.path.join(self._etcDirectory, node)
+                if os.path.exists(full):
+                    self._lockFile(full, end)
+        except TimeoutError:
+            self.unlock()
+            raise
+
+    def unlock(self):
+        '''Removes the locks.
+        '''
+        for lockFile in self._locked:
+            if os.path.exists(lockFile):
+                os.unlink(lockFile)
+        self._locked = []
+        if self._fd is not None:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+
+def _isStaleLock(lockFile: str) -> bool:
+    '''Tests whether a lock file belongs to a process that does not exist anymore.
+    @param lockFile: the file to inspect
+    @return: True: the process owning the lock is not running
+    '''
+    rc = False
+    try:
+        with open(lockFile, 'r', encoding='utf-8') as fp:
+            pid = int(fp.read().strip() or '0')
+        if pid > 0:
+            os.kill(pid, 0)
+    except ProcessLookupError:
+        rc = True
+    except (ValueError, OSError):
+        pass
+    return rc
+
+
+def _openTemp(temp: str):
+    '''Opens the temporary file used for rewriting an account file.
+    The file is readable for the owner only: the content may contain password hashes.
+    @param temp: the name of the temporary file
+    @return: the file object (opened for writing)
+    '''
+    handle = os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    # the mode of open() is ignored if a (stale) temporary file exists:
+    os.fchmod(handle, 0o600)
+    return os.fdopen(handle, 'w', encoding='utf-8')
+
+
+def _replace(filename: str, temp: str, backup: bool):
+    '''Replaces an account file by a new version with the same mode and owner.
+    @param filename: the file to replace
+    @param temp: the new version of the file
+    @param backup: True: the original is stored as &lt;filename&gt;-
+    '''
+    if os.path.exists(filename):
+        statInfo = os.stat(filename)
+        os.chmod(temp, statInfo.st_mode & 0o7777)
+        if os.geteuid() == 0:
+            os.chown(temp, statInfo.st_uid, statInfo.st_gid)
+        if backup:
+            shutil.copy2(filename, filename + '-')
+    os.replace(temp, filename)
+
+
+def appendEntries(filename: str, lines):
+    '''Appends lines to an account file with an atomic rewrite.
+    @param filename: the account file, e.g. '/etc/passwd'
+    @param lines: the lines to append (without newline)
+    '''
+    if len(lines) > 0:
+        entries = readEntries(filename)
+        entries += lines
+        writeAtomic(filename, entries)
+
+
+def daysSinceEpoch() -> int:
+    '''Returns the current date in the format of the field "last password change" of the shadow file.
+    @return: the days since 1.1.1970
+    '''
+    return int(time.time() // 86400)
+
+
+def patchEntries(filename: str, values, column: int=1, write: bool=True):
+    '''Replaces a field of many entries of an account file in one streaming pass.
+    The file is rewritten (atomically) only if at least one entry has changed.
+    @param filename: the account file, e.g. '/etc/shadow'
+    @param values: a dictionary name -> new value of the field
+    @param column: the index of the field to replace, e.g. 1 for the encoded password
+    @param write: False: the changes are only counted, nothing is written
+    @return: a tuple (unchanged, changed, missing): the names of the entries in each category
+    '''
+    unchanged = []
+    changed = []
+    temp = filename + '+'
+    with open(filename, 'r', encoding='utf-8') as fpIn, _openTemp(temp) if write else contextlib.nullcontext() as fpOut:
+        for line in fpIn:
+            parts = line.split(':')
+            if len(parts) > column and parts[0] in values:
+                if parts[column] == values[parts[0]]:
+                    unchanged.append(parts[0])
+                else:
+                    changed.append(parts[0])
+                    parts[column] = values[parts[0]]
+                    line = ':'.join(parts)
+            if fpOut is not None:
+                fpOut.write(line)
+        if fpOut is not None:
+            fpOut.flush()
+            os.fsync(fpOut.fileno())
+    if not write:
+        pass
+    elif len(changed) > 0:
+        _replace(filename, temp, True)
+    else:
+        os.unlink(temp)
+    found = set(unchanged + changed)
+    missing = [name for name in values if name not in found]
+    return (unchanged, changed, missing)
+
+
+def readEntries(filename: str):
+    '''Reads the lines of an account file.
+    @param filename: the file to read
+    @return: a list of lines without newline. Empty if the file does not exist
+    '''
+    rc = []
+    if os.path.exists(filename):
+        with open(filename, 'r', encoding='utf-8') as fp:
+            rc = fp.read().splitlines()
+    return rc
+
+
+def writeAtomic(filename: str, lines, backup: bool=True):
+    '''Writes an account file: the data are written into a temporary file which replaces the original.
+    Mode and owner are taken from the original.
+    @param filename: the file to write
+    @param lines: the lines to write (without newline)
+    @param backup: True: the original is stored as &lt;filename&gt;- (like the shadow tools)
+    '''
+    temp = filename + '+'
+    with _openTemp(temp) as fp:
+        for line in lines:
+            fp.write(line + '\n')
+        fp.flush()
+        os.fsync(fp.fileno())
+    _replace(filename, temp, backup)
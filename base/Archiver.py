@@ -0,0 +1,305 @@
+'''
+Archiver.py
+
+Created on: 19.10.2026
+    Author: SeaPlusPro
+   License: CC0 1.0 Universal
+'''
+import io
+import os
+import json
+import hashlib
+import stat
+import time
+import shutil
+import tarfile
+import subprocess
+import collections
+import concurrent.futures
+
+from base import FileHelper
+
+COMPRESSIONS = ('none', 'gz', 'bz2', 'xz', 'zstd')
+# files up to that size are read by the read-ahead threads, larger files are streamed:
+READ_AHEAD_LIMIT = 8 * 1024 * 1024
+# the pax header storing the file attributes (lsattr):
+PAX_ATTRIBUTES = 'F2L.attributes'
+PAX_XATTR_PREFIX = 'SCHILY.xattr.'
+
+
+def compressionOf(filename: str) -> str:
+    '''Returns the compression given by the extension of an archive name.
+    @param filename: the archive name, e.g. '/opt/archive/daily.tar.zst'
+    @return: one of COMPRESSIONS
+    '''
+    rc = 'none'
+    for extensions, compression in ((('.tar.gz', '.tgz'), 'gz'), (('.tar.bz2', '.tbz2'), 'bz2'),
+                                    (('.tar.xz', '.txz'), 'xz'), (('.tar.zst', '.tzst'), 'zstd')):
+        if filename.endswith(extensions):
+            rc = compression
+            break
+    return rc
+
+
+class TarWriter:
+    '''Stores files into a tar archive without a temporary file list and without an external tar program.
+    Reading the files (in a pool of threads) and compressing the archive work in parallel.
+    Usage: with TarWriter('/opt/x.tar.zst') as writer: writer.add(['/etc/passwd'])
+    '''
+
+    def __init__(self, filename: str, compression: str='auto', readAhead: int=4, attributes: bool=False,
+                 logger=None, headers=None):
+        '''Constructor.
+        @param filename: the archive to create
+        @param compression: one of COMPRESSIONS or 'auto': the compression is given by the extension of filename
+        @param readAhead: the number of threads reading the files
+        @param attributes: True: the file attributes (lsattr) are stored too (needs a process per file)
+        @param logger: None or the logger for error messages
+        @param headers: None or a dictionary with the global pax headers, e.g. { 'F2L.type': 'full' }
+        '''
+        self._filename = filename
+        self._compression = compressionOf(filename) if compression == 'auto' else compression
+        if self._compression not in COMPRESSIONS:
+            raise ValueError(f'unknown compression: {compression} Use one of: {" ".join(COMPRESSIONS)}')
+        self._readAhead = max(1, readAhead)
+        self._attributes = attributes
+        self._logger = logger
+        self._headers = headers or {}
+        self._tar = None
+        self._process = None
+        self._fileObj = None
+        self._start = None
+        self.files = 0
+        self.bytes = 0
+        self.errors = 0
+        self.failed = []
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    def _error(self, message: str):
+        '''Logs an error.
+        @param message: the error message
+        '''
+        self.errors += 1
+        if self._logger is not None:
+            self._logger.error(message)
+
+    def _prepare(self, name: str):
+        '''Reads the data needed for an archive entry. Called in a read-ahead thread.
+        @param name: the full filename
+        @return: a tuple (data, headers): data: None or the file content (small files)
+            headers: the pax headers (extended attributes)
+        '''
+        statInfo = os.lstat(name)
+        data = None
+        if stat.S_ISREG(statInfo.st_mode) and statInfo.st_size <= READ_AHEAD_LIMIT:
+            with open(name, 'rb') as fp:
+                data = fp.read()
+        headers = {}
+        try:
+            for key in os.listxattr(name, follow_symlinks=False):
+                value = os.getxattr(name, key, follow_symlinks=False)
+                headers[PAX_XATTR_PREFIX + key] = value.decode('utf-8', 'surrogateescape')
+        except OSError:
+            # the filesystem does not support extended attributes
+            pass
+        if self._attributes and (stat.S_ISREG(statInfo.st_mode) or stat.S_ISDIR(statInfo.st_mode)):
+            attributes = FileHelper.extendedAttributesOf(name)
+            if attributes != '':
+                headers[PAX_ATTRIBUTES] = attributes
+        return (data, headers)
+
+    def _store(self, name: str, prepared):
+        '''Writes one entry into the archive.
+        @param name: the full filename
+        @param prepared: the result of _prepare()
+        '''
+        data, headers = prepared
+        info = self._tar.gettarinfo(name, name.lstrip('/'))
+        if info is None:
+            # a socket: not storable
+            return
+        info.pax_headers = headers
+        if not info.isreg() or info.islnk():
+            self._tar.addfile(info)
+        elif data is not None:
+            info.size = len(data)
+            self._tar.addfile(info, io.BytesIO(data))
+        else:
+            with open(name, 'rb') as fp:
+                self._tar.addfile(info, fp)
+        self.files += 1
+        self.bytes += info.size if info.isreg() else 0
+
+    def _storePending(self, item):
+        '''Waits for the read-ahead of a file and writes it into the archive.
+        @param item: a tuple (name, future)
+        '''
+        name, future = item
+        try:
+            self._store(name, future.result())
+        except OSError as exc:
+            self.failed.append(name)
+            self._error(f'cannot archive {name}: {exc}')
+
+    def add(self, names, recursive: bool=True):
+        '''Stores files into the archive.
+        @param names: an iterable of full filenames
+        @param recursive: True: directories are stored with their content
+        '''
+        pending = collections.deque()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self._readAhead) as executor:
+            for name in (expandEntries(names) if recursive else names):
+                pending.append((name, executor.submit(self._prepare, name)))
+                # the read-ahead is bounded: the memory usage is limited:
+                while len(pending) > 2 * self._readAhead:
+                    self._storePending(pending.popleft())
+            while len(pending) > 0:
+                self._storePending(pending.popleft())
+
+    def close(self):
+        '''Finishes the archive.
+        '''
+        if self._tar is not None:
+            self._tar.close()
+            self._tar = None
+        if self._process is not None:
+            self._process.stdin.close()
+            exitCode = self._process.wait()
+            self._process = None
+            if exitCode != 0:
+                self._error(f'compression of {self._filename} failed: exit code {exitCode}')
+        if self._fileObj is not None:
+            self._fileObj.close()
+            self._fileObj = None
+
+    def duration(self) -> float:
+        '''Returns the time since opening the archive.
+        @return: the duration in seconds
+        '''
+        return 0.0 if self._start is None else time.time() - self._start
+
+    def open(self):
+        '''Creates the archive.
+        @raise ValueError: the compression program (zstd) is not available
+        '''
+        self._start = time.time()
+        if self._compression == 'zstd':
+            program = shutil.which('zstd')
+            if program is None:
+                raise ValueError('missing program zstd')
+            # pylint: disable-next=consider-using-with
+            self._process = subprocess.Popen([program, '-q', '-T0', '-f', '-o', self._filename],
+                                             stdin=subprocess.PIPE)
+            self._tar = tarfile.open(fileobj=self._process.stdin, mode='w|', format=tarfile.PAX_FORMAT,
+                                     pax_headers=self._headers)
+        else:
+            # pylint: disable-next=consider-using-with
+            self._fileObj = open(self._filename, 'wb')
+            mode = 'w|' if self._compression == 'none' else f'w|{self._compression}'
+            # pylint: disable-next=consider-using-with
+            self._tar = tarfile.open(fileobj=self._fileObj, mode=mode, format=tarfile.PAX_FORMAT,
+                                     pax_headers=self._headers)
+
+    def throughput(self) -> float:
+        '''Returns the throughput of the archiving.
+        @return: the stored bytes per second
+        '''
+        duration = self.duration()
+        return 0.0 if duration <= 0 else self.bytes / duration
+
+
+class SnapshotIndex:
+    '''Stores the state of the archived files of a form: the base of incremental archives.
+    The index contains the restore chain: the last full archive and the following incremental archives.
+    '''
+
+    def __init__(self, filename: str):
+        '''Constructor.
+        @param filename: the file storing the index (Json)
+        '''
+        self._filename = filename
+        # full filename -> [size, mtime (nanoseconds), inode, hash]
+        self.files = {}
+        # list of { 'Archive': filename, 'Type': 'full' or 'incremental', 'Time': date, 'Files': count, 'Deleted': [] }
+        self.chain = []
+
+    def load(self):
+        '''Reads the index from the file (if it exists).
+        '''
+        if os.path.exists(self._filename):
+            with open(self._filename, 'r', encoding='utf-8') as fp:
+                data = json.load(fp)
+            self.files = data.get('Files', {})
+            self.chain = data.get('Chain', [])
+
+    def save(self):
+        '''Writes the index into the file (atomically).
+        '''
+        os.makedirs(os.path.dirname(self._filename), exist_ok=True)
+        temp = self._filename + '+'
+        with open(temp, 'w', encoding='utf-8') as fp:
+            json.dump({'Chain': self.chain, 'Files': self.files}, fp, indent=0)
+        os.replace(temp, self._filename)
+
+    def scan(self, names, useHash: bool=False):
+        '''Compares the current state of files with the index.
+        @param names: an iterable of full filenames
+        @param useHash: True: a regular file with changed metadata but unchanged content is not reported as changed
+        @return: a tuple (current, changed, deleted): current: the new content of files
+            changed: the new or changed files deleted: the files missing since the last run
+        '''
+        current = {}
+        changed = []
+        for name in names:
+            try:
+                statInfo = os.lstat(name)
+            except OSError:
+                continue
+            entry = [statInfo.st_size, statInfo.st_mtime_ns, statInfo.st_ino, '']
+            old = self.files.get(name)
+            if old is not None and old[0:3] == entry[0:3]:
+                entry[3] = old[3]
+            else:
+                if useHash and stat.S_ISREG(statInfo.st_mode):
+                    entry[3] = _hashOf(name)
+                if old is None or entry[3] == '' or entry[3] != old[3]:
+                    changed.append(name)
+            current[name] = entry
+        deleted = [name for name in self.files if name not in current]
+        return (current, changed, deleted)
+
+
+def _hashOf(filename: str) -> str:
+    '''Returns the hash of a file content.
+    @param filename: the file to inspect
+    @return: '' (not readable) or the SHA-256 hash as hex string
+    '''
+    rc = ''
+    try:
+        digest = hashlib.sha256()
+        with open(filename, 'rb') as fp:
+            for block in iter(lambda: fp.read(1024 * 1024), b''):
+                digest.update(block)
+        rc = digest.hexdigest()
+    except OSError:
+        pass
+    return rc
+
+
+def expandEntries(names):
+    '''Returns the filenames to archive: directories are expanded recursively (like tar does).
+    @param names: an iterable of full filenames
+    @return: an iterator of full filenames
+    '''
+    for name in names:
+        yield name
+        if os.path.isdir(name) and not os.path.islink(name):
+            for path, dirs, files in os.walk(name):
+                for node in dirs + files:
+                    yield os.path.join(path, node)
@@ -0,0 +1,351 @@
+'''
+ChunkStore.py
+
+Created on: 19.10.2026
+    Author: SeaPlusPro
+   License: CC0 1.0 Universal
+'''
+import os
+import re
+import grp
+import pwd
+import json
+import stat
+import time
+import zlib
+import hashlib
+import functools
+
+# content defined chunking (FastCDC like): no cut point below MIN_CHUNK, a forced cut at MAX_CHUNK:
+MIN_CHUNK = 16 * 1024
+MAX_CHUNK = 256 * 1024
+# average chunk size: 64 KiB (16 bits of the rolling hash must be 0):
+CHUNK_MASK = (1 << 16) - 1
+MASK64 = (1 << 64) - 1
+READ_SIZE = 4 * 1024 * 1024
+# the random table of the gear hash: must be the same in all versions (otherwise no deduplication):
+GEAR = tuple(int.from_bytes(hashlib.sha256(bytes([ix])).digest()[0:8], 'little') for ix in range(256))
+# the cut test needs only the low 16 bits of the hash: they depend only on the last 16 bytes
+# (sum of GEAR[data[position - ix]] << ix for ix < 16). The low and high byte of GEAR as translation tables:
+WINDOW = 16
+GEAR_LOW = bytes(value & 0xff for value in GEAR)
+GEAR_HIGH = bytes((value >> 8) & 0xff for value in GEAR)
+# the number of bytes inspected at once by _firstCut():
+CUT_BLOCK = 32 * 1024
+
+
+@functools.lru_cache(maxsize=4)
+def _laneMask(count: int) -> int:
+    '''Returns the mask of the low 16 bits of count lanes with 32 bits.
+    @param count: the number of lanes
+    @return: the mask as integer
+    '''
+    return int.from_bytes(b'\xff\xff\0\0' * count, 'little')
+
+
+def _firstCut(data: bytes, first: int, last: int) -> int:
+    '''Searches the first cut point of the gear hash with a filled window.
+    All window hashes of a block are computed at once: one big integer with a 32 bit lane per byte
+    is shifted and added 16 times, so the loop over the bytes runs in C.
+    @param data: the data to inspect
+    @param first: the position where the hash has been reset
+    @param last: the end of the inspected range (excluding)
+    @return: -1 (no cut point) or the first position >= first + WINDOW - 1 whose hash has 16 zero bits
+    '''
+    blockStart = first
+    while last - blockStart >= WINDOW:
+        blockEnd = min(last, blockStart + CUT_BLOCK)
+        segment = bytes(data[blockStart:blockEnd])
+        count = len(segment)
+        lanes = bytearray(4 * count)
+        lanes[0::4] = segment.translate(GEAR_LOW)
+        lanes[1::4] = segment.translate(GEAR_HIGH)
+        # lane n gets the sum of GEAR[segment[n - ix]] << ix (ix < 16): a shift by ix lanes (32 bits) and ix bits.
+        # The 16 terms are summed by doubling: (1 + x)(1 + x**2)(1 + x**4)(1 + x**8) with x = 2**33
+        sums = int.from_bytes(lanes, 'little')
+        for shift in (33, 66, 132, 264):
+            sums += sums << shift
+        # only the low 16 bits of the first count lanes are needed: the carry never crosses a lane (< 2**32)
+        hashes = (sums & _laneMask(count)).to_bytes(4 * count, 'little')
+        # a lane with 16 zero bits: 4 zero bytes at a lane boundary
+        position = hashes.find(b'\0\0\0\0', 4 * (WINDOW - 1))
+        while position >= 0 and position % 4 != 0:
+            position = hashes.find(b'\0\0\0\0', position + 1)
+        if position >= 0:
+            return blockStart + position // 4
+        # the next block starts with the window of its first position:
+        blockStart = blockEnd - (WINDOW - 1)
+    return -1
+
+
+def chunkBoundaries(data: bytes, final: bool=True):
+    '''Splits data into content defined chunks: an insertion changes only the chunks near the insertion.
+    @param data: the data to split
+    @param final: False: more data will follow: the rest shorter than MAX_CHUNK is not returned as chunk
+    @return: an iterator of the end positions of the chunks
+    '''
+    length = len(data)
+    start = 0
+    gear = GEAR
+    while start < length and (final or length - start >= MAX_CHUNK):
+        end = min(length, start + MAX_CHUNK)
+        if end - start <= MIN_CHUNK:
+            yield end
+            break
+        position = start + MIN_CHUNK
+        value = 0
+        cut = -1
+        # the first bytes after the reset of the hash: the window is not filled
+        head = min(end, position + WINDOW - 1)
+        while position < head:
+            value = ((value << 1) + gear[data[position]]) & MASK64
+            position += 1
+            if value & CHUNK_MASK == 0:
+                cut = position
+                break
+        if cut < 0:
+            found = _firstCut(data, start + MIN_CHUNK, end)
+            cut = end if found < 0 else found + 1
+        yield cut
+        start = cut
+
+
+class ChunkStore:
+    '''A repository storing the content of files as deduplicated chunks.
+    Layout: &lt;repository&gt;/chunks/&lt;2 hex digits&gt;/&lt;sha256&gt;: the compressed chunks
+    &lt;repository&gt;/index: the ids of the stored chunks
+    &lt;repository&gt;/manifests/&lt;name&gt;.&lt;datetime&gt;.json: the file list of each run
+    '''
+
+    def __init__(self, repository: str, logger=None):
+        '''Constructor.
+        @param repository: the base directory of the repository (created if needed)
+        @param logger: None or the logger for error messages
+        '''
+        self._repository = repository
+        self._logger = logger
+        self._known = set()
+        self._index = None
+        self.files = 0
+        self.bytes = 0
+        self.unchangedFiles = 0
+        self.newChunks = 0
+        self.knownChunks = 0
+        self.storedBytes = 0
+        self.errors = 0
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    def _error(self, message: str):
+        '''Logs an error.
+        @param message: the error message
+        '''
+        self.errors += 1
+        if self._logger is not None:
+            self._logger.error(message)
+
+    def _storeChunk(self, data) -> str:
+        '''Stores a chunk if it is not already known.
+        @param data: the chunk data
+        @return: the id of the chunk (SHA-256 as hex string)
+        '''
+        chunkId = hashlib.sha256(data).hexdigest()
+        if chunkId in self._known:
+            self.knownChunks += 1
+        else:
+            full = self.chunkFile(chunkId)
+            os.makedirs(os.path.dirname(full), exist_ok=True)
+            compressed = zlib.compress(data, 6)
+            temp = full + '+'
+            with open(temp, 'wb') as fp:
+                fp.write(compressed)
+            os.replace(temp, full)
+            self._index.write(chunkId + '\n')
+            self._known.add(chunkId)
+            self.newChunks += 1
+            self.storedBytes += len(compressed)
+        return chunkId
+
+    def _storeFile(self, name: str):
+        '''Splits a regular file into chunks and stores them.
+        @param name: the file to store
+        @return: the list of chunk ids
+        '''
+        rc = []
+        rest = b''
+        with open(name, 'rb') as fp:
+            while True:
+                block = fp.read(READ_SIZE)
+                final = len(block) == 0
+                data = rest + block
+                start = 0
+                for end in chunkBoundaries(data, final):
+                    rc.append(self._storeChunk(data[start:end]))
+                    start = end
+                rest = data[start:]
+                if final:
+                    break
+        return rc
+
+    def chunkFile(self, chunkId: str) -> str:
+        '''Returns the filename of a chunk.
+        @param chunkId: the id of the chunk
+        @return: the full filename in the repository
+        '''
+        return os.path.join(self._repository, 'chunks', chunkId[0:2], chunkId)
+
+    def close(self):
+        '''Closes the repository.
+        '''
+        if self._index is not None:
+            self._index.close()
+            self._index = None
+
+    def entryOf(self, name: str, previous):
+        '''Builds the manifest entry of a file and stores the content (if changed).
+        @param name: the full filename
+        @param previous: None or the manifest entry of the last run: the content of an unchanged file is not read
+        @return: the manifest entry
+        '''
+        statInfo = os.lstat(name)
+        entry = {'Mode': stat.S_IMODE(statInfo.st_mode), 'Uid': statInfo.st_uid, 'Gid': statInfo.st_gid,
+                 'User': _userName(statInfo.st_uid), 'Group': _groupName(statInfo.st_gid),
+                 'Mtime': statInfo.st_mtime_ns, 'Size': 0}
+        if stat.S_ISDIR(statInfo.st_mode):
+            entry['Type'] = 'dir'
+        elif stat.S_ISLNK(statInfo.st_mode):
+            entry['Type'] = 'link'
+            entry['Target'] = os.readlink(name)
+        elif stat.S_ISREG(statInfo.st_mode):
+            entry['Type'] = 'file'
+            entry['Size'] = statInfo.st_size
+            entry['Inode'] = statInfo.st_ino
+            if (previous is not None and previous.get('Type') == 'file' and previous['Size'] == statInfo.st_size
+                    and previous['Mtime'] == statInfo.st_mtime_ns and previous.get('Inode') == statInfo.st_ino):
+                entry['Chunks'] = previous['Chunks']
+                self.unchangedFiles += 1
+            else:
+                entry['Chunks'] = self._storeFile(name)
+        else:
+            entry = None
+        if entry is not None:
+            xattrs = _xattrsOf(name)
+            if xattrs:
+                entry['Xattrs'] = xattrs
+        return entry
+
+    def lastManifest(self, name: str):
+        '''Returns the newest manifest of a given name.
+        @param name: the name of the manifest (without date and extension)
+        @return: None or the filename of the manifest
+        '''
+        rc = None
+        path = os.path.join(self._repository, 'manifests')
+        if os.path.isdir(path):
+            rexpr = re.compile(re.escape(name) + r'\.\d{8}-\d{6}\.\d{3}\.json$')
+            nodes = sorted(node for node in os.listdir(path) if rexpr.match(node))
+            if nodes:
+                rc = os.path.join(path, nodes[-1])
+        return rc
+
+    def open(self):
+        '''Opens (or creates) the repository.
+        '''
+        os.makedirs(os.path.join(self._repository, 'chunks'), exist_ok=True)
+        os.makedirs(os.path.join(self._repository, 'manifests'), exist_ok=True)
+        fnIndex = os.path.join(self._repository, 'index')
+        if os.path.exists(fnIndex):
+            with open(fnIndex, 'r', encoding='utf-8') as fp:
+                self._known = set(fp.read().split())
+        # pylint: disable-next=consider-using-with
+        self._index = open(fnIndex, 'a', encoding='utf-8')
+
+    def readChunk(self, chunkId: str) -> bytes:
+        '''Returns the content of a chunk.
+        @param chunkId: the id of the chunk
+        @return: the uncompressed data
+        '''
+        with open(self.chunkFile(chunkId), 'rb') as fp:
+            return zlib.decompress(fp.read())
+
+    def store(self, names, manifestName: str, info=None) -> str:
+        '''Stores files into the repository and writes the manifest of the run.
+        @param names: an iterable of full filenames (directories are not expanded)
+        @param manifestName: the name of the manifest, e.g. the form name
+        @param info: None or a dictionary with additional info stored in the manifest
+        @return: the filename of the new manifest
+        '''
+        previous = {}
+        fnLast = self.lastManifest(manifestName)
+        if fnLast is not None:
+            with open(fnLast, 'r', encoding='utf-8') as fp:
+                previous = json.load(fp).get('Files', {})
+        files = {}
+        for name in names:
+            try:
+                entry = self.entryOf(name, previous.get(name))
+                if entry is not None:
+                    files[name] = entry
+                    self.files += 1
+                    self.bytes += entry['Size']
+            except OSError as exc:
+                self._error(f'cannot store {name}: {exc}')
+        self._index.flush()
+        manifest = dict(info or {})
+        manifest['Created'] = time.strftime('%Y-%m-%d %H:%M:%S')
+        manifest['Files'] = files
+        # unique and sortable by creation time:
+        now = time.time()
+        rc = os.path.join(self._repository, 'manifests',
+                          f'{manifestName}.{time.strftime("%Y%m%d-%H%M%S", time.localtime(now))}'
+                          f'.{int(now * 1000) % 1000:03d}.json')
+        temp = rc + '+'
+        with open(temp, 'w', encoding='utf-8') as fp:
+            json.dump(manifest, fp, indent=0)
+        os.replace(temp, rc)
+        return rc
+
+
+@functools.lru_cache(maxsize=None)
+def _groupName(gid: int) -> str:
+    '''Returns the name of a group.
+    @param gid: the group id
+    @return: '' (unknown) or the group name
+    '''
+    try:
+        rc = grp.getgrgid(gid).gr_name
+    except KeyError:
+        rc = ''
+    return rc
+
+
+@functools.lru_cache(maxsize=None)
+def _userName(uid: int) -> str:
+    '''Returns the name of a user.
+    @param uid: the user id
+    @return: '' (unknown) or the user name
+    '''
+    try:
+        rc = pwd.getpwuid(uid).pw_name
+    except KeyError:
+        rc = ''
+    return rc
+
+
+def _xattrsOf(name: str):
+    '''Returns the extended attributes of a file.
+    @param name: the file to inspect
+    @return: a dictionary name -> value (hex string)
+    '''
+    rc = {}
+    try:
+        for key in os.listxattr(name, follow_symlinks=False):
+            rc[key] = os.getxattr(name, key, follow_symlinks=False).hex()
+    except OSError:
+        pass
+    return rc
@@ -0,0 +1,128 @@
+'''
+DpkgStatus.py
+
+Created on: 19.10.2026
+    Author: SeaPlusPro
+   License: CC0 1.0 Universal
+'''
+import os
+import pickle
+
+STATUS_FILE = '/var/lib/dpkg/status'
+# the index of the current process: (filename, mtime, size, inode) -> packages
+_memoryCache = {}
+
+
+def cachedStatus(filename: str=STATUS_FILE, cacheFile: str=None) -> dict:
+    '''Returns the installed packages using a cache: the status file is only parsed if it has been changed.
+    The cache is stored in the memory of the process and (if cacheFile is given) as pickle file.
+    @param filename: the status file of dpkg
+    @param cacheFile: None or the file storing the parsed index between the runs
+    @return: a dictionary name -> version (see parseStatus())
+    '''
+    try:
+        statInfo = os.stat(filename)
+    except FileNotFoundError:
+        return {}
+    key = (filename, statInfo.st_mtime_ns, statInfo.st_size, statInfo.st_ino)
+    rc = _memoryCache.get(key)
+    if rc is None and cacheFile is not None:
+        rc = _loadCache(cacheFile, key)
+    if rc is None:
+        rc = readStatus(filename)
+        if cacheFile is not None:
+            _saveCache(cacheFile, key, rc)
+    _memoryCache.clear()
+    _memoryCache[key] = rc
+    return rc
+
+
+def missingPackages(packages, installed) -> list:
+    '''Returns the packages which must be installed by apt.
+    @param packages: an iterable of package names, e.g. ['htop', 'php8.2-curl:amd64', 'nginx=1.22.1-9']
+        A version given with "=" must be installed exactly
+    @param installed: the installed packages: a dictionary name -> version (see parseStatus())
+    @return: the list of the packages (with version if given) not installed or installed with another version
+    '''
+    rc = []
+    for package in packages:
+        name, _, version = package.partition('=')
+        current = installed.get(name)
+        if current is None or version not in ('', current):
+            rc.append(package)
+    return rc
+
+
+def parseStatus(data: str) -> dict:
+    '''Parses the content of the dpkg status database.
+    @param data: the content of /var/lib/dpkg/status
+    @return: a dictionary name -> version of the installed packages.
+        Each package is stored with and without architecture, e.g. "libc6" and "libc6:amd64"
+    '''
+    rc = {}
+    for stanza in data.split('\n\n'):
+        name = version = architecture = None
+        installed = False
+        for line in stanza.split('\n'):
+            if line.startswith('Package: '):
+                name = line[9:]
+            elif line.startswith('Status: '):
+                # e.g. "install ok installed", "deinstall ok config-files", "install ok half-configured"
+                installed = line.endswith(' installed')
+            elif line.startswith('Version: '):
+                version = line[9:]
+            elif line.startswith('Architecture: '):
+                architecture = line[14:]
+        if name is not None and installed:
+            rc[name] = version
+            if architecture is not None:
+                rc[f'{name}:{architecture}'] = version
+    return rc
+
+
+def readStatus(filename: str=STATUS_FILE) -> dict:
+    '''Reads the installed packages from the dpkg status database.
+    @param filename: the status file of dpkg
+    @return: a dictionary name -> version (see parseStatus()). Empty if the file does not exist (no dpkg)
+    '''
+    try:
+        with open(filename, 'r', encoding='utf-8', errors='replace') as fp:
+            data = fp.read()
+    except FileNotFoundError:
+        data = ''
+    return parseStatus(data)
+
+
+def _loadCache(cacheFile: str, key):
+    '''Reads the index stored by _saveCache().
+    @param cacheFile: the pickle file
+    @param key: the identity of the status file: (filename, mtime, size, inode)
+    @return: None (missing, outdated or not trustworthy) or the packages: a dictionary name -> version
+    '''
+    rc = None
+    try:
+        # a pickle file can execute code: only files of the current user or root are accepted
+        if os.stat(cacheFile).st_uid in (0, os.geteuid()):
+            with open(cacheFile, 'rb') as fp:
+                data = pickle.load(fp)
+            if data[0] == key:
+                rc = data[1]
+    except (OSError, EOFError, pickle.UnpicklingError, IndexError, TypeError):
+        pass
+    return rc
+
+
+def _saveCache(cacheFile: str, key, packages):
+    '''Stores the index as pickle file (atomically). Errors are ignored: the cache is optional.
+    @param cacheFile: the pickle file
+    @param key: the identity of the status file: (filename, mtime, size, inode)
+    @param packages: the dictionary name -> version
+    '''
+    temp = f'{cacheFile}.{os.getpid()}'
+    try:
+        with open(temp, 'wb') as fp:
+            pickle.dump((key, packages), fp, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp, cacheFile)
+    except OSError:
+        if os.path.exists(temp):
+            os.unlink(temp)
@@ -16,15 +16,18 @@ import tarfile
 import zipfile
 import tempfile
 import fnmatch
+import itertools
+import collections
+import concurrent.futures
 
 from base import Const
+from base import LazyRegex
 from base import StringUtils
 from base import LinuxUtils
 from base import ProcessHelper
 from base import MemoryLogger
-from text import TextProcessor
 
-REG_EXPR_WILDCARDS = re.compile(r'[*?\[\]]')
+REG_EXPR_WILDCARDS = LazyRegex.LazyRegex(r'[*?\[\]]')
 GLOBAL_UNIT_TEST_MODE = None
 CURRDIR_PREFIX = '.' + os.sep
 
@@ -330,6 +333,9 @@ def copyByRule(fnSource: str, fnTarget: str, options: str, depthRelPath: int):
                         os.makedirs(fnTarget)
                         shutil.copystat(fnSource, fnTarget)
                 elif 'replace' in options:
+                    # imported on demand: TextProcessor is big and rarely needed
+                    # pylint: disable-next=import-outside-toplevel
+                    from text import TextProcessor
                     processor = TextProcessor.TextProcessor(MemoryLogger.MemoryLogger.globalLogger())
                     processor.readFile(fnSource, mustExists=True)
                     value = options['replace']
@@ -587,7 +593,7 @@ def expandPathPlaceholders(pattern: str, filename: str):
         elif name == 'datetime':
             value = now.strftime('%Y.%m.%d-%H_%M_%S')
         elif name == 'seconds':
-            value = now.strftime('%a')
+            value = str(int(now.timestamp()))
         elif name == 'path':
             value = parts['path']
         elif name == 'node':
@@ -600,52 +606,120 @@ def expandPathPlaceholders(pattern: str, filename: str):
     return pattern
 
 
-def expandWildcards(path: str, nodesList: str, names):
+def _compileWildcards(pattern: str):
+    '''Returns the compiled regular expression of a pattern with shell wildcards.
+    @param pattern: a pattern with shell wildcards "*", "?", "[a-z]"
+    @return: the method "match" of the compiled regular expression
+    '''
+    return re.compile(fnmatch.translate(pattern)).match
+
+
+def _scanDirectory(path: str):
+    '''Returns the entries of a directory.
+    @param path: the directory to inspect
+    @return: a list of os.DirEntry instances. Empty on errors
+    '''
+    rc = []
+    try:
+        with os.scandir(path) as entries:
+            rc = list(entries)
+    except PermissionError as exc:
+        _error(f'cannot enter directory {path}: {exc}')
+    except OSError:
+        # the directory has been removed since the last inspection
+        pass
+    return rc
+
+
+def _expandDirectory(item: str, matchers):
+    '''Replaces the first node with wildcards of a path by the matching subdirectories.
+    @param item: a path with or without wildcards, without trailing '/'
+    @param matchers: a dictionary pattern -> compiled matcher (a cache)
+    @return: a tuple (directory, children): directory: None or the item if it is an existing directory
+        children: the paths of the next step
+    '''
+    directory = None
+    children = []
+    if not hasWildcards(item):
+        if os.path.isdir(item):
+            directory = item
+    else:
+        items = item.split('/')
+        for ix, part in enumerate(items):
+            if hasWildcards(part):
+                prefix = '' if ix == 0 else '/'.join(items[0:ix])
+                if prefix != '':
+                    suffix = '' if ix >= len(items) - 1 else '/'.join(items[ix+1:])
+                    matcher = matchers[part]
+                    for entry in _scanDirectory(prefix):
+                        if matcher(entry.name) and entry.is_dir():
+                            children.append(f'{prefix}/{entry.name}/{suffix}')
+                # Handle only the first wildcard:
+                break
+    return (directory, children)
+
+
+def _expandNodes(path: str, nodes, matchers):
+    '''Finds the files of a directory given by a list of nodes.
+    @param path: the directory to inspect
+    @param nodes: a list of nodes with or without wildcards
+    @param matchers: a dictionary pattern -> compiled matcher
+    @return: the list of full filenames
+    '''
+    rc = []
+    entries = None
+    for node in nodes:
+        if not hasWildcards(node):
+            full = f'{path}/{node}'
+            if os.path.exists(full):
+                rc.append(full)
+        else:
+            if entries is None:
+                entries = _scanDirectory(path)
+            matcher = matchers[node]
+            for entry in entries:
+                # only files (no directories) and no broken symbolic links:
+                if (matcher(entry.name) and not entry.is_dir()
+                        and (not entry.is_symlink() or os.path.exists(entry.path))):
+                    rc.append(entry.path)
+    return rc
+
+
+def expandWildcards(path: str, nodesList: str, names, parallel: int=4):
     '''Expands a path with wildcards and a list of nodes with wildcards into a list of concrete names.
+    Independent subtrees are inspected in parallel.
     @param path: that path will inspected. Can have wildcards.
     @param nodesList: a comma separated list of nodes with or without wildcards
     @param names: OUT: a list of concrete full filenames matching the path and the nodeList
+    @param parallel: the maximal number of directories inspected at the same time
     '''
-    unprocessed = [path]
-    processed = []
-
     def dirName(x):
         return x if not x.endswith('/') else x[0:-1]
-    while len(unprocessed) > 0:
-        item = dirName(unprocessed[0])
-        unprocessed = unprocessed[1:]
-        if not hasWildcards(item):
-            if os.path.isdir(item):
-                processed.append(item)
-        else:
-            items = item.split('/')
-            ix = -1
-            for part in items:
-                ix += 1
-                if hasWildcards(part):
-                    prefix = '' if ix == 0 else '/'.join(items[0:ix])
-                    if os.path.isdir(prefix):
-                        nodes = expandFiles(prefix, part, True, False)
-                        suffix = '' if ix >= len(
-                            items) - 1 else '/'.join(items[ix+1:])
-                        for node in nodes:
-                            unprocessed.append(f'{prefix}/{node}/{suffix}')
-                        # Handle only the first wildcard:
-                        break
-    nodesList2 = nodesList.split(',')
-    for path2 in processed:
-        path2 = dirName(path2)
-        for node in nodesList2:
-            if not hasWildcards(node):
-                full = f'{path2}/{node}'
-                if os.path.exists(full):
-                    names.append(full)
+    matchers = {}
+    for part in path.split('/') + nodesList.split(','):
+        if hasWildcards(part) and part not in matchers:
+            matchers[part] = _compileWildcards(part)
+    nodes = nodesList.split(',')
+    processed = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, parallel)) as executor:
+        unprocessed = collections.deque([dirName(path)])
+        while len(unprocessed) > 0:
+            # one generation: the order of the results is the order of the (breadth first) queue:
+            generation = [unprocessed.popleft() for _ix in range(len(unprocessed))]
+            if len(generation) == 1:
+                results = [_expandDirectory(generation[0], matchers)]
             else:
-                nodes2 = expandFiles(path2, node, False)
-                for node3 in nodes2:
-                    full = f'{path2}/{node3}'
-                    if os.path.exists(full):
-                        names.append(full)
+                results = executor.map(_expandDirectory, generation, itertools.repeat(matchers))
+            for directory, children in results:
+                if directory is not None:
+                    processed.append(directory)
+                unprocessed.extend(dirName(child) for child in children)
+        if len(processed) == 1:
+            results = [_expandNodes(processed[0], nodes, matchers)]
+        else:
+            results = executor.map(_expandNodes, processed, itertools.repeat(nodes), itertools.repeat(matchers))
+        for files in results:
+            names += files
 
 
 def fileClass(path: str):
@@ -0,0 +1,72 @@
+'''
+Fingerprints.py
+
+Created on: 19.10.2026
+    Author: SeaPlusPro
+   License: CC0 1.0 Universal
+'''
+import os
+import json
+import hashlib
+
+
+def hashOfData(data: str) -> str:
+    '''Returns the fingerprint of a string.
+    @param data: the string to inspect, e.g. the contents of a file to write
+    @return: the SHA-256 hash as hex string
+    '''
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+class Fingerprints:
+    '''Stores the fingerprints of the artifacts managed by form2linux: the content hash of written and copied files.
+    Used by the convergence mode to skip operations already done.
+    The hash of a file is only computed again if its size or modification time has been changed.
+    '''
+
+    def __init__(self, filename: str):
+        '''Constructor.
+        @param filename: the Json file storing the fingerprints
+        '''
+        self._filename = filename
+        # full filename -> [size, mtime (nanoseconds), hash]
+        self.files = {}
+
+    def hashOf(self, filename: str) -> str:
+        '''Returns the content hash of a file.
+        @param filename: the file to inspect
+        @return: '' (file not readable) or the SHA-256 hash as hex string
+        '''
+        rc = ''
+        try:
+            statInfo = os.stat(filename)
+            entry = self.files.get(filename)
+            if entry is not None and entry[0] == statInfo.st_size and entry[1] == statInfo.st_mtime_ns:
+                rc = entry[2]
+            else:
+                digest = hashlib.sha256()
+                with open(filename, 'rb') as fp:
+                    for block in iter(lambda: fp.read(1024 * 1024), b''):
+                        digest.update(block)
+                rc = digest.hexdigest()
+                self.files[filename] = [statInfo.st_size, statInfo.st_mtime_ns, rc]
+        except OSError:
+            pass
+        return rc
+
+    def load(self):
+        '''Reads the fingerprints from the file (if it exists).
+        '''
+        if os.path.exists(self._filename):
+            with open(self._filename, 'r', encoding='utf-8') as fp:
+                data = json.load(fp)
+            self.files = data.get('Files', {})
+
+    def save(self):
+        '''Writes the fingerprints into the file (atomically).
+        '''
+        os.makedirs(os.path.dirname(self._filename), exist_ok=True)
+        temp = self._filename + '+'
+        with open(temp, 'w', encoding='utf-8') as fp:
+            json.dump({'Files': self.files}, fp, indent=0)
+        os.replace(temp, self._filename)
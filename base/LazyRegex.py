@@ -0,0 +1,44 @@
+'''
+LazyRegex.py
+
+Created on: 19.10.2026
+    Author: SeaPlusPro
+   License: CC0 1.0 Universal
+'''
+import re
+
+
+class LazyRegex:
+    '''A regular expression compiled on first use.
+    Module or class constants can be defined without paying the compile time at import.
+    Usage like a compiled expression: REG_EXPR = LazyRegex(r'^\\d+$') ... REG_EXPR.match(text)
+    '''
+
+    def __init__(self, pattern: str, flags: int=0):
+        '''Constructor.
+        @param pattern: the regular expression
+        @param flags: the flags of re.compile(), e.g. re.I
+        '''
+        self.pattern = pattern
+        self.flags = flags
+        self._compiled = None
+
+    def __getattr__(self, name: str):
+        '''Returns an attribute of the compiled expression, e.g. match or sub.
+        The attribute is stored in the instance: the next access does not come here.
+        @param name: the name of the attribute
+        @return: the attribute of the compiled expression
+        '''
+        if name.startswith('__') or name == '_compiled':
+            raise AttributeError(name)
+        rc = getattr(self.compiled(), name)
+        setattr(self, name, rc)
+        return rc
+
+    def compiled(self) -> re.Pattern:
+        '''Returns the compiled expression (compiles it if needed).
+        @return: the compiled expression
+        '''
+        if self._compiled is None:
+            self._compiled = re.compile(self.pattern, self.flags)
+        return self._compiled
@@ -49,6 +49,29 @@ def diskFree(verboseLevel: int=0, logger: Logger.Logger=None):
     return rc
 
 
+def blockDevices(baseDirectory: str='/sys/block'):
+    '''Returns the block devices (like the command "lsblk" without partitions).
+    @param baseDirectory: the directory containing the block device info
+    @return: a list of arrays [name, sizeBytes, removable, readOnly, model],
+        e.g. [['sda', 500107862016, False, False, 'Samsung SSD 860']]
+    '''
+    def readValue(name: str, node: str):
+        try:
+            with open(os.path.join(baseDirectory, name, node), 'r', encoding='utf-8') as fp:
+                rc = fp.read().strip()
+        except OSError:
+            rc = ''
+        return rc
+    rc = []
+    if os.path.isdir(baseDirectory):
+        for name in sorted(os.listdir(baseDirectory)):
+            # the size is given in sectors of 512 bytes:
+            size = StringUtils.asInt(readValue(name, 'size'), 0) * 512
+            rc.append([name, size, readValue(name, 'removable') == '1', readValue(name, 'ro') == '1',
+                       readValue(name, 'device/model')])
+    return rc
+
+
 def diskInfo(path: str):
     '''Returns some infe about a mounted block device.
     @param path: the mount path
@@ -198,6 +221,7 @@ def stress(patternDisks: str, patternInterface: str):
     @param patternDisk: a regular expression of the disk devices used for the result (sum is built), e.g. 'sd[ab]'
     @param patternInterface: a regular expression of the network interfaces used for the result (sum is built), e.g. 'eth0|wlan0'
     @return: [ioReadBytes, ioWriteBytes, netReadBytes, netWriteBytes, load1Minute, memoryAvailable, swapAvailable]
+    @see Sampler.Sampler for periodic sampling with rates
     '''
     readIO = 0
     writeIO = 0
@@ -236,8 +260,8 @@ def stress(patternDisks: str, patternInterface: str):
             if rexprNet.match(parts[0][0:-1]) is not None:
                 readNet += int(parts[1])
                 writeNet += int(parts[9])
-    with open('/proc/loadavg', 'rb', encoding='utf-8') as fp:
-        loadMin1 = float(fp.read().decode().split()[0])
+    with open('/proc/loadavg', 'r', encoding='utf-8') as fp:
+        loadMin1 = float(fp.read().split()[0])
     #@return: [TOTAL_RAM, AVAILABLE_RAM, TOTAL_SWAP, FREE_SWAP, BUFFERS]
     with open('/proc/meminfo', 'r', encoding='utf-8') as fp:
         lines = fp.read().split('\n')
@@ -290,8 +314,8 @@ def load():
     '''Returns average loads.
     @return: [LOAD_1_MINUTE, LOAD_5_MINUTE, LOAD_10_MINUTE, RUNNING_PROCESSES, PROCESSES]
     '''
-    with open('/proc/loadavg', 'rb', encoding='utf-8') as fp:
-        data = fp.read().decode()
+    with open('/proc/loadavg', 'r', encoding='utf-8') as fp:
+        data = fp.read()
         matcher = re.match(r'(\S+)\s+(\S+)\s+(\S+)\s+(\d+)/(\d+)', data)
         if matcher is None:
             rc = None
@@ -310,10 +334,41 @@ def memoryInfo():
     '''Returns the memory usage.
     @return: [TOTAL_RAM, AVAILABLE_RAM, TOTAL_SWAP, FREE_SWAP, BUFFERS]
     '''
-    with open('/proc/meminfo', 'rb', encoding='utf-8') as fp:
-        lines = fp.read().decode().split('\n')
-        rc = [_getNumber(lines[0]), _getNumber(lines[2]), _getNumber(
-            lines[14]), _getNumber(lines[15]), _getNumber(lines[3])]
+    values = memoryValues()
+    rc = [values.get('MemTotal', 0), values.get('MemAvailable', 0), values.get('SwapTotal', 0),
+          values.get('SwapFree', 0), values.get('Buffers', 0)]
+    return rc
+
+
+def memoryValues(filename: str='/proc/meminfo'):
+    '''Returns all values of the memory info.
+    @param filename: the file to inspect
+    @return: a dictionary name -> value (in kByte), e.g. { 'MemTotal': 6147400, 'MemFree': 5272276 ... }
+    '''
+    rc = {}
+    with open(filename, 'r', encoding='utf-8') as fp:
+        for line in fp:
+            # MemTotal:        6147400 kB
+            parts = line.split()
+            if len(parts) >= 2:
+                rc[parts[0].rstrip(':')] = int(parts[1])
+    return rc
+
+
+def mountInfo(filename: str='/proc/mounts'):
+    '''Returns the mounted filesystems (like the command "mount").
+    @param filename: the file to inspect
+    @return: a list of arrays [device, mountPath, fsType, options],
+        e.g. [['/dev/sda1', '/', 'ext4', 'rw,relatime']]
+    '''
+    rc = []
+    with open(filename, 'r', encoding='utf-8') as fp:
+        for line in fp:
+            # /dev/vda / ext4 rw,relatime 0 0
+            parts = line.split()
+            if len(parts) >= 4:
+                # the kernel escapes blanks as \040:
+                rc.append([parts[0], parts[1].replace('\\040', ' '), parts[2], parts[3]])
     return rc
 
 
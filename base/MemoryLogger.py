@@ -37,7 +37,7 @@ class MemoryLogger(Logger.Logger):
         @return: True: the log (or the errors) contains the string
         '''
         rc = False
-        for line in self._lines:
+        for line in self.getMessages():
             if not errorsToo and line.startswith('+++'):
                 continue
             if line.find(string) >= 0:
@@ -56,7 +56,7 @@ class MemoryLogger(Logger.Logger):
         for item in self._firstErrors:
             logger.error(item)
         if messagesToo:
-            for item in self._lines:
+            for item in self.getMessages():
                 logger.log(item, 4)
 
     def getMessages(self):
@@ -97,7 +97,7 @@ class MemoryLogger(Logger.Logger):
         regExpr = StringUtils.regExprCompile(
             pattern, 'memory logger pattern', None, flags == 0)
         if regExpr is not None:
-            for line in self._lines:
+            for line in self.getMessages():
                 if not errorsToo and line.startswith('+++'):
                     continue
                 if regExpr.search(line):
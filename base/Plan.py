@@ -0,0 +1,208 @@
+'''
+Plan.py
+
+Created on: 19.10.2026
+    Author: SeaPlusPro
+   License: CC0 1.0 Universal
+'''
+import os
+import json
+import hashlib
+import collections
+
+# the types of the operations:
+KINDS = ('copy', 'ensure', 'mkdir', 'remove', 'run', 'save', 'write')
+
+
+class Operation:
+    '''One step of a plan, e.g. creating a directory or running a program.
+    '''
+
+    def __init__(self, ident: int, kind: str, description: str, args, depends):
+        '''Constructor.
+        @param ident: the unique id of the operation inside the plan (1..N)
+        @param kind: the type of the operation: one of KINDS
+        @param description: a shell like description, e.g. "mkdir -p /opt/x"
+        @param args: a dictionary with the arguments of the operation
+        @param depends: a list of ids: those operations must be finished before this operation starts
+        '''
+        self.ident = ident
+        self.kind = kind
+        self.description = description
+        self.args = args
+        self.depends = depends
+        # the execution time in seconds (None: not executed):
+        self.duration = None
+        # True: the target is already in the wanted state (convergence mode)
+        self.skipped = False
+
+    def signature(self) -> str:
+        '''Returns a string identifying the operation independent of its position in the plan.
+        @return: the signature, used for comparing plans
+        '''
+        data = self.toJson()
+        del data['Id']
+        del data['Depends']
+        return json.dumps(data, sort_keys=True)
+
+    def toJson(self):
+        '''Returns the operation as Json data.
+        The contents of a file is not stored, only its size and hash.
+        @return: a dictionary
+        '''
+        rc = {'Id': self.ident, 'Type': self.kind, 'Description': self.description, 'Depends': self.depends}
+        for key, value in self.args.items():
+            if key == 'contents':
+                data = value.encode('utf-8')
+                rc['Size'] = len(data)
+                rc['Hash'] = hashlib.sha256(data).hexdigest()
+            else:
+                rc[key[0].upper() + key[1:]] = value
+        return rc
+
+
+class Plan:
+    '''A list of operations with dependencies: the result of a builder before anything is changed on the system.
+    The dependencies are derived from the touched paths: an operation depends on the last operation touching
+    the same path or a parent directory. An operation with unknown paths (e.g. running a program) is a barrier:
+    it depends on all previous operations and all following operations depend on it.
+    '''
+
+    def __init__(self):
+        '''Constructor.
+        '''
+        self.operations = []
+        # path -> id of the last operation touching it:
+        self._lastTouch = {}
+        self._barrier = None
+        self._sinceBarrier = []
+        self._directories = set()
+        self._removed = set()
+
+    def _dependenciesOf(self, paths):
+        '''Returns the operations an operation touching the given paths depends on.
+        @param paths: the touched paths
+        @return: the sorted list of operation ids
+        '''
+        rc = set()
+        if self._barrier is not None:
+            rc.add(self._barrier)
+        for path in paths:
+            path = os.path.normpath(path)
+            while True:
+                ident = self._lastTouch.get(path)
+                if ident is not None:
+                    rc.add(ident)
+                parent = os.path.dirname(path)
+                if parent in (path, ''):
+                    break
+                path = parent
+        return sorted(rc)
+
+    def add(self, kind: str, description: str, paths=None, **args) -> Operation:
+        '''Appends an operation to the plan.
+        @param kind: the type of the operation: one of KINDS
+        @param description: a shell like description, e.g. "mkdir -p /opt/x"
+        @param paths: None: the operation may touch anything (barrier) Otherwise: the list of touched paths
+        @param args: the arguments of the operation
+        @return: the new operation
+        '''
+        ident = len(self.operations) + 1
+        if paths is None:
+            depends = sorted(set(self._sinceBarrier) | ({self._barrier} if self._barrier is not None else set()))
+            self._barrier = ident
+            self._sinceBarrier = []
+            self._lastTouch.clear()
+        else:
+            depends = self._dependenciesOf(paths)
+            self._sinceBarrier.append(ident)
+            for path in paths:
+                self._lastTouch[os.path.normpath(path)] = ident
+        operation = Operation(ident, kind, description, args, depends)
+        self.operations.append(operation)
+        if kind in ('ensure', 'mkdir'):
+            self._directories.add(os.path.normpath(args['path']))
+        elif kind == 'remove':
+            path = os.path.normpath(args['path'])
+            self._removed.add(path)
+            self._directories = {item for item in self._directories
+                                 if item != path and not item.startswith(path + os.sep)}
+        return operation
+
+    def diff(self, other) -> list:
+        '''Compares the plan with another plan.
+        @param other: the plan to compare, e.g. the plan of the last run
+        @return: a list of lines: "- <description>": only in other "+ <description>": only in self
+        '''
+        mine = collections.Counter(op.signature() for op in self.operations)
+        theirs = collections.Counter(op.signature() for op in other.operations)
+        rc = []
+        for operation in other.operations:
+            signature = operation.signature()
+            if mine[signature] > 0:
+                mine[signature] -= 1
+            else:
+                rc.append(f'- {operation.description}')
+        for operation in self.operations:
+            signature = operation.signature()
+            if theirs[signature] > 0:
+                theirs[signature] -= 1
+            else:
+                rc.append(f'+ {operation.description}')
+        return rc
+
+    @staticmethod
+    def load(filename: str):
+        '''Reads a plan stored by save().
+        @param filename: the Json file
+        @return: the plan (without file contents: not executable)
+        '''
+        with open(filename, 'r', encoding='utf-8') as fp:
+            data = json.load(fp)
+        rc = Plan()
+        for item in data.get('Operations', []):
+            args = {key[0].lower() + key[1:]: value for key, value in item.items()
+                    if key not in ('Id', 'Type', 'Description', 'Depends')}
+            rc.operations.append(Operation(item['Id'], item['Type'], item['Description'], args, item['Depends']))
+        return rc
+
+    def save(self, filename: str):
+        '''Writes the plan as Json file (one operation per line: usable with diff).
+        @param filename: the file to write
+        '''
+        with open(filename, 'w', encoding='utf-8') as fp:
+            fp.write(self.toText())
+
+    def stateOf(self, path: str):
+        '''Returns the state of a path after the execution of the plan (as far as the plan knows it).
+        @param path: the path to test
+        @return: None: the plan does not change the path True: the plan creates the directory
+            False: the plan removes the path
+        '''
+        path = os.path.normpath(path)
+        rc = None
+        if path in self._directories:
+            rc = True
+        else:
+            while True:
+                if path in self._removed:
+                    rc = False
+                    break
+                parent = os.path.dirname(path)
+                if parent in (path, ''):
+                    break
+                path = parent
+        return rc
+
+    def toJson(self):
+        '''Returns the plan as Json data.
+        @return: a dictionary
+        '''
+        return {'Operations': [operation.toJson() for operation in self.operations]}
+
+    def toText(self) -> str:
+        '''Returns the plan as Json text with one operation per line.
+        @return: the Json text
+        '''
+        lines = [json.dumps(operation.toJson()) for operation in self.operations]
+        return '{"Operations": [\n' + ',\n'.join(lines) + '\n]}\n'
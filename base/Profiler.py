@@ -0,0 +1,162 @@
+'''
+Profiler.py
+
+Created on: 19.10.2026
+    Author: SeaPlusPro
+   License: CC0 1.0 Universal
+'''
+import json
+import time
+import functools
+import threading
+import contextlib
+
+# the profiler of the current run: None if the global option --profile is not set.
+# Not a constant: rebound by start() and stop()
+_active = None  # pylint: disable=invalid-name
+_inactive = contextlib.nullcontext()
+
+
+class Profiler:
+    '''Collects the wall and CPU time of the phases of a run and the duration of each started program.
+    Phases may be nested: the time of a phase includes the time of its inner phases.
+    '''
+
+    def __init__(self):
+        '''Constructor.
+        '''
+        # name -> [count, wall time, CPU time of the thread]
+        self.phases = {}
+        # a list of [command, duration]
+        self.processes = []
+        self._lock = threading.Lock()
+        self._startWall = time.perf_counter()
+        self._startCpu = time.process_time()
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        '''Measures a block as part of a phase.
+        Usage: with profiler.phase('form'): ...
+        @param name: the name of the phase, e.g. 'form' or 'subprocess'
+        '''
+        startWall = time.perf_counter()
+        startCpu = time.thread_time()
+        try:
+            yield self
+        finally:
+            wall = time.perf_counter() - startWall
+            cpu = time.thread_time() - startCpu
+            with self._lock:
+                entry = self.phases.setdefault(name, [0, 0.0, 0.0])
+                entry[0] += 1
+                entry[1] += wall
+                entry[2] += cpu
+
+    @contextlib.contextmanager
+    def process(self, command: str):
+        '''Measures the execution of an external program (phase "subprocess").
+        @param command: the command with arguments
+        '''
+        started = time.perf_counter()
+        try:
+            with self.phase('subprocess'):
+                yield self
+        finally:
+            with self._lock:
+                self.processes.append([command, time.perf_counter() - started])
+
+    def save(self, filename: str):
+        '''Writes the collected data as Json file.
+        @param filename: the file to write
+        '''
+        with open(filename, 'w', encoding='utf-8') as fp:
+            json.dump(self.toJson(), fp, indent=1)
+
+    def summary(self) -> list:
+        '''Returns the collected data as table.
+        @return: the lines of the table
+        '''
+        data = self.toJson()
+        rc = [f'{"phase":<16} {"count":>7} {"wall ms":>10} {"cpu ms":>10}']
+        for name, entry in data['Phases'].items():
+            rc.append(f'{name:<16} {entry["Count"]:>7} {entry["Wall"] * 1000:>10.3f} {entry["Cpu"] * 1000:>10.3f}')
+        rc.append(f'{"total":<16} {"":>7} {data["Wall"] * 1000:>10.3f} {data["Cpu"] * 1000:>10.3f}')
+        for item in data['Processes']:
+            rc.append(f'{item["Duration"] * 1000:>10.3f} ms: {item["Command"]}')
+        return rc
+
+    def toJson(self):
+        '''Returns the collected data as Json data.
+        @return: a dictionary with the total times, the phases (sorted by wall time) and the started programs
+        '''
+        with self._lock:
+            phases = sorted(self.phases.items(), key=lambda item: -item[1][1])
+            processes = list(self.processes)
+        return {'Wall': round(time.perf_counter() - self._startWall, 6),
+                'Cpu': round(time.process_time() - self._startCpu, 6),
+                'Phases': {name: {'Count': entry[0], 'Wall': round(entry[1], 6), 'Cpu': round(entry[2], 6)}
+                           for name, entry in phases},
+                'Processes': [{'Command': command, 'Duration': round(duration, 6)} for command, duration in processes]}
+
+
+def active() -> Profiler:
+    '''Returns the profiler of the current run.
+    @return: None (no profiling) or the profiler
+    '''
+    return _active
+
+
+def phase(name: str):
+    '''Measures a block as part of a phase if the profiling is active.
+    Usage: with Profiler.phase('form'): ...
+    @param name: the name of the phase
+    @return: a context manager: it does nothing if the profiling is not active
+    '''
+    return _inactive if _active is None else _active.phase(name)
+
+
+def process(command: str):
+    '''Measures the execution of an external program if the profiling is active.
+    Usage: with Profiler.process('systemctl daemon-reload'): subprocess.run(...)
+    @param command: the command with arguments
+    @return: a context manager: it does nothing if the profiling is not active
+    '''
+    return _inactive if _active is None else _active.process(command)
+
+
+def profiled(name: str):
+    '''Returns a decorator measuring a method as part of a phase if the profiling is active.
+    Usage: @Profiler.profiled('validation') def check(self, form): ...
+    @param name: the name of the phase
+    @return: the decorator
+    '''
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _active is None:
+                return function(*args, **kwargs)
+            with _active.phase(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def start() -> Profiler:
+    '''Starts the profiling of a run.
+    @return: the former profiler (None or the profiler of an outer run, e.g. in batch mode)
+    '''
+    global _active  # pylint: disable=global-statement
+    rc = _active
+    _active = Profiler()
+    return rc
+
+
+def stop(former: Profiler=None) -> Profiler:
+    '''Stops the profiling of a run.
+    @param former: the result of start(): that profiler becomes active again
+    @return: the stopped profiler with the collected data
+    '''
+    global _active  # pylint: disable=global-statement
+    rc = _active
+    _active = former
+    return rc
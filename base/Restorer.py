@@ -0,0 +1,427 @@
+'''
+Restorer.py
+
+Created on: 19.10.2026
+    Author: SeaPlusPro
+   License: CC0 1.0 Universal
+'''
+import os
+import grp
+import pwd
+import json
+import shutil
+import fnmatch
+import tarfile
+import threading
+import subprocess
+import collections
+import concurrent.futures
+
+from base import FileHelper
+from base import Archiver
+from base import ChunkStore
+
+# files up to that size are extracted by the worker threads, larger files are streamed:
+MEMORY_LIMIT = 8 * 1024 * 1024
+BLOCK_SIZE = 1024 * 1024
+
+
+class Restorer:
+    '''Restores files from archives created by form2linux: tar archives and manifests of chunk repositories.
+    Independent files are written by a pool of threads. Files with the same content are not rewritten.
+    Usage: with Restorer('/mnt/new') as restorer: restorer.restore('/opt/archive/daily.tar.zst')
+    '''
+
+    def __init__(self, target: str='/', patterns=None, parallel: int=4, logger=None):
+        '''Constructor.
+        @param target: the base directory of the restored files
+        @param patterns: None or a list of shell patterns: only matching files (or files below matching
+            directories) are restored, e.g. ['/etc/*', '/home/jonny']
+        @param parallel: the number of threads writing the files
+        @param logger: None or the logger for error messages
+        '''
+        self._target = os.path.realpath(target)
+        self._patterns = patterns or []
+        self._parallel = max(1, parallel)
+        self._logger = logger
+        self._isRoot = os.geteuid() == 0
+        self._directories = {}
+        self._executor = None
+        self._lock = threading.Lock()
+        self.restored = 0
+        self.unchanged = 0
+        self.deleted = 0
+        self.bytes = 0
+        self.errors = 0
+
+    def __enter__(self):
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self._parallel)
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    def _applyMeta(self, full: str, meta, isLink: bool=False):
+        '''Sets owner, mode, extended attributes and modification time of a restored file.
+        @param full: the restored file
+        @param meta: a dictionary with the metadata: Mode Uid Gid User Group Mtime (nanoseconds) Xattrs Attributes
+        @param isLink: True: the file is a symbolic link: the mode is not set
+        '''
+        if self._isRoot:
+            uid = _userId(meta.get('User', ''), meta['Uid'])
+            gid = _groupId(meta.get('Group', ''), meta['Gid'])
+            os.chown(full, uid, gid, follow_symlinks=False)
+        if not isLink:
+            os.chmod(full, meta['Mode'])
+        for key, value in meta.get('Xattrs', {}).items():
+            try:
+                os.setxattr(full, key, value, follow_symlinks=False)
+            except OSError as exc:
+                self._error(f'cannot set attribute {key} of {full}: {exc}')
+        if meta.get('Attributes') and self._isRoot and not isLink:
+            FileHelper.changeExtendedAttributes(full, meta['Attributes'])
+        # not FileHelper.setModified(): that rounds to seconds and follows symbolic links
+        os.utime(full, ns=(meta['Mtime'], meta['Mtime']), follow_symlinks=False)
+
+    def _count(self, restored: int=0, unchanged: int=0, size: int=0):
+        '''Updates the statistics (thread safe).
+        @param restored: the number of restored files
+        @param unchanged: the number of files with already matching content
+        @param size: the number of restored bytes
+        '''
+        with self._lock:
+            self.restored += restored
+            self.unchanged += unchanged
+            self.bytes += size
+
+    def _error(self, message: str):
+        '''Logs an error.
+        @param message: the error message
+        '''
+        with self._lock:
+            self.errors += 1
+        if self._logger is not None:
+            self._logger.error(message)
+
+    def _prepareParent(self, full: str):
+        '''Ensures the existence of the parent directory of a file.
+        @param full: the file to restore
+        '''
+        parent = os.path.dirname(full)
+        if not os.path.isdir(parent):
+            os.makedirs(parent, exist_ok=True)
+
+    def _restoreHardLink(self, full: str, source: str):
+        '''Creates a hard link.
+        @param full: the link to restore
+        @param source: the original name of the link target
+        '''
+        target = self.targetOf(source)
+        try:
+            if target is None or not os.path.exists(target):
+                self._error(f'missing link target of {full}: {source}')
+            elif os.path.exists(full) and os.path.samefile(full, target):
+                self._count(unchanged=1)
+            else:
+                self._prepareParent(full)
+                if os.path.lexists(full):
+                    os.unlink(full)
+                os.link(target, full)
+                self._count(restored=1)
+        except OSError as exc:
+            self._error(f'cannot restore {full}: {exc}')
+
+    def _restoreDirectory(self, full: str, meta):
+        '''Creates a directory. The metadata are set at the end (writing files changes the modification time).
+        @param full: the directory to restore
+        @param meta: the metadata of the directory
+        '''
+        if not os.path.isdir(full):
+            if os.path.lexists(full):
+                os.unlink(full)
+            os.makedirs(full, exist_ok=True)
+        self._directories[full] = meta
+
+    def _restoreLink(self, full: str, target: str, meta):
+        '''Creates a symbolic link.
+        @param full: the link to restore
+        @param target: the link target
+        @param meta: the metadata of the link
+        '''
+        if os.path.islink(full) and os.readlink(full) == target:
+            self._count(unchanged=1)
+        else:
+            self._prepareParent(full)
+            if os.path.lexists(full):
+                if os.path.isdir(full) and not os.path.islink(full):
+                    shutil.rmtree(full)
+                else:
+                    os.unlink(full)
+            os.symlink(target, full)
+            self._count(restored=1)
+        self._applyMeta(full, meta, True)
+
+    def _restoreMembers(self, tar):
+        '''Restores the members of an opened tar archive.
+        @param tar: the opened archive (stream mode)
+        '''
+        pending = collections.deque()
+        hardLinks = []
+        for member in tar:
+            name = '/' + member.name.lstrip('/')
+            full = self.targetOf(name)
+            if full is None or not self.selected(name):
+                continue
+            meta = {'Mode': member.mode, 'Uid': member.uid, 'Gid': member.gid, 'User': member.uname,
+                    'Group': member.gname, 'Mtime': int(member.mtime * 1E9),
+                    'Attributes': member.pax_headers.get(Archiver.PAX_ATTRIBUTES, ''),
+                    'Xattrs': {key[len(Archiver.PAX_XATTR_PREFIX):]: value.encode('utf-8', 'surrogateescape')
+                               for key, value in member.pax_headers.items()
+                               if key.startswith(Archiver.PAX_XATTR_PREFIX)}}
+            try:
+                if member.isdir():
+                    self._restoreDirectory(full, meta)
+                elif member.issym():
+                    self._restoreLink(full, member.linkname, meta)
+                elif member.islnk():
+                    hardLinks.append((full, '/' + member.linkname.lstrip('/')))
+                elif member.isreg():
+                    fileObj = tar.extractfile(member)
+                    if member.size <= MEMORY_LIMIT:
+                        data = fileObj.read()
+                        pending.append(self._executor.submit(self._writeBlocks, full, lambda data=data: (data,),
+                                                             len(data), meta))
+                        while len(pending) > 2 * self._parallel:
+                            pending.popleft().result()
+                    else:
+                        # the stream can be read only once: streamed into a temporary file
+                        self._writeStream(full, fileObj, meta)
+                else:
+                    self._error(f'unsupported file type: {name}')
+            except OSError as exc:
+                self._error(f'cannot restore {full}: {exc}')
+        for future in pending:
+            future.result()
+        for full, source in hardLinks:
+            self._restoreHardLink(full, source)
+
+    def _sameContent(self, full: str, blocks, size: int) -> bool:
+        '''Tests whether a file has a given content.
+        @param full: the file to test
+        @param blocks: an iterable of the parts of the content
+        @param size: the size of the content
+        @return: True: the file exists and has the given content
+        '''
+        rc = os.path.isfile(full) and not os.path.islink(full) and os.path.getsize(full) == size
+        if rc:
+            with open(full, 'rb') as fp:
+                for block in blocks:
+                    if fp.read(len(block)) != block:
+                        rc = False
+                        break
+        return rc
+
+    def _writeBlocks(self, full: str, blocks, size: int, meta):
+        '''Writes a regular file if its content differs from the given content.
+        Called in a worker thread.
+        @param full: the file to restore
+        @param blocks: a function returning an iterable of the parts of the content
+        @param size: the size of the content
+        @param meta: the metadata of the file
+        '''
+        try:
+            if self._sameContent(full, blocks(), size):
+                self._count(unchanged=1)
+            else:
+                self._prepareParent(full)
+                temp = full + '.f2l~'
+                with open(temp, 'wb') as fp:
+                    for block in blocks():
+                        fp.write(block)
+                if os.path.isdir(full) and not os.path.islink(full):
+                    shutil.rmtree(full)
+                os.replace(temp, full)
+                self._count(restored=1, size=size)
+            self._applyMeta(full, meta)
+        except OSError as exc:
+            self._error(f'cannot restore {full}: {exc}')
+
+    def _writeStream(self, full: str, fileObj, meta):
+        '''Writes a large file from a stream.
+        @param full: the file to restore
+        @param fileObj: the stream with the content
+        @param meta: the metadata of the file
+        '''
+        self._prepareParent(full)
+        temp = full + '.f2l~'
+        with open(temp, 'wb') as fp:
+            shutil.copyfileobj(fileObj, fp, BLOCK_SIZE)
+        size = os.path.getsize(temp)
+        if self._sameContent(full, _blocksOf(temp), size):
+            os.unlink(temp)
+            self._count(unchanged=1)
+        else:
+            os.replace(temp, full)
+            self._count(restored=1, size=size)
+        self._applyMeta(full, meta)
+
+    def close(self):
+        '''Waits for the running jobs and sets the metadata of the directories.
+        '''
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        # the deepest directories first: setting the metadata of a child changes the parent:
+        for full in sorted(self._directories, key=len, reverse=True):
+            try:
+                self._applyMeta(full, self._directories[full])
+            except OSError as exc:
+                self._error(f'cannot set the metadata of {full}: {exc}')
+        self._directories = {}
+
+    def delete(self, names):
+        '''Deletes files (recorded as deleted in an incremental archive).
+        @param names: a list of the original full filenames
+        '''
+        for name in names:
+            full = self.targetOf(name)
+            if full is not None and self.selected(name) and os.path.lexists(full):
+                if os.path.isdir(full) and not os.path.islink(full):
+                    shutil.rmtree(full)
+                else:
+                    os.unlink(full)
+                self.deleted += 1
+
+    def restore(self, source: str):
+        '''Restores the files of an archive or a manifest.
+        @param source: a tar archive or the manifest (*.json) of a chunk repository
+        '''
+        if source.endswith('.json'):
+            self.restoreManifest(source)
+        else:
+            self.restoreTar(source)
+
+    def restoreManifest(self, manifest: str):
+        '''Restores the files listed in a manifest of a chunk repository.
+        @param manifest: the manifest: the repository is the parent of the directory of the manifest
+        '''
+        with open(manifest, 'r', encoding='utf-8') as fp:
+            files = json.load(fp)['Files']
+        store = ChunkStore.ChunkStore(os.path.dirname(os.path.dirname(os.path.abspath(manifest))))
+        pending = collections.deque()
+        for name in sorted(files):
+            entry = files[name]
+            full = self.targetOf(name)
+            if full is None or not self.selected(name):
+                continue
+            meta = dict(entry)
+            meta['Xattrs'] = {key: bytes.fromhex(value) for key, value in entry.get('Xattrs', {}).items()}
+            try:
+                if entry['Type'] == 'dir':
+                    self._restoreDirectory(full, meta)
+                elif entry['Type'] == 'link':
+                    self._restoreLink(full, entry['Target'], meta)
+                else:
+                    chunks = entry['Chunks']
+                    pending.append(self._executor.submit(
+                        self._writeBlocks, full, lambda chunks=chunks: (store.readChunk(chunk) for chunk in chunks),
+                        entry['Size'], meta))
+                    while len(pending) > 2 * self._parallel:
+                        pending.popleft().result()
+            except OSError as exc:
+                self._error(f'cannot restore {full}: {exc}')
+        for future in pending:
+            future.result()
+
+    def restoreTar(self, archive: str):
+        '''Restores the files of a tar archive (created by the built-in archiver or by tar).
+        Deleted files recorded in an incremental archive are deleted.
+        @param archive: the archive to restore
+        '''
+        process = None
+        if Archiver.compressionOf(archive) == 'zstd':
+            program = shutil.which('zstd')
+            if program is None:
+                raise ValueError('missing program zstd')
+            # pylint: disable-next=consider-using-with
+            process = subprocess.Popen([program, '-dcq', archive], stdout=subprocess.PIPE)
+            # pylint: disable-next=consider-using-with
+            tar = tarfile.open(fileobj=process.stdout, mode='r|')
+        else:
+            # pylint: disable-next=consider-using-with
+            tar = tarfile.open(archive, mode='r|*')
+        try:
+            self._restoreMembers(tar)
+            deleted = tar.pax_headers.get('F2L.deleted', '')
+            if deleted != '':
+                self.delete(deleted.split('\n'))
+        finally:
+            tar.close()
+            if process is not None:
+                process.stdout.close()
+                if process.wait() != 0:
+                    self._error(f'decompression of {archive} failed')
+
+    def selected(self, name: str) -> bool:
+        '''Tests whether a file should be restored.
+        @param name: the original full filename
+        @return: True: the file matches one of the patterns (or no pattern is given)
+        '''
+        rc = len(self._patterns) == 0
+        for pattern in self._patterns:
+            pattern = pattern.rstrip('/')
+            if fnmatch.fnmatchcase(name, pattern) or fnmatch.fnmatchcase(name, pattern + '/*'):
+                rc = True
+                break
+        return rc
+
+    def targetOf(self, name: str):
+        '''Returns the restore location of a file.
+        @param name: the original full filename
+        @return: None: the name leaves the target directory (e.g. '/../etc') otherwise: the full filename
+        '''
+        prefix = self._target.rstrip('/') + '/'
+        rc = os.path.normpath(os.path.join(self._target, name.lstrip('/')))
+        if not rc.startswith(prefix):
+            rc = None
+        else:
+            parent = os.path.realpath(os.path.dirname(rc))
+            if parent != self._target and not parent.startswith(prefix):
+                # a symbolic link in the path leads outside of the target directory
+                rc = None
+        return rc
+
+
+def _blocksOf(filename: str):
+    '''Returns the content of a file in blocks.
+    @param filename: the file to read
+    @return: an iterator of blocks
+    '''
+    with open(filename, 'rb') as fp:
+        yield from iter(lambda: fp.read(BLOCK_SIZE), b'')
+
+
+def _groupId(name: str, gid: int) -> int:
+    '''Returns the group id of a group name.
+    @param name: the group name ('': unknown)
+    @param gid: the id used if the name is unknown
+    @return: the group id
+    '''
+    try:
+        rc = grp.getgrnam(name).gr_gid if name else gid
+    except KeyError:
+        rc = gid
+    return rc
+
+
+def _userId(name: str, uid: int) -> int:
+    '''Returns the user id of a user name.
+    @param name: the user name ('': unknown)
+    @param uid: the id used if the name is unknown
+    @return: the user id
+    '''
+    try:
+        rc = pwd.getpwnam(name).pw_uid if name else uid
+    except KeyError:
+        rc = uid
+    return rc
@@ -0,0 +1,199 @@
+'''
+Sampler.py
+
+Created on: 19.10.2026
+    Author: SeaPlusPro
+   License: CC0 1.0 Universal
+'''
+import time
+from array import array
+
+from base import StringUtils
+
+# the values of one sample: the first four are rates (bytes per second):
+METRICS = ('IoRead', 'IoWrite', 'NetRead', 'NetWrite', 'Load1', 'MemAvailable', 'SwapFree')
+RATE_METRICS = 4
+
+
+class RingBuffer:
+    '''A fixed-size buffer of float values: if the buffer is full the oldest value is overwritten.
+    '''
+
+    def __init__(self, capacity: int):
+        '''Constructor.
+        @param capacity: the maximal number of stored values
+        '''
+        if capacity < 1:
+            raise ValueError(f'capacity must be positive: {capacity}')
+        self._capacity = capacity
+        self._values = array('d', bytes(8 * capacity))
+        self._next = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def append(self, value: float):
+        '''Stores a value.
+        @param value: the value to store
+        '''
+        self._values[self._next] = value
+        self._next = (self._next + 1) % self._capacity
+        if self._count < self._capacity:
+            self._count += 1
+
+    def last(self) -> float:
+        '''Returns the youngest value.
+        @return: None: the buffer is empty otherwise: the last stored value
+        '''
+        return None if self._count == 0 else self._values[self._next - 1]
+
+    def statistics(self):
+        '''Returns the statistics of the stored values.
+        @return: None: the buffer is empty otherwise: a tuple (minimum, maximum, average, last)
+        '''
+        rc = None
+        if self._count > 0:
+            values = self._values if self._count == self._capacity else self._values[0:self._count]
+            rc = (min(values), max(values), sum(values) / self._count, self.last())
+        return rc
+
+    def values(self):
+        '''Returns the stored values in chronological order.
+        @return: a list of the values, the oldest first
+        '''
+        if self._count < self._capacity:
+            rc = self._values[0:self._count].tolist()
+        else:
+            rc = self._values[self._next:].tolist() + self._values[0:self._next].tolist()
+        return rc
+
+
+class Sampler:
+    '''Samples the load of the system: disk and network throughput, load average and memory.
+    The files in /proc are opened once and reread for each sample.
+    Usage: with Sampler('sd[ab]', 'eth0') as sampler: sampler.sample() ...
+    '''
+
+    def __init__(self, patternDisks: str, patternInterface: str, capacity: int=60, procDirectory: str='/proc'):
+        '''Constructor.
+        @param patternDisks: a regular expression of the disk devices used for the result (sum is built), e.g. 'sd[ab]'
+        @param patternInterface: a regular expression of the network interfaces (sum is built), e.g. 'eth0|wlan0'
+        @param capacity: the number of samples stored for the statistics
+        @param procDirectory: the directory of the process info (for tests)
+        '''
+        self._rexprDisks = StringUtils.regExprCompile(patternDisks, 'disk pattern')
+        self._rexprNet = StringUtils.regExprCompile(patternInterface, 'interface pattern')
+        if self._rexprDisks is None or self._rexprNet is None:
+            raise ValueError(f'wrong pattern: {patternDisks} / {patternInterface}')
+        self._procDirectory = procDirectory
+        self._buffers = [RingBuffer(capacity) for _metric in METRICS]
+        self._files = {}
+        self._lastCounters = None
+        self._lastTime = None
+        self._samples = 0
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    def _read(self, node: str) -> str:
+        '''Reads the current content of a file in /proc with the already opened file.
+        @param node: the node of the file, e.g. 'loadavg'
+        @return: the content
+        '''
+        fp = self._files[node]
+        fp.seek(0)
+        return fp.read()
+
+    def close(self):
+        '''Closes the files in /proc.
+        '''
+        for fp in self._files.values():
+            fp.close()
+        self._files = {}
+
+    def counters(self):
+        '''Reads the current values from /proc.
+        @return: [ioReadBytes, ioWriteBytes, netReadBytes, netWriteBytes, load1Minute, memoryAvailable, swapFree]
+            the byte counters are summarized since boot time, memory in kByte
+        '''
+        readIO = 0
+        writeIO = 0
+        for line in self._read('diskstats').splitlines():
+            # see LinuxUtils.stress(): name: field 3, read sectors: field 6, written sectors: field 10
+            parts = line.split()
+            if len(parts) > 9 and self._rexprDisks.match(parts[2]) is not None:
+                readIO += int(parts[5])
+                writeIO += int(parts[9])
+        readNet = 0
+        writeNet = 0
+        for line in self._read('net/dev').splitlines()[2:]:
+            name, _sep, data = line.partition(':')
+            if self._rexprNet.match(name.strip()) is not None:
+                parts = data.split()
+                readNet += int(parts[0])
+                writeNet += int(parts[8])
+        load1 = float(self._read('loadavg').split()[0])
+        memory = {}
+        for line in self._read('meminfo').splitlines():
+            name, _sep, data = line.partition(':')
+            if name in ('MemAvailable', 'SwapFree'):
+                memory[name] = int(data.split()[0])
+        return [readIO * 512, writeIO * 512, readNet, writeNet, load1,
+                memory.get('MemAvailable', 0), memory.get('SwapFree', 0)]
+
+    def open(self):
+        '''Opens the files in /proc.
+        '''
+        for node in ('diskstats', 'net/dev', 'loadavg', 'meminfo'):
+            # pylint: disable-next=consider-using-with
+            self._files[node] = open(f'{self._procDirectory}/{node}', 'r', encoding='utf-8')
+
+    def sample(self) -> bool:
+        '''Takes a sample: the rates are computed from the difference to the previous call.
+        Note: the first call only stores the start values.
+        @return: True: a sample has been stored in the buffers
+        '''
+        now = time.monotonic()
+        current = self.counters()
+        rc = self._lastCounters is not None and now > self._lastTime
+        if rc:
+            duration = now - self._lastTime
+            for ix, value in enumerate(current):
+                if ix < RATE_METRICS:
+                    # a counter overflow or a removed device produces a negative difference:
+                    value = max(0.0, (value - self._lastCounters[ix]) / duration)
+                self._buffers[ix].append(value)
+            self._samples += 1
+        self._lastCounters = current
+        self._lastTime = now
+        return rc
+
+    def samples(self) -> int:
+        '''Returns the number of samples since start.
+        @return: the number of samples (may be larger than the capacity of the buffers)
+        '''
+        return self._samples
+
+    def series(self, metric: str):
+        '''Returns the stored values of a metric.
+        @param metric: one of METRICS, e.g. 'Load1'
+        @return: the values of the metric, the oldest first
+        '''
+        return self._buffers[METRICS.index(metric)].values()
+
+    def statistics(self):
+        '''Returns the statistics of the stored samples.
+        @return: a dictionary metric -> { 'Min': value, 'Max': value, 'Average': value, 'Last': value }
+        '''
+        rc = {}
+        for ix, metric in enumerate(METRICS):
+            info = self._buffers[ix].statistics()
+            if info is not None:
+                rc[metric] = {'Min': round(info[0], 3), 'Max': round(info[1], 3),
+                              'Average': round(info[2], 3), 'Last': round(info[3], 3)}
+        return rc
@@ -12,6 +12,7 @@ import codecs
 from typing import Sequence
 
 from base import Const
+from base import LazyRegex
 from base import FileHelper
 from base import LinuxUtils
 from base import Logger
@@ -19,17 +20,17 @@ from base import MemoryLogger
 from base import StringUtils
 
 # .................................1.....1....2.....2....3.....3
-REG_EXPR_DATE = re.compile(r'^(\d{4})[.-](\d\d?)[.-](\d\d?)')
-REG_EXPR_DATE2 = re.compile(r'^(\d\d?)[.](\d\d?)[.](\d{4})')
+REG_EXPR_DATE = LazyRegex.LazyRegex(r'^(\d{4})[.-](\d\d?)[.-](\d\d?)')
+REG_EXPR_DATE2 = LazyRegex.LazyRegex(r'^(\d\d?)[.](\d\d?)[.](\d{4})')
 # ...................................1.....1.2....2 a..3.....3a
-REG_EXPR_TIME = re.compile(r'^(\d\d?):(\d\d?)(?::(\d\d?))?$')
-REG_EXPR_INT = re.compile(r'^0[xX]([0-9a-fA-F]+)|0o([0-7]+)|(\d+)$')
-REG_EXPR_SIZE = re.compile(
+REG_EXPR_TIME = LazyRegex.LazyRegex(r'^(\d\d?):(\d\d?)(?::(\d\d?))?$')
+REG_EXPR_INT = LazyRegex.LazyRegex(r'^0[xX]([0-9a-fA-F]+)|0o([0-7]+)|(\d+)$')
+REG_EXPR_SIZE = LazyRegex.LazyRegex(
     r'^(\d+)((?:[kmgt]i?)?(?:b(?:ytes?)?)?)?$', Const.IGNORE_CASE)
 # REG_EXPR_ESC =
 # re.compile(r'(\\U........|\\u....|\\x..|\\[0-7]{1,3}|\\N\{[^}]+\}|\\[\\'"abfnrtv])',
 # Const.RE_UNICODE)
-REG_EXPR_ESC = re.compile(r'''(\\U[0-9a-fA-F]{8}|\\u[0-9a-fA-F]{4}|\\x[0-9a-fA-F][0-9a-fA-F]|\\[0-7]{1,3}'
+REG_EXPR_ESC = LazyRegex.LazyRegex(r'''(\\U[0-9a-fA-F]{8}|\\u[0-9a-fA-F]{4}|\\x[0-9a-fA-F][0-9a-fA-F]|\\[0-7]{1,3}'
     + '|\\N\{[^}]+\}|\\[\\'"abfnrtv])''', Const.RE_UNICODE)
 #    ( \\U........      # 8-digit hex escapes
 #    | \\u....          # 4-digit hex escapes
@@ -0,0 +1,153 @@
+'''
+StructuredLogger.py
+
+Created on: 19.10.2026
+    Author: SeaPlusPro
+   License: CC0 1.0 Universal
+'''
+import sys
+import json
+import time
+import weakref
+import threading
+import collections
+from base import Const
+from base import MemoryLogger
+
+
+class StructuredLogger(MemoryLogger.MemoryLogger):
+    '''A logger with lazy formatting, a bounded history and buffered output.
+    A message may contain %-placeholders filled with the additional arguments, e.g. info('%s -> %s', source, target):
+    the level is checked first, the message is only formatted when it is written or read from the history.
+    Note: the arguments are formatted later: they should not be changed after the call.
+    The output is written in blocks: if the buffer is full, on an error, on flush(), when the logger is
+    destroyed and at program end.
+    '''
+    # all living instances: used by flushAll()
+    _instances = weakref.WeakSet()
+
+    def __init__(self, verboseLevel: int=0, verboseListMinLevel: int=99, capacity: int=10000,
+                 jsonLines: bool=False, bufferSize: int=64, output=None):
+        '''Constructor.
+        @param verboseLevel: > 0: the messages will be written (to stdout)
+        @param verboseListMinLevel: messages with a higher level will be stored
+        @param capacity: the maximal number of stored messages: older messages are dropped
+        @param jsonLines: True: each message is written as Json object (one line) with time, level and message
+        @param bufferSize: the output is written if that number of messages is buffered
+        @param output: None (stdout at the time of writing) or a text stream
+        '''
+        MemoryLogger.MemoryLogger.__init__(self, verboseLevel, verboseListMinLevel)
+        # records: (time, message, args)
+        self._lines = collections.deque(maxlen=capacity)
+        self._buffer = []
+        self._bufferSize = bufferSize
+        self._jsonLines = jsonLines
+        self._output = output
+        self._lock = threading.Lock()
+        StructuredLogger._instances.add(self)
+        # the buffered messages of a destroyed logger (or at program end) are written too:
+        weakref.finalize(self, StructuredLogger._write, self._buffer, self._lock, jsonLines, output)
+
+    @staticmethod
+    def _format(message: str, args: tuple) -> str:
+        '''Returns the formatted message.
+        @param message: the message, may contain %-placeholders
+        @param args: the arguments of the placeholders: () for a message without placeholders
+        @return: the formatted message
+        '''
+        return message % args if args else message
+
+    @staticmethod
+    def _toLine(record: tuple, jsonLines: bool) -> str:
+        '''Converts a record into an output line.
+        @param record: a tuple (time, message, args)
+        @param jsonLines: True: the line is a Json object
+        @return: the line (without newline)
+        '''
+        message = StructuredLogger._format(record[1], record[2])
+        if jsonLines:
+            level = 'error' if message.startswith('+++ ') else 'info'
+            message = json.dumps({'Time': round(record[0], 3), 'Level': level,
+                                  'Message': message[4:] if level == 'error' else message})
+        return message
+
+    @staticmethod
+    def _write(buffer: list, lock, jsonLines: bool, output):
+        '''Writes and removes the buffered records.
+        Note: a static method without access to the instance: usable as finalizer.
+        @param buffer: the buffered records
+        @param lock: the lock protecting the buffer
+        @param jsonLines: True: the lines are written as Json objects
+        @param output: None (stdout) or a text stream
+        '''
+        with lock:
+            records = list(buffer)
+            buffer.clear()
+        if records:
+            output = sys.stdout if output is None else output
+            if output is not None:
+                output.write('\n'.join(StructuredLogger._toLine(record, jsonLines) for record in records) + '\n')
+                output.flush()
+
+    def clear(self):
+        '''Clears all messages and error messages.
+        '''
+        self.flush()
+        capacity = self._lines.maxlen
+        MemoryLogger.MemoryLogger.clear(self)
+        self._lines = collections.deque(maxlen=capacity)
+
+    def flush(self):
+        '''Writes the buffered messages.
+        '''
+        StructuredLogger._write(self._buffer, self._lock, self._jsonLines, self._output)
+
+    @staticmethod
+    def flushAll():
+        '''Writes the buffered messages of all instances, e.g. at the end of a command.
+        '''
+        for logger in list(StructuredLogger._instances):
+            logger.flush()
+
+    def getMessages(self):
+        '''Returns the stored messages as array.
+        @return: array of (formatted) messages
+        '''
+        return [self._format(message, args) for _, message, args in list(self._lines)]
+
+    def info(self, message: str, *args) -> bool:
+        '''Logs an info message.
+        @param message: the message to log, may contain %-placeholders
+        @param args: the arguments of the placeholders
+        @return: True
+        '''
+        if self._mirrorLogger is not None:
+            self._mirrorLogger.info(self._format(message, args))
+        if self._logInfo:
+            self._inUse = True
+            self.log(message, Const.LEVEL_SUMMARY, *args)
+            self._inUse = False
+        return True
+
+    # pylint: disable-next=keyword-arg-before-vararg
+    def log(self, message: str, minLevel=Const.LEVEL_SUMMARY, *args) -> bool:
+        '''Logs a message.
+        @param message: the message to log, may contain %-placeholders
+        @param minLevel: the logging is done only if _verboseLevel >= minLevel
+        @param args: the arguments of the placeholders
+        @return: True: OK
+        '''
+        written = self._verboseLevel >= minLevel
+        stored = self._listMinLevel >= minLevel
+        if written or stored:
+            record = (time.time(), message, args)
+            if stored:
+                self._lines.append(record)
+            if written:
+                with self._lock:
+                    self._buffer.append(record)
+                    full = len(self._buffer) >= self._bufferSize
+                # errors are written at once: the order relative to the output of other sources is kept
+                if full or message.startswith('+++'):
+                    self.flush()
+        return True
@@ -33,12 +33,11 @@ import sys
 import os
 from argparse import ArgumentParser
 from argparse import RawDescriptionHelpFormatter
-from PackageBuilder import PackageBuilder
-from TextTool import TextTool
-from ServiceBuilder import ServiceBuilder
-from SetupBuilder import SetupBuilder
-from InstallBuilder import InstallBuilder
 from Builder import CLIError, GlobalOptions
+from base import Profiler
+from base import StructuredLogger
+# the builders are imported in the execute*() functions: only the modules of the selected sub command are loaded
+# pylint: disable=import-outside-toplevel
 
 __all__ = []
 __version__ = '0.5.2'
@@ -47,7 +46,8 @@ __updated__ = '2023-08-29'
 
 DEBUG = 1
 TESTRUN = 0
-PROFILE = 0
+# program name -> the argument parser: built only once per process (batch mode)
+_parsers = {}
 
 
 def buildUsageMessage(argv):
@@ -73,6 +73,7 @@ def buildUsageMessage(argv):
 
 Examples:
 
+form2linux batch commands.txt
 form2linux install example-standard-host myform.json
 form2linux install standard-host myform.json
 
@@ -93,6 +94,67 @@ form2linux text replace-range readme.md --replacement=0.4.2 \
     return (programLicense, programVersionMessage, programName)
 
 
+def buildParser(programLicense: str, programVersionMessage: str):
+    '''Builds the argument parser with all sub commands.
+    @param programLicense: the description of the program
+    @param programVersionMessage: the text shown by --version
+    @return: the parser
+    '''
+    parser = ArgumentParser(
+        description=programLicense, formatter_class=RawDescriptionHelpFormatter)
+    parser.add_argument('-v', '--verbose', dest='verbose', action='count',
+                        help='set verbosity level [default: %(default)s]')
+    parser.add_argument('-V', '--version', action='version',
+                        version=programVersionMessage)
+    parser.add_argument('-y', '--dry', dest='dry', action="store_true",
+                        help="do not create files and directories")
+    parser.add_argument('-n', '--not-root', dest='notRoot', action="store_false",
+                        help="commmand must not be executed as root")
+    parser.add_argument('-R', '--root', dest='root', action="store_true",
+                        help="commmand must be executed as root")
+    parser.add_argument('-P', '--plan', dest='plan',
+                        help="the execution plan is stored as Json file there instead of executing it")
+    parser.add_argument('-c', '--converge', dest='converge', action="store_true",
+                        help="operations whose target already has the wanted state are skipped")
+    parser.add_argument('-j', '--jobs', dest='jobs', type=int, default=1,
+                        help="the maximal number of independent operations executed in parallel [default: %(default)s]")
+    parser.add_argument('--log-json', dest='logJson', action="store_true",
+                        help="the messages are written as Json objects (one per line) with time, level and message")
+    parser.add_argument('--profile', dest='profile', action="store_true",
+                        help="measures the phases of the command and shows them as table")
+    parser.add_argument('--profile-file', dest='profileFile', metavar='FILE',
+                        help="measures the phases of the command and stores them in FILE (as Json if FILE ends with '.json')")
+    parser.add_argument('--profile-dump', dest='profileDump', metavar='FILE',
+                        help="stores the statistics of the Python profiler (cProfile) in FILE")
+    subparsersMain = parser.add_subparsers(
+        help='sub-command help', dest='main')
+
+    defineBatch(subparsersMain)
+    defineInstall(subparsersMain)
+    definePackage(subparsersMain)
+    defineService(subparsersMain)
+    defineSetup(subparsersMain)
+    defineText(subparsersMain)
+    return parser
+
+
+def defineBatch(subparsersMain):
+    '''Defines the options of the command "batch".
+    @param subparsersMain: the parent of the new parsers
+    '''
+    parserBatch = subparsersMain.add_parser(
+        'batch', help='executes many form2linux commands in one process')
+    parserBatch.add_argument(
+        'commands', nargs='?', default='-',
+        help='a file with one command per line or a Json list of commands. "-": stdin [default: %(default)s]')
+    parserBatch.add_argument(
+        '-r', '--results', help='the exit codes and execution times are stored as Json in that file')
+    parserBatch.add_argument(
+        '-s', '--stop-on-error', dest='stopOnError', action='store_true', help='stops after the first failing command')
+    parserBatch.add_argument(
+        '-S', '--server', help='the commands are read from a local UNIX socket with that path until "shutdown"')
+
+
 def defineInstall(subparsersMain):
     '''Defines the sub commands / options of the section "install".
     @param subparsersMain: the parent of the new parsers
@@ -160,11 +222,25 @@ def defineSetup(subparsersMain):
         'group', help='a saved version of /etc/group')
     parserAdaptUsers.add_argument(
         'shadow', help='a saved version of /etc/shadow')
+    parserAdaptUsers.add_argument(
+        '-b', '--batch', dest='batch', action='store_true',
+        help='writes all users and groups with one rewrite of the account files instead of one process per entry')
+    parserAdaptUsers.add_argument(
+        '-e', '--etc', dest='etc', default='/etc',
+        help='the directory of the account files, e.g. of a mounted system: the homes are created below its parent.'
+        + ' Needs --batch')
 
     parserAddStandardUsers = subparsersSetup.add_parser(
         'add-standard-users', help='creates users and groups from a Json form')
     parserAddStandardUsers.add_argument(
         'form', help='a safed version of /etc/passwd')
+    parserAddStandardUsers.add_argument(
+        '-b', '--batch', dest='batch', action='store_true',
+        help='writes all users and groups with one rewrite of the account files instead of one process per entry')
+    parserAddStandardUsers.add_argument(
+        '-e', '--etc', dest='etc', default='/etc',
+        help='the directory of the account files, e.g. of a mounted system: the homes are created below its parent.'
+        + ' Needs --batch')
 
     parserExampleAddStandardUsers = subparsersSetup.add_parser(
         'example-add-standard-users', help='shows a form for the "add-standard-users" command')
@@ -177,21 +253,64 @@ def defineSetup(subparsersMain):
         'form', help='the Json file with the archive definitions')
     parserArchive.add_argument(
         '-f', '--file', help='the list of the files will be stored there', default="*")
+    parserArchive.add_argument(
+        '--full', action='store_true', help='incremental archives: starts a new restore chain with a full archive')
+
+    parserArchiveChain = subparsersSetup.add_parser(
+        'archive-chain',  help='shows the archives needed to restore an incremental archive form')
+    parserArchiveChain.add_argument(
+        'form', help='the Json file with the archive definitions')
 
     parserExampleArchive = subparsersSetup.add_parser(
         'example-archive',  help='shows the form of the command "archive"')
     parserExampleArchive.add_argument(
         '-f', '--file', dest='file', help='the result is stored there')
 
+    parserMonitor = subparsersSetup.add_parser(
+        'monitor',  help='samples the load of the system periodically and stores rolling statistics')
+    parserMonitor.add_argument(
+        'output', nargs='?', default='', help='the Json file storing the statistics. Default: the statistics are displayed')
+    parserMonitor.add_argument(
+        '-i', '--interval', type=float, help='the time between two samples in seconds', default=10.0)
+    parserMonitor.add_argument(
+        '-c', '--count', type=int, help='the number of samples. 0: unlimited', default=0)
+    parserMonitor.add_argument(
+        '-d', '--disks', help='a regular expression of the disks to observe', default='[sv]d[a-z]$|nvme\\d+n\\d+$')
+    parserMonitor.add_argument(
+        '-n', '--interfaces', help='a regular expression of the network interfaces to observe', default='(?!lo$)')
+    parserMonitor.add_argument(
+        '-s', '--size', type=int, help='the statistics are built from that number of the last samples', default=60)
+
     parserPatchShadow = subparsersSetup.add_parser(
-        'patch-shadow',  help='puts an encoded password into the shadow password file')
+        'patch-shadow',  help='puts encoded passwords into the shadow password file')
     parserPatchShadow.add_argument(
-        'user', help='the user of the entry to change')
+        'user', nargs='?', help='the user of the entry to change')
     parserPatchShadow.add_argument(
-        'passwd', help='the encoded password')
+        'passwd', nargs='?', help='the encoded password')
+    parserPatchShadow.add_argument(
+        '-F', '--from', dest='source',
+        help='a file with lines "user:encoded-password", e.g. a saved shadow file. Exclusive alternative: user passwd')
     parserPatchShadow.add_argument(
         '-f', '--file', dest='file', help='the shadow file', default='/etc/shadow')
 
+    parserPlanDiff = subparsersSetup.add_parser(
+        'plan-diff',  help='shows the differences of two execution plans stored with the option --plan')
+    parserPlanDiff.add_argument(
+        'old', help='the plan of the last run')
+    parserPlanDiff.add_argument(
+        'new', help='the current plan')
+
+    parserRestore = subparsersSetup.add_parser(
+        'restore',  help='restores files from archives created by "archive"')
+    parserRestore.add_argument(
+        'archive', nargs='+', help='the archives (or manifests) to restore, e.g. the restore chain')
+    parserRestore.add_argument(
+        '-t', '--target', help='the base directory of the restored files', default='/')
+    parserRestore.add_argument(
+        '-p', '--pattern', action='append', help='only matching files are restored, e.g. "/etc/*". Can be repeated')
+    parserRestore.add_argument(
+        '-P', '--parallel', type=int, help='the number of threads writing files', default=4)
+
     parserSystemInfo = subparsersSetup.add_parser(
         'system-info',  help='assembles the state of the current system')
     parserSystemInfo.add_argument(
@@ -223,6 +342,9 @@ def defineService(subparsersMain):
         'install', help='Installs a systemd service defined by a Json configuration file.')
     parserInstallService.add_argument(
         'configuration', help='defines the properties of the service.', default='service.json')
+    parserInstallService.add_argument(
+        '-s', '--status', type=int, default=4,
+        help='the number of parallel status queries after the start. 0: no status [default: %(default)s]')
 
 
 def defineText(subparsersMain):
@@ -270,11 +392,48 @@ def defineText(subparsersMain):
                                     dest='newline', help="add a newline at the --replacement string")
 
 
+def executeBatch(args, options: GlobalOptions):
+    '''Executes the command "batch".
+    @param args: the arguments
+    @param options: the global options
+    '''
+    from BatchRunner import BatchRunner
+    builder = BatchRunner(options, main)
+    if args.server is not None:
+        builder.serve(args.server)
+    else:
+        failed = builder.run(args.commands, args.stopOnError, args.results)
+        if failed > 0:
+            raise CLIError(f'{failed} command(s) failed')
+
+
+def executeCommand(args, options: GlobalOptions):
+    '''Executes the selected sub command.
+    @param args: the command line arguments
+    @param options: the global options
+    '''
+    if args.main == 'batch':
+        executeBatch(args, options)
+    elif args.main == 'install':
+        executeInstall(args, options)
+    elif args.main == 'package':
+        executePackage(args, options)
+    elif args.main == 'service':
+        executeService(args, options)
+    elif args.main == 'setup':
+        executeSetup(args, options)
+    elif args.main == 'text':
+        executeText(args, options)
+    else:
+        raise CLIError(f'unknown command: {args.main}')
+
+
 def executeInstall(args, options: GlobalOptions):
     '''Switches to a subcommand of "install".
     @param args: the arguments
     @param options: the global options
     '''
+    from InstallBuilder import InstallBuilder
     builder = InstallBuilder(options)
     if args.install == 'example-php':
         builder.examplePhp(args.file)
@@ -293,6 +452,7 @@ def executePackage(args, options: GlobalOptions):
     @param args: the arguments
     @param options: the global options
     '''
+    from PackageBuilder import PackageBuilder
     builder = PackageBuilder(options)
     if args.package == 'example':
         builder.example(args.file)
@@ -304,18 +464,47 @@ def executePackage(args, options: GlobalOptions):
         raise CLIError(f'unknown command: {args.package}')
 
 
+def executeProfiled(args, options: GlobalOptions):
+    '''Executes the selected sub command and measures the phases (global options --profile, --profile-file and --profile-dump).
+    @param args: the command line arguments
+    @param options: the global options
+    '''
+    former = Profiler.start()
+    dump = None
+    if args.profileDump is not None:
+        import cProfile
+        dump = cProfile.Profile()
+        dump.enable()
+    try:
+        executeCommand(args, options)
+    finally:
+        if dump is not None:
+            dump.disable()
+            dump.dump_stats(args.profileDump)
+        profiler = Profiler.stop(former)
+        StructuredLogger.StructuredLogger.flushAll()
+        if args.profile:
+            print('\n'.join(profiler.summary()))
+        if args.profileFile is not None and args.profileFile.endswith('.json'):
+            profiler.save(args.profileFile)
+        elif args.profileFile is not None:
+            with open(args.profileFile, 'w', encoding='utf-8') as fp:
+                fp.write('\n'.join(profiler.summary()) + '\n')
+
+
 def executeService(args, options: GlobalOptions):
     '''Switches to a subcommand of "service".
     @param args: the arguments
     @param options: the global options
     '''
+    from ServiceBuilder import ServiceBuilder
     builder = ServiceBuilder(options)
     if args.service == 'example':
         builder.example(args.file)
     elif args.service == 'check':
         builder.check(args.configuration)
     elif args.service == 'install':
-        builder.install(args.configuration)
+        builder.install(args.configuration, args.status)
     else:
         raise CLIError(f'unknown command: {args.package}')
 
@@ -325,11 +514,17 @@ def executeSetup(args, options: GlobalOptions):
     @param args: the arguments
     @param options: the global options
     '''
+    from SetupBuilder import SetupBuilder
     builder = SetupBuilder(options)
+    if args.setup in ('add-standard-users', 'adapt-users') and args.etc != '/etc':
+        # useradd, groupadd... would change the account files of the running system:
+        if not args.batch:
+            raise CLIError('--etc needs --batch')
+        builder.setEtcDirectory(args.etc)
     if args.setup == 'add-standard-users':
-        builder.addStandardUsers(args.form)
+        builder.addStandardUsers(args.form, args.batch)
     elif args.setup == 'adapt-users':
-        builder.adaptUsers(args.passwd, args.group, args.shadow)
+        builder.adaptUsers(args.passwd, args.group, args.shadow, args.batch)
     elif args.setup == 'example-add-standard-users':
         builder.exampleStandardUsers(args.file)
     elif args.setup == 'example-archive':
@@ -337,11 +532,24 @@ def executeSetup(args, options: GlobalOptions):
     elif args.setup == 'example-archive':
         builder.exampleArchive(args.file)
     elif args.setup == 'archive':
-        builder.archive(args.form, args.file)
+        builder.archive(args.form, args.file, args.full)
+    elif args.setup == 'archive-chain':
+        builder.restoreChain(args.form)
+    elif args.setup == 'monitor':
+        builder.monitor(args.output, args.interval, args.count, args.disks, args.interfaces, args.size)
     elif args.setup == 'patch-shadow':
-        builder.patchShadow(args.user, args.passwd, args.file)
+        if args.source is not None:
+            builder.patchShadowFromFile(args.source, args.file)
+        elif args.user is None or args.passwd is None:
+            raise CLIError('missing user and passwd (or --from)')
+        else:
+            builder.patchShadow(args.user, args.passwd, args.file)
     elif args.setup == 'example-standard-users':
         builder.exampleStandardUsers(args.file)
+    elif args.setup == 'plan-diff':
+        builder.planDiff(args.old, args.new)
+    elif args.setup == 'restore':
+        builder.restore(args.archive, args.target, args.pattern, args.parallel)
     elif args.setup == 'system-info':
         builder.systemInfo(args.form)
     elif args.setup == 'example-system-info':
@@ -354,6 +562,7 @@ def executeText(args, options: GlobalOptions):
     @param args: the arguments
     @param options: the global options
     '''
+    from TextTool import TextTool
     builder = TextTool(options)
     if args.text == 'replace-range':
         builder.replaceRange(args.document, args.replacement, args.file,
@@ -376,49 +585,25 @@ def main(argv=None):  # IGNORE:C0111
     programLicense, programVersionMessage, programName = buildUsageMessage(
         argv)
     try:
-        # Setup argument parser
-        parser = ArgumentParser(
-            description=programLicense, formatter_class=RawDescriptionHelpFormatter)
-        parser.add_argument('-v', '--verbose', dest='verbose', action='count',
-                            help='set verbosity level [default: %(default)s]')
-        parser.add_argument('-V', '--version', action='version',
-                            version=programVersionMessage)
-        parser.add_argument('-y', '--dry', dest='dry', action="store_true",
-                            help="do not create files and directories")
-        parser.add_argument('-n', '--not-root', dest='notRoot', action="store_false",
-                            help="commmand must not be executed as root")
-        parser.add_argument('-R', '--root', dest='root', action="store_true",
-                            help="commmand must be executed as root")
-        subparsersMain = parser.add_subparsers(
-            help='sub-command help', dest='main')
-
-
-        defineInstall(subparsersMain)
-        definePackage(subparsersMain)
-        defineService(subparsersMain)
-        defineSetup(subparsersMain)
-        defineText(subparsersMain)
+        parser = _parsers.get(programName)
+        if parser is None:
+            parser = _parsers[programName] = buildParser(programLicense, programVersionMessage)
 
         # Process arguments
         args = parser.parse_args(argv[1:])
-        options = GlobalOptions(args.verbose, args.dry, None)
+        options = GlobalOptions(args.verbose, args.dry, None, args.plan, args.jobs, args.converge, args.logJson)
         if args.notRoot:
             options.needsRoot = False
         elif args.root:
             options.needsRoot = True
-        dry = args.dry
-        if args.main == 'install':
-            executeInstall(args, options)
-        elif args.main == 'package':
-            executePackage(args, options)
-        elif args.main == 'service':
-            executeService(args, options)
-        elif args.main == 'setup':
-            executeSetup(args, options)
-        elif args.main == 'text':
-            executeText(args, options)
-        else:
-            raise CLIError(f'unknown command: {args.main}')
+        try:
+            if not args.profile and args.profileFile is None and args.profileDump is None:
+                executeCommand(args, options)
+            else:
+                executeProfiled(args, options)
+        finally:
+            # the buffered messages are written before the caller continues (e.g. batch mode, error message)
+            StructuredLogger.StructuredLogger.flushAll()
         return 0
     except KeyboardInterrupt:
         ### handle keyboard interrupt ###
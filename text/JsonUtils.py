@@ -5,11 +5,11 @@ Created on: 20.08.2023
     Author: SeaPlusPro
    License: CC0 1.0 Universal
 '''
-import re
+from base import LazyRegex
 #from typing import Sequence
 
 # ...................................1.....1.2............2
-REG_EXPR_FLOAT_LIST = re.compile(r'^[-+0-9.,;: eE]+$')
+REG_EXPR_FLOAT_LIST = LazyRegex.LazyRegex(r'^[-+0-9.,;: eE]+$')
 
 
 def checkJsonNodeType(specifiedType: str, node) -> str:
@@ -8,6 +8,7 @@ Created on: 20.08.2023
 import re
 
 from base import Const
+from base import LazyRegex
 from base import StringUtils
 from text import SearchRule
 from base import Logger
@@ -19,7 +20,7 @@ class SearchRuleList:
     '''
     # ..........................rule
     # .........................1
-    reRule = re.compile(r'%[a-zA-Z_]\w*%:'
+    reRule = LazyRegex.LazyRegex(r'%[a-zA-Z_]\w*%:'
                         #        rule
                         # ........A
                         + r'|(?:[be]of|[be]o[pn]?l'
@@ -40,14 +41,14 @@ class SearchRuleList:
                           + r'(?:-(?:[a-zA-Z]|\d\d?))?(?:-[a-zA-Z])?(?::([^\s]).*?\5(?:e=\S)?)?)'
                           # .......A
                           + r')')
-    reRuleExprParams = re.compile(r'[-+/*%](\$[A-Z]|\d+)?')
+    reRuleExprParams = LazyRegex.LazyRegex(r'[-+/*%](\$[A-Z]|\d+)?')
     # .........................1......12..............2.3.........3
-    reCommand = re.compile(r'([a-z]+)(-[a-zA-Z]|-\d+)?(-[a-zA-Z])?')
-    reRuleStateParam = re.compile(r'rows?|col|size-[A-Z]|rows-[A-Z]|hits')
-    reFlowControl = re.compile(
+    reCommand = LazyRegex.LazyRegex(r'([a-z]+)(-[a-zA-Z]|-\d+)?(-[a-zA-Z])?')
+    reRuleStateParam = LazyRegex.LazyRegex(r'rows?|col|size-[A-Z]|rows-[A-Z]|hits')
+    reFlowControl = LazyRegex.LazyRegex(
         r'(success|error):(continue|error|stop|%\w+%)')
     # ....................................A.........  A..1......12...2..3..3..4...........4
-    reRuleReplace = re.compile(
+    reRuleReplace = LazyRegex.LazyRegex(
         r'replace(?:-[a-zA-Z])?:([^\s])(.+?)\1(.*?)\1(e=.|,|c=\d+)*')
     # x=re.compile(r'replace:([^\s])(.+)\1(.*)\1(e=.)?')
 
@@ -839,7 +840,7 @@ print:"Full name: " print-F print:" " print-N
 class SearchData:
     '''Data for seaching (forward and backward)
     '''
-    reRange = re.compile(r':?(\d+)')
+    reRange = LazyRegex.LazyRegex(r':?(\d+)')
 
     def __init__(self):
         '''Constructor:
@@ -0,0 +1,157 @@
+'''
+UnitTemplate.py
+
+Created on: 19.10.2026
+    Author: SeaPlusPro
+   License: CC0 1.0 Universal
+'''
+import os
+import re
+
+# the built-in templates: type of the unit -> template text
+# Syntax: {{Name}} is replaced by the value "Name".
+# A line starting with "?" is removed if one of its values is empty.
+# A line starting with "#?" is written as comment if one of its values is empty.
+BUILTIN = {
+    'service': '''[Unit]
+Description={{Description}}
+After=syslog.target
+?Requires={{Requires}}
+[Service]
+Type={{Type}}
+User={{User}}
+?Group={{Group}}
+WorkingDirectory={{WorkingDirectory}}
+EnvironmentFile={{EnvironmentFile}}
+ExecStart={{ExecStart}}
+#?ExecReload={{ExecReload}}
+SyslogIdentifier={{SyslogIdentifier}}
+StandardOutput={{StandardOutput}}
+StandardError={{StandardError}}
+Restart={{Restart}}
+RestartSec={{RestartSec}}
+?{{Resources}}
+[Install]
+WantedBy=multi-user.target
+''',
+    'timer': '''[Unit]
+Description={{Description}}
+[Timer]
+?OnCalendar={{OnCalendar}}
+?OnBootSec={{OnBootSec}}
+?OnUnitActiveSec={{OnUnitActiveSec}}
+?Persistent={{Persistent}}
+?Unit={{Unit}}
+[Install]
+WantedBy=timers.target
+''',
+    'socket': '''[Unit]
+Description={{Description}}
+[Socket]
+ListenStream={{ListenStream}}
+?Accept={{Accept}}
+?Service={{Service}}
+[Install]
+WantedBy=sockets.target
+''',
+    'drop-in': '''[{{Section}}]
+{{Settings}}
+'''
+}
+# type of the unit -> compiled template
+_builtinCache = {}
+# filename -> ((mtime, size), compiled template)
+_fileCache = {}
+_regPlaceholder = re.compile(r'\{\{(\w+)\}\}')
+
+
+class UnitTemplate:
+    '''A template of a SystemD unit file. The template is compiled once and can be rendered many times.
+    '''
+
+    def __init__(self, text: str):
+        '''Constructor.
+        @param text: the template text, see BUILTIN for the syntax
+        '''
+        # a list of (mode, parts, fields): mode: '' (always) '?' (remove if empty) '#?' (comment if empty)
+        # parts: the line split by the placeholders: even index: literal, odd index: name of the value
+        self._lines = []
+        self.fields = []
+        for line in text.split('\n'):
+            mode = ''
+            if line.startswith('#?'):
+                mode, line = '#?', line[2:]
+            elif line.startswith('?'):
+                mode, line = '?', line[1:]
+            parts = _regPlaceholder.split(line)
+            fields = parts[1::2]
+            for name in fields:
+                if name not in self.fields:
+                    self.fields.append(name)
+            self._lines.append((mode, parts, fields))
+
+    def render(self, values: dict) -> str:
+        '''Returns the unit file defined by the template and the values.
+        @param values: a dictionary name -> value. None and '' are empty values, missing names too
+        @return: the contents of the unit file
+        '''
+        rc = []
+        for mode, parts, _ in self._lines:
+            if len(parts) == 1:
+                rc.append(parts[0])
+                continue
+            items = list(parts)
+            empty = False
+            for ix in range(1, len(items), 2):
+                value = values.get(items[ix])
+                if value is None or value == '':
+                    empty = True
+                    value = ''
+                items[ix] = str(value)
+            if not empty or mode == '':
+                rc.append(''.join(items))
+            elif mode == '#?':
+                rc.append('# ' + ''.join(items))
+        return '\n'.join(rc)
+
+
+def hasChanged(filename: str, contents: str) -> bool:
+    '''Compares the contents of a file with a rendered unit.
+    @param filename: the unit file
+    @param contents: the wanted contents
+    @return: True: the file does not exist or has another contents
+    '''
+    data = contents.encode('utf-8')
+    try:
+        if os.path.getsize(filename) != len(data):
+            return True
+        with open(filename, 'rb') as fp:
+            return fp.read() != data
+    except OSError:
+        return True
+
+
+def templateFromFile(filename: str) -> UnitTemplate:
+    '''Returns the compiled template stored in a file. The file is only compiled again if it has been changed.
+    @param filename: the file with the template text
+    @return: the compiled template
+    '''
+    statInfo = os.stat(filename)
+    key = (statInfo.st_mtime_ns, statInfo.st_size)
+    entry = _fileCache.get(filename)
+    if entry is None or entry[0] != key:
+        with open(filename, 'r', encoding='utf-8') as fp:
+            entry = (key, UnitTemplate(fp.read()))
+        _fileCache[filename] = entry
+    return entry[1]
+
+
+def templateOf(kind: str) -> UnitTemplate:
+    '''Returns a compiled built-in template.
+    @param kind: the type of the unit: one of the keys of BUILTIN, e.g. 'service'
+    @return: the compiled template
+    '''
+    rc = _builtinCache.get(kind)
+    if rc is None:
+        rc = _builtinCache[kind] = UnitTemplate(BUILTIN[kind])
+    return rc
@@ -0,0 +1,354 @@
+'''
+Benchmark.py
+
+Created on: 19.10.2026
+    Author: SeaPlusPro
+   License: CC0 1.0 Universal
+'''
+import os
+import sys
+import gc
+import json
+import time
+import random
+import tempfile
+import shutil
+import platform
+import statistics
+import subprocess
+import tracemalloc
+from argparse import ArgumentParser
+from typing import Sequence
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# pylint: disable=wrong-import-position
+import form2linux
+import Builder
+from TextTool import TextTool
+from base import AccountFiles
+from base import ChunkStore
+from base import FileHelper
+from base import MemoryLogger
+from text import TextProcessor
+
+
+def generateIni(filename: str, sections: int, keys: int, seed: int=4711):
+    '''Writes a configuration file in ini format.
+    @param filename: the file to write
+    @param sections: the number of sections
+    @param keys: the number of keys per section
+    @param seed: the random generator is initialized with that: the file is always the same
+    '''
+    generator = random.Random(seed)
+    with open(filename, 'w', encoding='utf-8') as fp:
+        for section in range(sections):
+            fp.write(f'[section{section}]\n')
+            for key in range(keys):
+                fp.write(f'key{key}={generator.randint(0, 1000000)} ; value of key {key}\n')
+            fp.write('\n')
+
+
+def generateMarkdown(filename: str, sections: int, seed: int=4711):
+    '''Writes a markdown document with code blocks.
+    @param filename: the file to write
+    @param sections: the number of sections: each section has a heading, text and a code block
+    @param seed: the random generator is initialized with that: the file is always the same
+    '''
+    generator = random.Random(seed)
+    words = ('form', 'linux', 'service', 'package', 'install', 'text', 'range', 'anchor')
+    with open(filename, 'w', encoding='utf-8') as fp:
+        for section in range(sections):
+            fp.write(f'## Section {section}\n')
+            for _ in range(5):
+                fp.write(' '.join(generator.choice(words) for _ in range(12)) + '\n')
+            fp.write(f'```\nversion {section}.{generator.randint(0, 99)}\n```\n\n')
+        fp.write('## Version\n```\n0.0.0\n```\n')
+
+
+def generatePasswd(filename: str, count: int):
+    '''Writes an account file in the format of /etc/passwd.
+    @param filename: the file to write
+    @param count: the number of users
+    '''
+    with open(filename, 'w', encoding='utf-8') as fp:
+        for ix in range(count):
+            fp.write(f'user{ix}:x:{1000 + ix}:{1000 + ix}:User {ix}:/home/user{ix}:/bin/bash\n')
+
+
+def generateTree(base: str, depth: int, width: int, files: int):
+    '''Creates a directory tree with small files.
+    @param base: the root of the tree
+    @param depth: the number of directory levels
+    @param width: the number of subdirectories of each directory
+    @param files: the number of files in each directory
+    '''
+    os.makedirs(base, exist_ok=True)
+    for ix in range(files):
+        name = 'prefs.js' if ix == 0 else f'file{ix}.{"json" if ix % 2 == 0 else "txt"}'
+        with open(os.path.join(base, name), 'w', encoding='utf-8') as fp:
+            fp.write(f'{base} {ix}\n')
+    if depth > 0:
+        for ix in range(width):
+            generateTree(os.path.join(base, f'dir{ix}'), depth - 1, width, files)
+
+
+def benchmarkChunkBoundaries(workDirectory: str, scale: float):
+    '''Prepares the benchmark of ChunkStore.chunkBoundaries() (content defined chunking with the gear hash).
+    @param workDirectory: the directory for the generated data (not used: the data are in memory)
+    @param scale: the size factor of the generated data
+    @return: a tuple (function, size): the function to measure, the number of bytes
+    '''
+    count = max(256 * 1024, int(32 * 1024 * 1024 * scale))
+    data = random.Random(4711).randbytes(count)
+
+    def run():
+        return len(list(ChunkStore.chunkBoundaries(data)))
+    return run, count
+
+
+def benchmarkExpandWildcards(workDirectory: str, scale: float):
+    '''Prepares the benchmark of FileHelper.expandWildcards().
+    @param workDirectory: the directory for the generated data
+    @param scale: the size factor of the generated data
+    @return: a tuple (function, size): the function to measure, the number of generated directories
+    '''
+    base = os.path.join(workDirectory, 'tree')
+    width = max(2, int(6 * scale))
+    generateTree(base, 3, width, 5)
+
+    def run():
+        names = []
+        FileHelper.expandWildcards(f'{base}/dir*/dir*/', '*.json,prefs.js', names)
+        return len(names)
+    return run, width + width ** 2 + width ** 3
+
+
+def benchmarkPatchEntries(workDirectory: str, scale: float):
+    '''Prepares the benchmark of AccountFiles.patchEntries() with a big passwd file.
+    @param workDirectory: the directory for the generated data
+    @param scale: the size factor of the generated data
+    @return: a tuple (function, size): the function to measure, the number of users
+    '''
+    filename = os.path.join(workDirectory, 'passwd')
+    count = max(10, int(20000 * scale))
+    generatePasswd(filename, count)
+    values = {f'user{ix}': f'User {ix} changed' for ix in range(0, count, 3)}
+
+    def run():
+        return len(AccountFiles.patchEntries(filename, values, 4, False)[1])
+    return run, count
+
+
+def benchmarkReplaceRange(workDirectory: str, scale: float):
+    '''Prepares the benchmark of TextTool.replaceRange().
+    @param workDirectory: the directory for the generated data
+    @param scale: the size factor of the generated data
+    @return: a tuple (function, size): the function to measure, the number of sections
+    '''
+    filename = os.path.join(workDirectory, 'document.md')
+    sections = max(10, int(5000 * scale))
+    generateMarkdown(filename, sections)
+    tool = TextTool(Builder.GlobalOptions(0, False, False))
+    versions = iter(range(1000000))
+
+    def run():
+        tool.replaceRange(filename, f'1.0.{next(versions)}', None, r'^## Version', '```', '```', None, None, 1, True)
+    return run, sections
+
+
+def benchmarkSearchRules(workDirectory: str, scale: float):
+    '''Prepares the benchmark of SearchRuleList.apply() (via TextProcessor.executeRules()).
+    @param workDirectory: the directory for the generated data
+    @param scale: the size factor of the generated data
+    @return: a tuple (function, size): the function to measure, the number of lines
+    '''
+    filename = os.path.join(workDirectory, 'search.ini')
+    sections = max(10, int(1000 * scale))
+    generateIni(filename, sections, 20)
+    processor = TextProcessor.TextProcessor(MemoryLogger.MemoryLogger(0))
+    processor.readFile(filename)
+    lines = list(processor.lines)
+    target = sections - 1
+
+    def run():
+        processor.setContent(list(lines))
+        return processor.executeRules(f'>/[section{target}]/ >/key19=/ bol replace:/key19/KEY19/')
+    return run, len(lines)
+
+
+def benchmarkStaging(workDirectory: str, scale: float):
+    '''Prepares the benchmark of the staging of a package: the section "Files" is copied into the package tree.
+    @param workDirectory: the directory for the generated data
+    @param scale: the size factor of the generated data
+    @return: a tuple (function, size): the function to measure, the number of copied files
+    '''
+    source = os.path.join(workDirectory, 'sources')
+    stage = os.path.join(workDirectory, 'stage')
+    directories = max(2, int(20 * scale))
+    for ix in range(directories):
+        generateTree(os.path.join(source, f'module{ix}'), 0, 0, 20)
+    builder = Builder.Builder(False, Builder.GlobalOptions(0, False, False))
+    # pylint: disable-next=protected-access
+    builder._files = {f'{source}/module{ix}/*': f'usr/share/bench/module{ix}' for ix in range(directories)}
+    # pylint: disable-next=protected-access
+    builder._baseDirectory = stage
+
+    def run():
+        if os.path.exists(stage):
+            shutil.rmtree(stage)
+        with builder.planning():
+            builder.handleFiles()
+    return run, directories * 20
+
+
+def benchmarkStartup(workDirectory: str, scale: float):
+    '''Prepares the benchmark of the startup of form2linux: "--version" and "text replace-range" in a new process.
+    @param workDirectory: the directory for the generated data
+    @param scale: the size factor of the generated data (not used: the startup does not depend on the data)
+    @return: a tuple (function, size): the function to measure, the number of started processes
+    '''
+    filename = os.path.join(workDirectory, 'startup.md')
+    generateMarkdown(filename, 10)
+    script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'form2linux.py')
+    commands = ([sys.executable, script, '--version'],
+                [sys.executable, script, 'text', 'replace-range', filename, '--replacement=1.0.0', '--anchor=^## Version'])
+
+    def run():
+        for command in commands:
+            subprocess.run(command, capture_output=True, check=True)
+        return len(commands)
+    return run, len(commands)
+
+
+def benchmarkTextReplace(workDirectory: str, scale: float):
+    '''Prepares the benchmark of TextProcessor.replace() with a regular expression and group references.
+    @param workDirectory: the directory for the generated data
+    @param scale: the size factor of the generated data
+    @return: a tuple (function, size): the function to measure, the number of lines
+    '''
+    filename = os.path.join(workDirectory, 'replace.ini')
+    generateIni(filename, max(10, int(1000 * scale)), 20)
+    processor = TextProcessor.TextProcessor(MemoryLogger.MemoryLogger(0))
+    processor.readFile(filename)
+    lines = list(processor.lines)
+
+    def run():
+        processor.setContent(list(lines))
+        return processor.replace(r'^key(\d+)=(\d+)', r'key$1 = $2', '$')
+    return run, len(lines)
+
+
+# name -> function preparing the benchmark
+BENCHMARKS = {
+    'chunk-boundaries': benchmarkChunkBoundaries,
+    'expand-wildcards': benchmarkExpandWildcards,
+    'patch-entries': benchmarkPatchEntries,
+    'replace-range': benchmarkReplaceRange,
+    'search-rules': benchmarkSearchRules,
+    'staging': benchmarkStaging,
+    'startup': benchmarkStartup,
+    'text-replace': benchmarkTextReplace,
+}
+
+
+def measure(function, repeat: int):
+    '''Measures the execution time and the memory usage of a function.
+    @param function: the function to measure
+    @param repeat: the number of timed runs
+    @return: a dictionary with the statistics
+    '''
+    # warm up: caches, lazy compiled regular expressions...
+    function()
+    wallTimes = []
+    cpuTimes = []
+    for _ in range(repeat):
+        gc.collect()
+        startCpu = time.process_time()
+        start = time.perf_counter()
+        function()
+        wallTimes.append(time.perf_counter() - start)
+        cpuTimes.append(time.process_time() - startCpu)
+    # the memory is measured in an extra run: tracemalloc slows down the execution
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'Min': round(min(wallTimes), 6), 'Median': round(statistics.median(wallTimes), 6),
+            'Mean': round(statistics.mean(wallTimes), 6), 'Cpu': round(statistics.median(cpuTimes), 6),
+            'PeakMemory': peak}
+
+
+def compare(current, former) -> Sequence[str]:
+    '''Compares the results of two runs.
+    @param current: the results of the current run
+    @param former: the results of a former run, e.g. of the last version
+    @return: a list of lines: one line per benchmark with the relation of the medians
+    '''
+    rc = []
+    for name, data in current['Results'].items():
+        old = former['Results'].get(name)
+        if old is None:
+            rc.append(f'{name}: new')
+        else:
+            ratio = data['Median'] / old['Median'] if old['Median'] > 0 else 0.0
+            rc.append(f'{name}: {old["Median"] * 1000:.3f} ms -> {data["Median"] * 1000:.3f} ms ({ratio:.2f})')
+    return rc
+
+
+def run(names: Sequence[str], scale: float=1.0, repeat: int=5, workDirectory: str=None):
+    '''Executes benchmarks.
+    @param names: the names of the benchmarks to execute (see BENCHMARKS)
+    @param scale: the size factor of the generated data
+    @param repeat: the number of timed runs of each benchmark
+    @param workDirectory: None or the directory for the generated data. Will be removed at the end
+    @return: the results as Json data
+    '''
+    if workDirectory is None:
+        workDirectory = tempfile.mkdtemp(prefix='form2linux.benchmark.')
+    rc = {'Version': form2linux.__version__, 'Python': platform.python_version(), 'Host': platform.node(),
+          'Time': time.strftime('%Y-%m-%d %H:%M:%S'), 'Scale': scale, 'Repeat': repeat, 'Results': {}}
+    try:
+        for name in names:
+            directory = os.path.join(workDirectory, name)
+            os.makedirs(directory, exist_ok=True)
+            function, size = BENCHMARKS[name](directory, scale)
+            result = measure(function, repeat)
+            result['Size'] = size
+            rc['Results'][name] = result
+    finally:
+        shutil.rmtree(workDirectory, ignore_errors=True)
+    return rc
+
+
+def main(argv=None):
+    '''Executes the benchmarks selected by the program arguments.
+    @param argv: the program arguments. None: sys.argv
+    @return: the exit code
+    '''
+    parser = ArgumentParser(description='measures the speed of the hot paths of form2linux')
+    parser.add_argument('names', nargs='*', help=f'the benchmarks to execute: {", ".join(BENCHMARKS)} [default: all]')
+    parser.add_argument('-s', '--scale', type=float, default=1.0, help='the size factor of the generated data')
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='the number of timed runs of each benchmark')
+    parser.add_argument('-o', '--output', help='the results are stored as Json in that file')
+    parser.add_argument('-c', '--compare', help='a Json file of a former run: the results are compared')
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+    names = args.names or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            parser.error(f'unknown benchmark: {name}')
+    results = run(names, args.scale, args.repeat)
+    for name, data in results['Results'].items():
+        print(f'{name:<18} median {data["Median"] * 1000:10.3f} ms  cpu {data["Cpu"] * 1000:10.3f} ms'
+              f'  peak {data["PeakMemory"] // 1024:8d} KiB  size {data["Size"]}')
+    if args.compare is not None:
+        with open(args.compare, 'r', encoding='utf-8') as fp:
+            for line in compare(results, json.load(fp)):
+                print(line)
+    if args.output is not None:
+        with open(args.output, 'w', encoding='utf-8') as fp:
+            json.dump(results, fp, indent=1)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,44 @@
+'''
+BenchmarkTest.py
+
+Created on: 19.10.2026
+    Author: SeaPlusPro
+   License: CC0 1.0 Universal
+'''
+import json
+import unittest
+import Benchmark
+from base import FileHelper
+from base import StringUtils
+
+
+def inDebug(): return False
+
+
+class BenchmarkTest(unittest.TestCase):
+
+    def testRun(self):
+        if inDebug():
+            return
+        results = Benchmark.run(list(Benchmark.BENCHMARKS), 0.01, 1,
+                                FileHelper.tempDirectory('benchmark', 'unittest'))
+        self.assertEqual(sorted(results['Results']), sorted(Benchmark.BENCHMARKS))
+        for data in results['Results'].values():
+            self.assertTrue(data['Median'] > 0 and data['Min'] <= data['Median'])
+            self.assertTrue(data['PeakMemory'] > 0 and data['Size'] > 0)
+
+    def testMainCompare(self):
+        if inDebug():
+            return
+        fnResults = FileHelper.tempFile('benchmark.json', 'unittest')
+        Benchmark.main(['--scale=0.01', '--repeat=1', f'--output={fnResults}', 'text-replace', 'patch-entries'])
+        former = json.loads(StringUtils.fromFile(fnResults))
+        self.assertEqual(sorted(former['Results']), ['patch-entries', 'text-replace'])
+        current = Benchmark.run(['text-replace', 'search-rules'], 0.01, 1)
+        lines = Benchmark.compare(current, former)
+        self.assertTrue(lines[0].startswith('text-replace: '))
+        self.assertEqual(lines[1], 'search-rules: new')
+
+
+if __name__ == '__main__':
+    unittest.main()
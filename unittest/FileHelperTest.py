@@ -626,6 +626,35 @@ tmpfs /run/user/1000 tmpfs rw,nosuid,nodev,relatime,size=3082088k,mode=700,uid=1
         FileHelper.changeExtendedAttributes(fn, toDelete='c')
         self.assertEqual('A', FileHelper.extendedAttributesOf(fn))
 
+    def testExpandWildcards(self):
+        if inDebug(): return
+        base = FileHelper.tempDirectory('wildcards', 'unittest.fh')
+        self.ensureFileDoesNotExist(base)
+        for user in ('adam', 'berta', 'charly'):
+            for profile in ('p1.default', 'p2.default'):
+                FileHelper.ensureDirectory(f'{base}/{user}/.mozilla/{profile}')
+                StringUtils.toFile(f'{base}/{user}/.mozilla/{profile}/bookmarks.json', '')
+                StringUtils.toFile(f'{base}/{user}/.mozilla/{profile}/prefs.js', '')
+            FileHelper.ensureDirectory(f'{base}/{user}/.mozilla/p1.default/dir.json')
+        os.symlink('/does/not/exist', f'{base}/adam/.mozilla/p1.default/broken.json')
+        names = []
+        FileHelper.expandWildcards(f'{base}/*/.mozilla/*.default/', '*.json,prefs.js,missing', names)
+        self.assertEqual(12, len(names))
+        self.assertEqual(f'{base}/adam/.mozilla/p1.default/bookmarks.json', sorted(names)[0])
+        self.assertFalse(any(name.endswith('dir.json') or name.endswith('broken.json') for name in names))
+        names = []
+        FileHelper.expandWildcards(f'{base}/[ab]*/.mozilla/p2.default', 'prefs.js', names, 1)
+        self.assertEqual([f'{base}/adam/.mozilla/p2.default/prefs.js', f'{base}/berta/.mozilla/p2.default/prefs.js'],
+                         sorted(names))
+
+    def testExpandPathPlaceholders(self):
+        if inDebug(): return
+        start = int(time.time())
+        name = FileHelper.expandPathPlaceholders('/backup/%name%.%seconds%%ext%', '/etc/form.json')
+        self.assertTrue(name.startswith('/backup/form.') and name.endswith('.json'))
+        seconds = int(name[len('/backup/form.'):-len('.json')])
+        self.assertTrue(start <= seconds <= time.time())
+
 
 if __name__ == '__main__':
     sys.argv = ['', 'Test.testName']
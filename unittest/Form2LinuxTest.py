@@ -5,14 +5,26 @@ Created on: 20.08.2023
     Author: SeaPlusPro
    License: CC0 1.0 Universal
 '''
+import io
 import os.path
+import shutil
+import contextlib
 import json
 import unittest
+import subprocess
+import sys
+import time
+import socket
+import threading
 import form2linux
+import Builder
+import BatchRunner
+from Builder import CLIError
 from base import MemoryLogger
 from base import ProcessHelper
 from base import StringUtils
 from base import FileHelper
+from base import Profiler
 def inDebug(): return False
 
 class form2linuxTest(unittest.TestCase):
@@ -64,7 +76,7 @@ After=syslog.target
 Type=simple
 User=nobody
 Group=nobody
-WorkingDirectory=None
+WorkingDirectory=/tmp
 EnvironmentFile=-/etc/examplesv/examplesv.env
 ExecStart=/usr/local/bin/examplesv daemon
 ExecReload=/usr/local/bin/examplesv reload
@@ -76,3 +88,414 @@ RestartSec=5
 [Install]
 WantedBy=multi-user.target
 ''')
+
+    def testServicePlan(self):
+        if inDebug(): return
+        logger = MemoryLogger.MemoryLogger(3)
+        processHelper = ProcessHelper.ProcessHelper(logger)
+        fnPlan = FileHelper.tempFile('service.plan.json', 'unittest')
+        fnPlan2 = FileHelper.tempFile('service.plan2.json', 'unittest')
+        old = processHelper.pushd(os.path.join(os.path.dirname(__file__), 'service/test'))
+        form2linux.main(['form2linux', '-v', f'--plan={fnPlan}', 'service', 'install', 'service.json'])
+        processHelper.popd(old)
+        data = json.loads(StringUtils.fromFile(fnPlan))
+        operations = {op['Description']: op for op in data['Operations']}
+        mkdir = operations['mkdir -p /etc/examplesv']
+        copy = operations['cp -a scripts/examplesv /etc/examplesv/examplesv']
+        self.assertEqual(copy['Type'], 'copy')
+        self.assertEqual(copy['Depends'], [mkdir['Id']])
+        write = operations['write /tmp/examplesv.service']
+        self.assertEqual(write['Size'], 407)
+        # the first program depends on all file operations:
+        run = [op for op in data['Operations'] if op['Type'] == 'run'][0]
+        self.assertTrue(copy['Id'] in run['Depends'] and write['Id'] in run['Depends'])
+        self.assertEqual(operations['systemctl enable --now examplesv']['Type'], 'run')
+        data['Operations'] = [op for op in data['Operations'] if op['Type'] != 'copy']
+        StringUtils.toFile(fnPlan2, json.dumps(data))
+        form2linux.main(['form2linux', '-v', 'setup', 'plan-diff', fnPlan2, fnPlan])
+        lines = Builder.BuilderStatus.lastLogger().getMessages()
+        self.assertEqual(lines, ['+ cp -a scripts/examplesv /etc/examplesv/examplesv',
+                                 '+ cp -a examplesv.env /etc/examplesv/examplesv.env', '# differences: 2'])
+
+    def testPlanParallel(self):
+        if inDebug(): return
+        base = FileHelper.tempDirectory('parallel', 'unittest')
+        shutil.rmtree(base)
+        builder = Builder.Builder(False, Builder.GlobalOptions(2, False, False, None, 4))
+        with builder.planning() as plan:
+            for subdir in ('a', 'b', 'c'):
+                builder.makeDirectory(f'{base}/{subdir}/x')
+                for ix in range(3):
+                    builder.writeFile(f'{base}/{subdir}/x/file{ix}.txt', f'{subdir}{ix}')
+            builder.runProgram(f'ls {base}/a/x', verbose=False)
+            builder.writeFile(f'{base}/last.txt', 'last')
+        self.assertEqual(len(plan.operations), 14)
+        self.assertEqual(plan.operations[1].depends, [1])
+        self.assertEqual(plan.operations[12].depends, list(range(1, 13)))
+        self.assertEqual(plan.operations[13].depends, [13])
+        for operation in plan.operations:
+            self.assertTrue(operation.duration is not None)
+        for subdir in ('a', 'b', 'c'):
+            self.assertEqual(StringUtils.fromFile(f'{base}/{subdir}/x/file2.txt'), f'{subdir}2')
+        self.assertEqual(StringUtils.fromFile(f'{base}/last.txt'), 'last')
+        lines = Builder.BuilderStatus.lastLogger().getMessages()
+        self.assertTrue(lines[-1].startswith('# 14 operation(s) in '))
+        self.assertTrue(lines[-1].endswith(' with 4 worker(s)'))
+
+    def testConverge(self):
+        if inDebug(): return
+        Builder.BuilderStatus.underTest = True
+        base = FileHelper.tempDirectory('converge', 'unittest')
+        shutil.rmtree(base)
+        fnSource = FileHelper.tempFile('converge.source', 'unittest')
+        StringUtils.toFile(fnSource, 'source')
+        if os.path.exists('/tmp/unittest/fingerprints.json'):
+            os.unlink('/tmp/unittest/fingerprints.json')
+        def run():
+            builder = Builder.Builder(False, Builder.GlobalOptions(True, False, False, converge=True))
+            with builder.planning() as plan:
+                builder.ensureDirectory(base)
+                builder.copyFile(fnSource, f'{base}/copy.txt')
+                builder.saveFile(f'{base}/config.txt')
+                builder.writeFile(f'{base}/config.txt', 'config')
+                builder.runProgram(f'ls {base}', verbose=False)
+            return [op.skipped for op in plan.operations]
+        self.assertEqual(run(), [False, False, False, False])
+        self.assertEqual(StringUtils.fromFile(f'{base}/config.txt'), 'config')
+        # the directory exists: no mkdir, copy, save and write are skipped, a program is always run:
+        self.assertEqual(run(), [True, True, True, False])
+        self.assertEqual(sorted(os.listdir(base)), ['config.txt', 'copy.txt'])
+        lines = Builder.BuilderStatus.lastLogger().getMessages()
+        self.assertEqual(lines, ['# converged: 3 of 4 operation(s) skipped'])
+        StringUtils.toFile(fnSource, 'source2')
+        self.assertEqual(run(), [False, True, True, False])
+        self.assertEqual(StringUtils.fromFile(f'{base}/copy.txt'), 'source2')
+
+    def testConvergeRemovedPackage(self):
+        if inDebug(): return
+        Builder.BuilderStatus.underTest = True
+        fnStatus = FileHelper.tempFile('converge.status', 'unittest')
+        StringUtils.toFile(fnStatus, 'Package: bash\nStatus: install ok installed\nVersion: 5.2\n\n'
+                           + 'Package: htop\nStatus: install ok installed\nVersion: 3.2\n')
+        # the fingerprints of a former run (which has installed htop):
+        StringUtils.toFile('/tmp/unittest/fingerprints.json', json.dumps({'Files': {}}))
+        def run():
+            builder = Builder.Builder(False, Builder.GlobalOptions(True, True, False, converge=True))
+            builder.setDpkgStatusFile(fnStatus)
+            with builder.planning() as plan:
+                builder.installPackages(['bash', 'htop'])
+            return builder, plan
+        _, plan = run()
+        self.assertEqual(plan.operations, [])
+        # htop has been removed since the last run:
+        StringUtils.toFile(fnStatus, 'Package: bash\nStatus: install ok installed\nVersion: 5.2\n')
+        _, plan = run()
+        runs = [op for op in plan.operations if op.kind == 'run']
+        self.assertEqual(runs[-1].args['command'], 'apt-get -y install htop')
+        self.assertFalse(any(op.skipped for op in runs))
+        self.assertTrue(Builder.BuilderStatus.lastLogger().contains('sudo apt-get -y install htop'))
+
+    def testServicesPlan(self):
+        if inDebug(): return
+        fnForm = FileHelper.tempFile('services.json', 'unittest')
+        fnPlan = FileHelper.tempFile('services.plan.json', 'unittest')
+        services = []
+        for name in ('worker', 'web', 'cron'):
+            if os.path.exists(f'/tmp/unittest/f2l{name}.service'):
+                os.unlink(f'/tmp/unittest/f2l{name}.service')
+            services.append(f'''{{ "Name": "f2l{name}", "Description": "{name}", "File": "/tmp/unittest/f2l{name}.service",
+  "User": "root", "Group": "", "WorkingDirectory": "/tmp", "EnvironmentFile": "-/etc/f2l/{name}.env",
+  "ExecStart": "/usr/bin/sleep 1000", "ExecReload": "", "SyslogIdentifier": "{name}", "StandardOutput": "journal",
+  "StandardError": "journal", "Restart": "always", "RestartSec": 5 }}''')
+        StringUtils.toFile(fnForm, '''{ "Variables": {}, "Services": [''' + ',\n'.join(services) + '''],
+  "Directories": [], "Files": {}, "Links": {} }''')
+        form2linux.main(['form2linux', '-v', f'--plan={fnPlan}', 'service', 'install', fnForm])
+        data = json.loads(StringUtils.fromFile(fnPlan))
+        self.assertEqual([op['Description'] for op in data['Operations']], [
+            'write /tmp/unittest/f2lworker.service', 'write /tmp/unittest/f2lweb.service',
+            'write /tmp/unittest/f2lcron.service', 'systemctl daemon-reload',
+            'systemctl enable --now f2lworker f2lweb f2lcron'])
+        StringUtils.toFile(fnForm, '''{ "Variables": {}, "Services": [''' + ',\n'.join([services[0], services[0]]) + '''],
+  "Directories": [], "Files": {}, "Links": {} }''')
+        with self.assertRaises(CLIError):
+            form2linux.main(['form2linux', '-v', f'--plan={fnPlan}', 'service', 'install', fnForm])
+
+    def testServiceUnchanged(self):
+        if inDebug(): return
+        fnForm = FileHelper.tempFile('unchanged.json', 'unittest')
+        fnPlan = FileHelper.tempFile('unchanged.plan.json', 'unittest')
+        fnTemplate = FileHelper.tempFile('unchanged.template', 'unittest')
+        StringUtils.toFile(fnTemplate, '''[Unit]
+Description={{Description}}
+[Service]
+ExecStart={{ExecStart}}
+?Group={{Group}}
+''')
+        services = []
+        for name in ('one', 'two'):
+            fnService = f'/tmp/unittest/f2l{name}.service'
+            if os.path.exists(fnService):
+                os.unlink(fnService)
+            services.append(f'''{{ "Name": "f2l{name}", "Description": "{name}", "File": "{fnService}",
+  "User": "root", "Group": "", "WorkingDirectory": "/tmp", "EnvironmentFile": "-/etc/f2l/{name}.env",
+  "ExecStart": "/usr/bin/sleep 1000", "ExecReload": "", "SyslogIdentifier": "{name}", "StandardOutput": "journal",
+  "StandardError": "journal", "Restart": "always", "RestartSec": 5, "Template": "{fnTemplate}" }}''')
+        StringUtils.toFile(fnForm, '''{ "Variables": {}, "Services": [''' + ',\n'.join(services) + '''],
+  "Directories": [], "Files": {}, "Links": {} }''')
+        # dry mode: the unit files are written, the programs are not called
+        form2linux.main(['form2linux', '-v', '-y', 'service', 'install', '--status=0', fnForm])
+        self.assertEqual(StringUtils.fromFile('/tmp/unittest/f2lone.service'), '''[Unit]
+Description=one
+[Service]
+ExecStart=/usr/bin/sleep 1000
+''')
+        form2linux.main(['form2linux', '-v', f'--plan={fnPlan}', 'service', 'install', fnForm])
+        data = json.loads(StringUtils.fromFile(fnPlan))
+        self.assertEqual([op['Description'] for op in data['Operations']], ['systemctl enable --now f2lone f2ltwo'])
+        StringUtils.toFile('/tmp/unittest/f2ltwo.service', 'outdated')
+        form2linux.main(['form2linux', '-v', f'--plan={fnPlan}', 'service', 'install', fnForm])
+        data = json.loads(StringUtils.fromFile(fnPlan))
+        self.assertEqual([op['Description'] for op in data['Operations']], [
+            'write /tmp/unittest/f2ltwo.service', 'systemctl daemon-reload', 'systemctl enable --now f2lone f2ltwo'])
+
+    def testServiceResources(self):
+        if inDebug(): return
+        fnForm = FileHelper.tempFile('resources.json', 'unittest')
+        fnService = FileHelper.tempFile('f2lres.service', 'unittest')
+
+        def build(resources: str):
+            StringUtils.toFile(fnForm, f'''{{ "Variables": {{ "CPUS": "0-3" }}, "Service": {{ "Name": "f2lres",
+  "Description": "resources", "File": "{fnService}", "User": "root", "Group": "", "WorkingDirectory": "/tmp",
+  "EnvironmentFile": "-/etc/f2l/res.env", "ExecStart": "/usr/bin/sleep 1000", "ExecReload": "",
+  "SyslogIdentifier": "res", "StandardOutput": "journal", "StandardError": "journal", "Restart": "always",
+  "RestartSec": 5, "Type": "notify", "Resources": {resources} }},
+  "Directories": [], "Files": {{}}, "Links": {{}} }}''')
+            form2linux.main(['form2linux', '-v', '-y', 'service', 'install', '--status=0', fnForm])
+        build('''{ "CPUQuota": "150%", "MemoryMax": "2G", "IOWeight": 200, "Nice": -5, "CPUAffinity": "%(CPUS)",
+  "LimitNOFILE": "65536", "TasksMax": "4096" }''')
+        contents = StringUtils.fromFile(fnService)
+        self.assertTrue(contents.find('Type=notify\n') > 0)
+        self.assertTrue(contents.endswith('''RestartSec=5
+CPUQuota=150%
+CPUAffinity=0-3
+Nice=-5
+IOWeight=200
+MemoryMax=2G
+TasksMax=4096
+LimitNOFILE=65536
+[Install]
+WantedBy=multi-user.target
+'''))
+        for wrong in ('{ "Nice": 20 }', '{ "IOWeight": 0 }', '{ "MemoryMax": "2X" }', '{ "CPUQuota": "0.5" }',
+                      '{ "CPUAffinity": "all" }', '{ "LimitNOFILE": "-1" }'):
+            with self.assertRaises(CLIError):
+                build(wrong)
+
+    def testServiceSocket(self):
+        if inDebug(): return
+        fnForm = FileHelper.tempFile('socket.json', 'unittest')
+        fnPlan = FileHelper.tempFile('socket.plan.json', 'unittest')
+        services = []
+        for name, socketEntry in (('f2lsock', ', "Socket": { "ListenStream": "127.0.0.1:8099" }'), ('f2leager', '')):
+            fnService = f'/tmp/unittest/{name}.service'
+            for filename in (fnService, fnService.replace('.service', '.socket')):
+                if os.path.exists(filename):
+                    os.unlink(filename)
+            services.append(f'''{{ "Name": "{name}", "Description": "{name}", "File": "{fnService}",
+  "User": "root", "Group": "", "WorkingDirectory": "/tmp", "EnvironmentFile": "-/etc/f2l/{name}.env",
+  "ExecStart": "/usr/bin/sleep 1000", "ExecReload": "", "SyslogIdentifier": "{name}", "StandardOutput": "journal",
+  "StandardError": "journal", "Restart": "always", "RestartSec": 5 {socketEntry} }}''')
+        StringUtils.toFile(fnForm, '''{ "Variables": {}, "Services": [''' + ',\n'.join(services) + '''],
+  "Directories": [], "Files": {}, "Links": {} }''')
+        form2linux.main(['form2linux', '-v', f'--plan={fnPlan}', 'service', 'install', fnForm])
+        data = json.loads(StringUtils.fromFile(fnPlan))
+        self.assertEqual([op['Description'] for op in data['Operations']], [
+            'write /tmp/unittest/f2lsock.service', 'write /tmp/unittest/f2leager.service',
+            'write /tmp/unittest/f2lsock.socket', 'systemctl daemon-reload',
+            'systemctl enable --now f2lsock.socket f2leager'])
+        form2linux.main(['form2linux', '-v', '-y', 'service', 'install', '--status=0', fnForm])
+        self.assertEqual(StringUtils.fromFile('/tmp/unittest/f2lsock.socket'), '''[Unit]
+Description=Socket of f2lsock
+[Socket]
+ListenStream=127.0.0.1:8099
+Service=f2lsock.service
+[Install]
+WantedBy=sockets.target
+''')
+        self.assertTrue(StringUtils.fromFile('/tmp/unittest/f2lsock.service').find('\nRequires=f2lsock.socket\n') > 0)
+        self.assertTrue(StringUtils.fromFile('/tmp/unittest/f2leager.service').find('Requires=') < 0)
+        StringUtils.toFile(fnForm, StringUtils.fromFile(fnForm).replace('127.0.0.1:8099', 'localhost'))
+        with self.assertRaises(CLIError):
+            form2linux.main(['form2linux', '-v', f'--plan={fnPlan}', 'service', 'install', fnForm])
+
+    def testServiceInstances(self):
+        if inDebug(): return
+        fnForm = FileHelper.tempFile('instances.json', 'unittest')
+        fnPlan = FileHelper.tempFile('instances.plan.json', 'unittest')
+        fnTemplate = '/tmp/unittest/f2lworker@.service'
+
+        def build(extra: str, plan: bool=True):
+            StringUtils.toFile(fnForm, f'''{{ "Variables": {{}}, "Service": {{ "Name": "f2lworker",
+  "Description": "worker %i", "File": "/tmp/unittest/f2lworker.service", "User": "root", "Group": "",
+  "WorkingDirectory": "/tmp", "EnvironmentFile": "-/etc/f2l/worker.env", "ExecStart": "/usr/bin/sleep 1000",
+  "ExecReload": "", "SyslogIdentifier": "worker", "StandardOutput": "journal", "StandardError": "journal",
+  "Restart": "always", "RestartSec": 5 {extra} }}, "Directories": [], "Files": {{}}, "Links": {{}} }}''')
+            if plan:
+                form2linux.main(['form2linux', '-v', f'--plan={fnPlan}', 'service', 'install', fnForm])
+                return [op['Description'] for op in json.loads(StringUtils.fromFile(fnPlan))['Operations']]
+            form2linux.main(['form2linux', '-v', '-y', 'service', 'install', '--status=0', fnForm])
+            return None
+        if os.path.exists(fnTemplate):
+            os.unlink(fnTemplate)
+        self.assertEqual(build(', "Instances": 3'), [f'write {fnTemplate}', 'systemctl daemon-reload',
+                                                     'systemctl enable --now f2lworker@0 f2lworker@1 f2lworker@2'])
+        cpus = os.cpu_count()
+        self.assertEqual(build(', "Instances": "per-core"')[-1], 'systemctl enable --now '
+                         + ' '.join(f'f2lworker@{ix}' for ix in range(cpus)))
+        build(', "Instances": 1, "Pinned": true', False)
+        self.assertTrue(StringUtils.fromFile(fnTemplate).find('\nCPUAffinity=%i\n') > 0)
+        for wrong in (', "Instances": 0', ', "Instances": "many"', ', "Pinned": true',
+                      f', "Instances": {cpus + 1}, "Pinned": true',
+                      ', "Instances": 2, "Socket": { "ListenStream": "8099" }'):
+            with self.assertRaises(CLIError):
+                build(wrong)
+
+    def testStartupImports(self):
+        if inDebug(): return
+        fnDocument = FileHelper.tempFile('startup.md', 'unittest')
+        StringUtils.toFile(fnDocument, 'Version:\n```\n0.1\n```\n')
+        # the docstring is used by the usage message of form2linux
+        script = f'''"""startup
+test of form2linux"""
+import sys
+import form2linux
+form2linux.main(['form2linux', 'text', 'replace-range', '{fnDocument}', '--replacement=0.2', '--anchor=Version', '-n'])
+print(' '.join(sorted(name for name in ('InstallBuilder', 'PackageBuilder', 'ServiceBuilder', 'SetupBuilder',
+    'text.TextProcessor', 'text.SearchRuleList') if name in sys.modules)))
+'''
+        base = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        process = subprocess.run([sys.executable, '-c', script], cwd=base, capture_output=True, check=True)
+        self.assertEqual(process.stdout.decode().strip().split('\n')[-1], '')
+        self.assertEqual(StringUtils.fromFile(fnDocument), 'Version:\n```\n0.2\n```\n')
+
+    def testBatch(self):
+        if inDebug(): return
+        fnDocument = FileHelper.tempFile('batch.md', 'unittest')
+        fnExample = FileHelper.tempFile('batch.example.json', 'unittest')
+        fnCommands = FileHelper.tempFile('batch.txt', 'unittest')
+        fnResults = FileHelper.tempFile('batch.results.json', 'unittest')
+        StringUtils.toFile(fnDocument, 'Version:\n```\n0.1\n```\n')
+        StringUtils.toFile(fnCommands, f'''# a comment
+form2linux text replace-range {fnDocument} --replacement=0.3 --anchor=Version -n
+service example --file="{fnExample}"
+service check /tmp/unittest/does-not-exist.json
+batch other.txt
+''')
+        output = io.StringIO()
+        with self.assertRaises(CLIError), contextlib.redirect_stdout(output):
+            form2linux.main(['form2linux', 'batch', fnCommands, f'--results={fnResults}'])
+        lines = [line for line in output.getvalue().split('\n') if line.startswith('# ')]
+        self.assertEqual(len([line for line in lines if line.startswith('# exit code')]), 4)
+        self.assertTrue(lines[-1].startswith('# 4 command(s), 2 failed in'))
+        # without failure: the runner is destroyed before the end of main():
+        StringUtils.toFile(fnCommands, 'service example\nservice example\n')
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            form2linux.main(['form2linux', 'batch', fnCommands])
+        lines = [line for line in output.getvalue().split('\n') if line.startswith('# ')]
+        self.assertEqual(len([line for line in lines if line.startswith('# exit code 0')]), 2)
+        self.assertTrue(lines[-1].startswith('# 2 command(s), 0 failed in'))
+        self.assertEqual(StringUtils.fromFile(fnDocument), 'Version:\n```\n0.3\n```\n')
+        self.assertTrue(StringUtils.fromFile(fnExample).find('examplesv') > 0)
+        results = json.loads(StringUtils.fromFile(fnResults))['Results']
+        self.assertEqual([item['ExitCode'] for item in results], [0, 0, 2, 1])
+        self.assertTrue(results[0]['Command'].startswith('form2linux text replace-range'))
+        StringUtils.toFile(fnCommands, json.dumps([['service', 'check', '/tmp/unittest/does-not-exist.json'],
+                                                   'service example']))
+        with self.assertRaises(CLIError):
+            form2linux.main(['form2linux', 'batch', fnCommands, '--stop-on-error', f'--results={fnResults}'])
+        results = json.loads(StringUtils.fromFile(fnResults))['Results']
+        self.assertEqual([item['ExitCode'] for item in results], [2])
+
+    def testBatchDry(self):
+        if inDebug(): return
+        source = FileHelper.tempDirectory('batch.src', 'unittest')
+        StringUtils.toFile(f'{source}/a.txt', 'a')
+        fnForm = FileHelper.tempFile('batch.archive.json', 'unittest')
+        fnArchive = FileHelper.tempFile('batch.tar.gz', 'unittest')
+        fnCommands = FileHelper.tempFile('batch.dry.txt', 'unittest')
+        FileHelper.ensureFileDoesNotExist(fnArchive)
+        StringUtils.toFile(fnForm, json.dumps({'Variables': {}, 'Archive': fnArchive, 'Files': {f'{source}/': '*.txt'}}))
+        StringUtils.toFile(fnCommands, f'setup archive {fnForm}\n')
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            form2linux.main(['form2linux', '-y', 'batch', fnCommands])
+        # the global options of the batch are valid for each command:
+        self.assertFalse(os.path.exists(fnArchive))
+        self.assertTrue(output.getvalue().find(f'# would archive 1 entries into {fnArchive}') >= 0)
+        runner = BatchRunner.BatchRunner(Builder.GlobalOptions(2, True, None, '/tmp/plan.json', 3, True), None)
+        self.assertEqual(runner.argumentsOf('service check x.json'), [
+            'form2linux', '-v', '-v', '-y', '-n', '--plan=/tmp/plan.json', '--converge', '--jobs=3',
+            'service', 'check', 'x.json'])
+
+    def testBatchServer(self):
+        if inDebug(): return
+        fnSocket = FileHelper.tempFile('batch.sock', 'unittest')
+        fnDocument = FileHelper.tempFile('server.md', 'unittest')
+        StringUtils.toFile(fnDocument, 'Version:\n```\n0.1\n```\n')
+        if os.path.exists(fnSocket):
+            os.unlink(fnSocket)
+        thread = threading.Thread(target=form2linux.main, args=(['form2linux', 'batch', f'--server={fnSocket}'],),
+                                  daemon=True)
+        thread.start()
+        for _ in range(100):
+            if os.path.exists(fnSocket):
+                break
+            time.sleep(0.05)
+        self.assertEqual(os.stat(fnSocket).st_mode & 0o777, 0o600)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(fnSocket)
+            with client.makefile('rw', encoding='utf-8') as stream:
+                stream.write(f'text replace-range {fnDocument} -r 0.4 -a Version -n\nservice example\nshutdown\n')
+                stream.flush()
+                first = json.loads(stream.readline())
+                second = json.loads(stream.readline())
+        thread.join(10)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(first['ExitCode'], 0)
+        self.assertEqual(StringUtils.fromFile(fnDocument), 'Version:\n```\n0.4\n```\n')
+        self.assertEqual(second['ExitCode'], 0)
+        self.assertTrue(second['Output'].find('examplesv') > 0)
+        self.assertFalse(os.path.exists(fnSocket))
+
+    def testProfile(self):
+        if inDebug(): return
+        logger = MemoryLogger.MemoryLogger(3)
+        processHelper = ProcessHelper.ProcessHelper(logger)
+        fnProfile = FileHelper.tempFile('profile.json', 'unittest')
+        fnTable = FileHelper.tempFile('profile.txt', 'unittest')
+        serviceFile = '/tmp/examplesv.service'
+        existing = os.path.exists(serviceFile)
+        old = processHelper.pushd(os.path.join(os.path.dirname(__file__), 'service/test'))
+        form2linux.main(['form2linux', '-y', f'--profile-file={fnProfile}', 'service', 'install', 'service.json'])
+        form2linux.main(['form2linux', '-y', f'--profile-file={fnTable}', 'service', 'check', 'service.json'])
+        processHelper.popd(old)
+        # the dry mode writes the service file: other tests expect the former state
+        if not existing:
+            os.unlink(serviceFile)
+        data = json.loads(StringUtils.fromFile(fnProfile))
+        for name in ('form', 'validation', 'variables', 'staging'):
+            self.assertTrue(data['Phases'][name]['Count'] >= 1, name)
+        self.assertTrue(data['Wall'] >= data['Phases']['validation']['Wall'])
+        self.assertEqual(data['Processes'], [])
+        lines = StringUtils.fromFile(fnTable).split('\n')
+        self.assertTrue(lines[0].startswith('phase'))
+        self.assertTrue(any(line.startswith('total') for line in lines))
+        # the profiling ends with the command:
+        self.assertIsNone(Profiler.active())
+        former = Profiler.start()
+        builder = Builder.Builder(False, Builder.GlobalOptions(0, False, False))
+        builder.runProgram('true', False)
+        profiler = Profiler.stop(former)
+        self.assertEqual([item['Command'] for item in profiler.toJson()['Processes']], ['true'])
+        self.assertEqual(profiler.phases['subprocess'][0], 1)
@@ -8,11 +8,15 @@ Created on: 20.08.2023
 import re
 import os.path
 import json
+import pickle
+import shutil
+import subprocess
 import unittest
 import form2linux
 import Builder
 from base import StringUtils
 from base import FileHelper
+from base import DpkgStatus
 
 def inDebug(): return False
 
@@ -167,3 +171,104 @@ upload_max_filesize = 2M
 default_socket_timeout=600''')
 
 
+
+    def testInstallPackages(self):
+        if inDebug(): return
+        fnStatus = FileHelper.tempFile('dpkg.status', 'unittest')
+        StringUtils.toFile(fnStatus, '''Package: bash
+Status: install ok installed
+Architecture: amd64
+Version: 5.2.15-2+b2
+Description: GNU Bourne Again SHell
+ Bash is an sh-compatible command language interpreter.
+
+Package: oldpkg
+Status: deinstall ok config-files
+Version: 1.0
+
+Package: pinned
+Status: install ok installed
+Version: 1.0
+''')
+        self.assertEqual(DpkgStatus.readStatus(fnStatus), {'bash': '5.2.15-2+b2', 'bash:amd64': '5.2.15-2+b2',
+                                                           'pinned': '1.0'})
+        builder = Builder.Builder(True, Builder.GlobalOptions(True, True, False))
+        builder.setDpkgStatusFile(fnStatus)
+        builder.installPackages(['bash', 'bash:amd64', 'pinned=1.0'])
+        self.assertEqual(Builder.BuilderStatus.lastLogger().getMessages(), ['# all 3 package(s) already installed'])
+        state = FileHelper.tempDirectory('install.state', 'unittest')
+        shutil.rmtree(state)
+        builder.setStateDirectory(state)
+        builder.installPackages(['bash', 'oldpkg', 'pinned=1.1', 'pinned', 'newpkg'])
+        # the markers are written after the installation:
+        self.assertEqual(Builder.BuilderStatus.lastLogger().getMessages()[-4:], [
+            'sudo apt-get -y install oldpkg pinned=1.1 newpkg', f'# would write to {state}/installed/oldpkg',
+            f'# would write to {state}/installed/pinned', f'# would write to {state}/installed/newpkg'])
+        # plan only: nothing is written, the markers depend on the programs:
+        builder = Builder.Builder(True, Builder.GlobalOptions(True, False, False, plan='/tmp/unittest/install.plan.json'))
+        builder.setDpkgStatusFile(fnStatus)
+        builder.setStateDirectory(state)
+        with builder.planning() as plan:
+            builder.installPackages(['bash', 'newpkg'])
+        self.assertEqual([(op.kind, op.description) for op in plan.operations], [
+            ('run', 'apt-get update'), ('write', f'write {state}/last_update.mrk'),
+            ('run', 'apt-get -y install newpkg'), ('write', f'write {state}/installed/newpkg')])
+        self.assertEqual(plan.operations[1].depends, [plan.operations[0].ident])
+        self.assertEqual(plan.operations[1].args['fileMode'], 0o666)
+        self.assertFalse('fileMode' in plan.operations[3].args)
+        self.assertEqual(plan.operations[3].depends, [plan.operations[2].ident])
+        self.assertFalse(os.path.exists(state))
+
+    def testInstallPinnedFails(self):
+        if inDebug(): return
+        fnStatus = FileHelper.tempFile('dpkg.status.pinned', 'unittest')
+        StringUtils.toFile(fnStatus, 'Package: nginx\nStatus: install ok installed\nVersion: 1.22.1-8\n')
+        state = FileHelper.tempDirectory('pinned.state', 'unittest')
+        shutil.rmtree(state)
+        FileHelper.ensureDirectory(f'{state}/installed')
+        StringUtils.toFile(f'{state}/last_update.mrk', '')
+        builder = Builder.Builder(False, Builder.GlobalOptions(True, False, False))
+        builder.setDpkgStatusFile(fnStatus)
+        builder.setStateDirectory(state)
+        commands = []
+        def failingRun(command, asRoot, verbose, outputFile, separator):
+            commands.append(command)
+            raise subprocess.CalledProcessError(100, command)
+        builder._doRun = failingRun
+        with self.assertRaises(subprocess.CalledProcessError):
+            with builder.planning():
+                builder.installPackages(['nginx=1.22.1-9'])
+        self.assertEqual(commands, ['apt-get -y install nginx=1.22.1-9'])
+        # the failed installation is not recorded:
+        self.assertFalse(os.path.exists(f'{state}/installed/nginx'))
+        builder._doRun = lambda command, asRoot, verbose, outputFile, separator: commands.append(command)
+        with builder.planning():
+            builder.installPackages(['nginx=1.22.1-9'])
+        self.assertTrue(os.path.exists(f'{state}/installed/nginx'))
+        # the marker of the last update is writable for all:
+        os.unlink(f'{state}/last_update.mrk')
+        with builder.planning():
+            builder.updatePackages()
+        self.assertEqual(commands[-1], 'apt-get update')
+        self.assertEqual(os.stat(f'{state}/last_update.mrk').st_mode & 0o777, 0o666)
+
+    def testDpkgStatusCache(self):
+        if inDebug(): return
+        fnStatus = FileHelper.tempFile('dpkg.status2', 'unittest')
+        fnCache = FileHelper.tempFile('dpkg.pickle', 'unittest')
+        StringUtils.toFile(fnStatus, 'Package: bash\nStatus: install ok installed\nVersion: 5.2\n')
+        if os.path.exists(fnCache):
+            os.unlink(fnCache)
+        self.assertEqual(DpkgStatus.cachedStatus(fnStatus, fnCache), {'bash': '5.2'})
+        self.assertTrue(os.path.exists(fnCache))
+        # the second call reads the pickle file, not the status file:
+        with open(fnCache, 'rb') as fp:
+            key, _ = pickle.load(fp)
+        with open(fnCache, 'wb') as fp:
+            pickle.dump((key, {'cached': '1.0'}), fp)
+        DpkgStatus._memoryCache.clear()
+        self.assertEqual(DpkgStatus.cachedStatus(fnStatus, fnCache), {'cached': '1.0'})
+        # a changed status file invalidates the cache:
+        StringUtils.toFile(fnStatus, 'Package: bash\nStatus: install ok installed\nVersion: 5.3\n')
+        os.utime(fnStatus, ns=(key[1] + 10**9, key[1] + 10**9))
+        self.assertEqual(DpkgStatus.cachedStatus(fnStatus, fnCache), {'bash': '5.3'})
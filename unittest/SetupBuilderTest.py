@@ -5,13 +5,23 @@ Created on: 20.08.2023
     Author: SeaPlusPro
    License: CC0 1.0 Universal
 '''
+import os.path
 import json
 import re
+import time
+import random
+import tarfile
 import unittest
 import form2linux
 import Builder
+from Builder import CLIError
+import SetupBuilder
 import base.StringUtils
 import base.FileHelper
+from base import Sampler
+from base import ChunkStore
+from base import Archiver
+from base import AccountFiles
 
 def inDebug(): return False
 
@@ -122,6 +132,103 @@ sudo usermod -a -G sftdragon sys
 sudo usermod -a -G sftdragon adm
 ''')
 
+    def testAddStandardUsersBatch(self):
+        if inDebug(): return
+        Builder.BuilderStatus.underTest = True
+        # the form is archived in the state directory:
+        base.FileHelper.ensureDirectory('/tmp/unittest/forms')
+        base.FileHelper.ensureFileDoesNotExist('/tmp/unittest/stdroot')
+        etc = base.FileHelper.tempDirectory('stdroot/etc', 'unittest')
+        base.StringUtils.toFile(f'{etc}/passwd', 'root:x:0:0:root:/root:/bin/bash\n')
+        base.StringUtils.toFile(f'{etc}/group', 'root:x:0:\n')
+        base.StringUtils.toFile(f'{etc}/shadow', 'root:*:18366:0:99999:7:::\n')
+        base.StringUtils.toFile(f'{etc}/gshadow', 'root:*::\n')
+        fnForm = base.FileHelper.tempFile('stdusers.batch.json', 'unittest')
+        base.StringUtils.toFile(fnForm, '''{
+  "Variables": {
+  },
+  "Users": {
+    "bupsample": { "Uid": 230, "Gid": 230, "Home": "/srv/bupsample", "Shell": "/bin/bash", "Desc": "backup"},
+    "bupdefault": { "Uid": 231, "Gid": 230, "Home": "*", "Shell": "/bin/bash", "Desc": "default home"}
+  },
+  "Groups": {
+    "bupsample": 230
+  }
+}
+''')
+        form2linux.main(['form2linux', '-v', 'setup', 'add-standard-users', '--batch', f'--etc={etc}', fnForm])
+        Builder.BuilderStatus.underTest = False
+        homes = {}
+        for line in base.StringUtils.fromFile(f'{etc}/passwd').splitlines():
+            parts = line.split(':')
+            homes[parts[0]] = (parts[5], parts[6])
+        self.assertEqual(homes['bupsample'], ('/srv/bupsample', '/bin/bash'))
+        self.assertEqual(homes['bupdefault'], ('/home/bupdefault', '/bin/bash'))
+        self.assertTrue(os.path.isdir('/tmp/unittest/stdroot/srv/bupsample'))
+        self.assertTrue(os.path.isdir('/tmp/unittest/stdroot/home/bupdefault'))
+
+    def testAdaptUsersBatch(self):
+        if inDebug(): return
+        etc = base.FileHelper.tempDirectory('etc', 'unittest')
+        base.StringUtils.toFile(f'{etc}/passwd', 'root:x:0:0:root:/root:/bin/bash\nbin:x:2:2:bin:/bin:/usr/sbin/nologin\n')
+        base.StringUtils.toFile(f'{etc}/group', 'root:x:0:\nbin:x:2:\n')
+        base.StringUtils.toFile(f'{etc}/shadow', 'root:*:18366:0:99999:7:::\nbin:*:18092:0:99999:7:::\n', fileMode=0o640)
+        base.StringUtils.toFile(f'{etc}/gshadow', 'root:*::\nbin:*::\n')
+        fnPasswd = base.FileHelper.tempFile('passwd', 'unittest')
+        fnGroup = base.FileHelper.tempFile('group', 'unittest')
+        fnShadow = base.FileHelper.tempFile('shadow', 'unittest')
+        base.StringUtils.toFile(fnPasswd, '''root:x:0:0:root:/root:/bin/bash
+bin:x:2:2:bin:/bin:/usr/sbin/nologin
+hugo:x:1010:1010:Hugo Miller,,,:/tmp/unittest/home/hugo:/bin/bash
+eva:x:1011:1010::/tmp/unittest/home/eva:/bin/bash
+''')
+        base.StringUtils.toFile(fnGroup, '''root:x:0:
+bin:x:2:
+family:x:1010:hugo,eva,bin,unknown
+''')
+        base.StringUtils.toFile(fnShadow, '''root:*:18366:0:99999:7:::
+hugo:$6$VerySecret:19550:0:99999:7:::
+''')
+        # the homes are created below the parent of the account file directory:
+        base.FileHelper.ensureFileDoesNotExist('/tmp/unittest/tmp/unittest/home')
+        # a stale temporary file must not keep its mode while the new content is written:
+        base.StringUtils.toFile(f'{etc}/shadow+', '', fileMode=0o644)
+        with AccountFiles._openTemp(f'{etc}/shadow+') as fp:
+            self.assertEqual(os.fstat(fp.fileno()).st_mode & 0o777, 0o600)
+        with self.assertRaises(CLIError):
+            form2linux.main(['form2linux', '-v', 'setup', 'adapt-users', f'--etc={etc}', fnPasswd, fnGroup, fnShadow])
+        form2linux.main(['form2linux', '-v', 'setup', 'adapt-users', '--batch', f'--etc={etc}',
+                         fnPasswd, fnGroup, fnShadow])
+        logger = Builder.BuilderStatus.lastLogger()
+        lines = '\n'.join(logger.getMessages()) + '\n'
+        self.assertTrue(lines.find('+++ unknown member unknown of group family') >= 0)
+        self.assertTrue(lines.find('# batch: 1 group(s) 2 user(s) 3 membership(s)') >= 0)
+        self.assertEqual(base.StringUtils.fromFile(f'{etc}/group'), '''root:x:0:
+bin:x:2:
+family:x:1010:hugo,eva,bin
+''')
+        self.assertEqual(base.StringUtils.fromFile(f'{etc}/gshadow'), '''root:*::
+bin:*::
+family:!::hugo,eva,bin
+''')
+        self.assertEqual(base.StringUtils.fromFile(f'{etc}/passwd'), '''root:x:0:0:root:/root:/bin/bash
+bin:x:2:2:bin:/bin:/usr/sbin/nologin
+hugo:x:1010:1010:Hugo Miller,,,:/tmp/unittest/home/hugo:/bin/bash
+eva:x:1011:1010::/tmp/unittest/home/eva:/bin/bash
+''')
+        shadow = re.sub(r'^([^:]+:[^:]+):\d+:', r'\1:X:', base.StringUtils.fromFile(f'{etc}/shadow'), flags=re.M)
+        self.assertEqual(shadow, '''root:*:X:0:99999:7:::
+bin:*:X:0:99999:7:::
+hugo:$6$VerySecret:X:0:99999:7:::
+eva:!:X:0:99999:7:::
+''')
+        self.assertTrue(os.path.isdir('/tmp/unittest/tmp/unittest/home/eva'))
+        self.assertFalse(os.path.exists('/tmp/unittest/home/eva'))
+        # the mode of the original is kept:
+        self.assertEqual(os.stat(f'{etc}/shadow').st_mode & 0o777, 0o640)
+        self.assertTrue(os.path.exists(f'{etc}/passwd-'))
+        self.assertFalse(os.path.exists(f'{etc}/passwd.lock'))
+
     def testPatchShadow(self):
         if inDebug(): return
         fnShadow = base.FileHelper.tempFile('shadow', 'unittest')
@@ -150,6 +257,57 @@ hugo:$6$ChangedVAlue:19550:0:99999:7:::
 hugo2:$6$NoNoNo:19550:0:99999:7:::
 ''')
 
+    def testPatchShadowFromFile(self):
+        if inDebug(): return
+        fnShadow = base.FileHelper.tempFile('shadow', 'unittest')
+        base.StringUtils.toFile(fnShadow, '''root:$6$DasIstEinkomischesPasswort12345:18366:0:99999:7:::
+daemon:*:18092:0:99999:7:::
+hugo:$6$VerySecret:19550:0:99999:7:::
+hugo2:$6$NoNoNo:19550:0:99999:7:::
+''')
+        fnPasswords = base.FileHelper.tempFile('passwords', 'unittest')
+        base.StringUtils.toFile(fnPasswords, '''hugo:$6$ChangedValue
+hugo2:$6$NoNoNo:19550:0:99999:7:::
+eva:$6$Missing
+''')
+        form2linux.main(['form2linux', '-v', 'setup', 'patch-shadow', f'--from={fnPasswords}', f'--file={fnShadow}'])
+        logger = Builder.BuilderStatus.lastLogger()
+        lines = '\n'.join(logger.getMessages()) + '\n'
+        self.assertTrue(lines.find(f'# {fnShadow}: changed: 1 unchanged: 1 missing: 1') >= 0)
+        self.assertTrue(lines.find('# user not found: eva') >= 0)
+        lines = base.StringUtils.fromFile(fnShadow)
+        self.assertEquals(lines, '''root:$6$DasIstEinkomischesPasswort12345:18366:0:99999:7:::
+daemon:*:18092:0:99999:7:::
+hugo:$6$ChangedValue:19550:0:99999:7:::
+hugo2:$6$NoNoNo:19550:0:99999:7:::
+''')
+        self.assertFalse(os.path.exists(fnShadow + '+'))
+        self.assertFalse(os.path.exists(fnShadow + '.lock'))
+
+    def testPatchShadowDry(self):
+        if inDebug(): return
+        base.FileHelper.ensureFileDoesNotExist('/tmp/unittest/shadowdry')
+        directory = base.FileHelper.tempDirectory('shadowdry', 'unittest')
+        fnShadow = f'{directory}/shadow'
+        contents = 'root:*:18366:0:99999:7:::\nhugo:$6$VerySecret:19550:0:99999:7:::\n'
+        base.StringUtils.toFile(fnShadow, contents)
+        form2linux.main(['form2linux', '-v', '-y', 'setup', 'patch-shadow', 'hugo', '$6$Changed', f'--file={fnShadow}'])
+        logger = Builder.BuilderStatus.lastLogger()
+        self.assertTrue(logger.contains(f'# {fnShadow}: changed: 1 unchanged: 0 missing: 0'))
+        self.assertTrue(logger.contains(f'# dry mode: not written {fnShadow}'))
+        self.assertEqual(base.StringUtils.fromFile(fnShadow), contents)
+        # neither locked nor written:
+        self.assertEqual(sorted(os.listdir(directory)), ['shadow'])
+        if os.geteuid() != 0:
+            # the lock files cannot be created:
+            os.chmod(directory, 0o555)
+            try:
+                with self.assertRaises(CLIError):
+                    form2linux.main(['form2linux', '-v', 'setup', 'patch-shadow', 'hugo', '$6$Changed', f'--file={fnShadow}'])
+            finally:
+                os.chmod(directory, 0o755)
+            self.assertEqual(base.StringUtils.fromFile(fnShadow), contents)
+
     def testArchive(self):
         if inDebug(): return
         fnForm = base.FileHelper.tempFile('backup.json', 'unittest')
@@ -179,6 +337,141 @@ hugo2:$6$NoNoNo:19550:0:99999:7:::
         lines = '\n'.join(logger.getMessages()) + '\n'
         self.assertTrue(lines.find(f'sudo tar --zstd -cf /tmp/unittest/backup.tar.zst -C/ --files-from={fnArchive}'))
 
+    def testArchiveNative(self):
+        if inDebug(): return
+        fnForm = base.FileHelper.tempFile('native.json', 'unittest')
+        fnArchive = base.FileHelper.tempFile('native.tar.gz', 'unittest')
+        source = base.FileHelper.tempDirectory('native.src', 'unittest')
+        base.FileHelper.ensureDirectory(f'{source}/sub')
+        base.StringUtils.toFile(f'{source}/a.txt', 'a' * 1000)
+        base.StringUtils.toFile(f'{source}/b.txt', 'b')
+        base.StringUtils.toFile(f'{source}/sub/c.txt', 'c')
+        base.StringUtils.toFile(fnForm, '''{
+  "Variables": {
+    "SOURCE": "SRC"
+  },
+  "Archive": "ARCHIVE",
+  "ReadAhead": 2,
+  "Files": {
+      "%(SOURCE)/": "*.txt,sub,missing"
+  }
+}
+'''.replace('ARCHIVE', fnArchive).replace('SRC', source))
+        form2linux.main(['form2linux', '-v', 'setup', 'archive', fnForm])
+        with tarfile.open(fnArchive, 'r:gz') as tar:
+            names = sorted(tar.getnames())
+            self.assertEqual(tar.extractfile(f'{source[1:]}/a.txt').read(), b'a' * 1000)
+        self.assertEqual(names, [f'{source[1:]}/a.txt', f'{source[1:]}/b.txt', f'{source[1:]}/sub',
+                                 f'{source[1:]}/sub/c.txt'])
+        logger = Builder.BuilderStatus.lastLogger()
+        lines = '\n'.join(logger.getMessages())
+        self.assertTrue(lines.find(f'# {fnArchive}: 4 entries 1002 byte(s) errors: 0') >= 0)
+
+    def testArchiveIncremental(self):
+        if inDebug(): return
+        Builder.BuilderStatus.underTest = True
+        fnForm = base.FileHelper.tempFile('incremental.json', 'unittest')
+        # a clean start: e.g. d.txt of a former run would not be new
+        base.FileHelper.ensureFileDoesNotExist('/tmp/unittest/incremental.src')
+        source = base.FileHelper.tempDirectory('incremental.src', 'unittest')
+        base.FileHelper.ensureFileDoesNotExist('/tmp/unittest/snapshots/incremental.json')
+        for node in os.listdir('/tmp/unittest'):
+            if node.startswith('incremental.') and node.endswith('.tar'):
+                base.FileHelper.ensureFileDoesNotExist(f'/tmp/unittest/{node}')
+        base.StringUtils.toFile(f'{source}/a.txt', 'a')
+        base.StringUtils.toFile(f'{source}/b.txt', 'b')
+        base.StringUtils.toFile(f'{source}/c.txt', 'c')
+        base.StringUtils.toFile(fnForm, '''{
+  "Variables": {
+  },
+  "Archive": "/tmp/unittest/incremental.%datetime%.tar",
+  "Incremental": true,
+  "Hash": true,
+  "Files": {
+      "SRC/": "*.txt"
+  }
+}
+'''.replace('SRC', source))
+        form2linux.main(['form2linux', '-v', 'setup', 'archive', fnForm])
+        # new: d.txt changed: a.txt touched only: b.txt deleted: c.txt
+        base.StringUtils.toFile(f'{source}/a.txt', 'A')
+        os.utime(f'{source}/b.txt', (time.time() + 10, time.time() + 10))
+        os.unlink(f'{source}/c.txt')
+        base.StringUtils.toFile(f'{source}/d.txt', 'd')
+        time.sleep(1)
+        form2linux.main(['form2linux', '-v', 'setup', 'archive', fnForm])
+        form2linux.main(['form2linux', '-v', 'setup', 'archive-chain', fnForm])
+        logger = Builder.BuilderStatus.lastLogger()
+        chain = [line for line in logger.getMessages() if line.startswith('/tmp/unittest/incremental.')]
+        self.assertEqual(2, len(chain))
+        self.assertTrue(chain[0].find(' full ') > 0)
+        self.assertTrue(chain[1].find(' incremental ') > 0)
+        with tarfile.open(chain[1].split(' ')[0]) as tar:
+            self.assertEqual(sorted(tar.getnames()), [f'{source[1:]}/a.txt', f'{source[1:]}/d.txt'])
+            self.assertEqual(tar.pax_headers['F2L.deleted'], f'{source}/c.txt')
+            self.assertEqual(tar.pax_headers['F2L.type'], 'incremental')
+        Builder.BuilderStatus.underTest = False
+
+    def testChunkBoundaries(self):
+        if inDebug(): return
+        def reference(data):
+            # the gear hash byte by byte: the definition of the cut points
+            rc = []
+            start = 0
+            while start < len(data):
+                end = min(len(data), start + ChunkStore.MAX_CHUNK)
+                position = start + ChunkStore.MIN_CHUNK
+                value = 0
+                while position < end:
+                    value = ((value << 1) + ChunkStore.GEAR[data[position]]) & ChunkStore.MASK64
+                    position += 1
+                    if value & ChunkStore.CHUNK_MASK == 0:
+                        break
+                position = min(position, end)
+                rc.append(position)
+                start = position
+            return rc
+        generator = random.Random(4711)
+        for data in (generator.randbytes(1500000), bytes(600000), b'abcd' * 150000,
+                     bytes(generator.choice(b'ab') for _ in range(300000)), generator.randbytes(ChunkStore.MIN_CHUNK + 20)):
+            self.assertEqual(list(ChunkStore.chunkBoundaries(data)), reference(data))
+
+    def testArchiveChunks(self):
+        if inDebug(): return
+        fnForm = base.FileHelper.tempFile('chunks.json', 'unittest')
+        repository = '/tmp/unittest/chunks.repo'
+        source = base.FileHelper.tempDirectory('chunks.src', 'unittest')
+        base.FileHelper.ensureFileDoesNotExist(repository)
+        data = ''.join(f'line {ix}\n' for ix in range(20000))
+        base.StringUtils.toFile(f'{source}/profile1.txt', data)
+        base.StringUtils.toFile(f'{source}/profile2.txt', data)
+        base.StringUtils.toFile(fnForm, '''{
+  "Variables": {
+  },
+  "Repository": "REPO",
+  "Files": {
+      "SRC/": "*.txt"
+  }
+}
+'''.replace('SRC', source).replace('REPO', repository))
+        form2linux.main(['form2linux', '-v', 'setup', 'archive', fnForm])
+        logger = Builder.BuilderStatus.lastLogger()
+        lines = '\n'.join(logger.getMessages())
+        # the second file consists of known chunks:
+        self.assertTrue(re.search(r'unchanged files: 0 chunks: (\d+) new \1 known', lines) is not None)
+        time.sleep(0.01)
+        form2linux.main(['form2linux', '-v', 'setup', 'archive', fnForm])
+        logger = Builder.BuilderStatus.lastLogger()
+        lines = '\n'.join(logger.getMessages())
+        self.assertTrue(lines.find('unchanged files: 2 chunks: 0 new 0 known stored: 0 byte(s)') > 0)
+        manifests = os.listdir(f'{repository}/manifests')
+        self.assertEqual(2, len(manifests))
+        with open(f'{repository}/manifests/{sorted(manifests)[0]}', 'r', encoding='utf-8') as fp:
+            manifest = json.load(fp)
+        store = ChunkStore.ChunkStore(repository)
+        chunks = manifest['Files'][f'{source}/profile1.txt']['Chunks']
+        self.assertEqual(data.encode(), b''.join(store.readChunk(chunk) for chunk in chunks))
+
     def testExampleArchive(self):
         if inDebug(): return
         fnOutput = base.FileHelper.tempFile('archive.example', 'unittest')
@@ -241,3 +534,145 @@ sudo ps aux >/tmp/unittest/sysinfo/ps.txt
 sudo systemctl list-units >/tmp/unittest/sysinfo/systemctl.list-units.txt
 ''')
 
+    def testCollectSystemInfo(self):
+        if inDebug(): return
+        fnForm = base.FileHelper.tempFile('systeminfo2.json', 'unittest')
+        base.StringUtils.toFile(fnForm, '''{
+  "Variables": {
+    "STORAGE": "/tmp/unittest/sysinfo2"
+  },
+  "Parallel": 3,
+  "Timeout": 1,
+  "Summary": "%(STORAGE)/summary.json",
+  "Commands": {
+    "echo hello": "%(STORAGE)/echo.txt",
+    "sleep 10": "%(STORAGE)/sleep.txt",
+    "ls /does/not/exist": "%(STORAGE)/ls.txt",
+    "printf %s-%s a b": "%(STORAGE)/printf.txt"
+  }
+}
+''')
+        base.FileHelper.ensureFileDoesNotExist('/tmp/unittest/sysinfo2')
+        builder = SetupBuilder.SetupBuilder(Builder.GlobalOptions(True, False, False))
+        builder.checkSystemInfo(fnForm)
+        start = time.time()
+        builder.collectSystemInfo()
+        self.assertTrue(time.time() - start < 5)
+        self.assertEqual(base.StringUtils.fromFile('/tmp/unittest/sysinfo2/echo.txt'), 'hello\n')
+        self.assertEqual(base.StringUtils.fromFile('/tmp/unittest/sysinfo2/printf.txt'), 'a-b')
+        summary = json.loads(base.StringUtils.fromFile('/tmp/unittest/sysinfo2/summary.json'))
+        states = {item['Command']: item['Status'] for item in summary['Commands']}
+        self.assertEqual(states, {'echo hello': 'ok', 'sleep 10': 'timeout', 'ls /does/not/exist': 'error',
+                                  'printf %s-%s a b': 'ok'})
+        self.assertEqual(summary['Parallel'], 3)
+
+    def testCollectors(self):
+        if inDebug(): return
+        fnForm = base.FileHelper.tempFile('systeminfo3.json', 'unittest')
+        base.StringUtils.toFile(fnForm, '''{
+  "Variables": {
+    "STORAGE": "/tmp/unittest/sysinfo3"
+  },
+  "Commands": {
+    "@memory": "%(STORAGE)/memory.json",
+    "@mounts": "%(STORAGE)/mounts.json",
+    "@disks": "%(STORAGE)/disks.json",
+    "@load": "%(STORAGE)/load.json"
+  }
+}
+''')
+        base.FileHelper.ensureFileDoesNotExist('/tmp/unittest/sysinfo3')
+        builder = SetupBuilder.SetupBuilder(Builder.GlobalOptions(True, False, False))
+        builder.checkSystemInfo(fnForm)
+        builder.collectSystemInfo()
+        memory = json.loads(base.StringUtils.fromFile('/tmp/unittest/sysinfo3/memory.json'))
+        self.assertTrue(memory['MemTotal'] > 0)
+        mounts = json.loads(base.StringUtils.fromFile('/tmp/unittest/sysinfo3/mounts.json'))
+        self.assertTrue('/' in [item['Path'] for item in mounts])
+        disks = json.loads(base.StringUtils.fromFile('/tmp/unittest/sysinfo3/disks.json'))
+        self.assertTrue(disks[0]['Total'] >= disks[0]['Free'])
+        load = json.loads(base.StringUtils.fromFile('/tmp/unittest/sysinfo3/load.json'))
+        self.assertTrue(load['Processes'] > 0)
+
+    def testCollectorsUnknown(self):
+        if inDebug(): return
+        fnForm = base.FileHelper.tempFile('systeminfo4.json', 'unittest')
+        base.StringUtils.toFile(fnForm, '''{
+  "Variables": {
+  },
+  "Commands": {
+    "@nothing": ""
+  }
+}
+''')
+        builder = SetupBuilder.SetupBuilder(Builder.GlobalOptions(True, False, False))
+        with self.assertRaises(CLIError):
+            builder.checkSystemInfo(fnForm)
+
+    def testMonitor(self):
+        if inDebug(): return
+        fnStatistics = base.FileHelper.tempFile('monitor.json', 'unittest')
+        form2linux.main(['form2linux', '-v', 'setup', 'monitor', fnStatistics, '--interval=0.05', '--count=3', '--size=2'])
+        info = json.loads(base.StringUtils.fromFile(fnStatistics))
+        self.assertEqual(info['Samples'], 3)
+        self.assertEqual(info['Capacity'], 2)
+        self.assertEqual(sorted(info['Statistics'].keys()), sorted(Sampler.METRICS))
+        load = info['Statistics']['Load1']
+        self.assertTrue(load['Min'] <= load['Average'] <= load['Max'])
+
+    def testRestore(self):
+        if inDebug(): return
+        source = base.FileHelper.tempDirectory('restore.src', 'unittest')
+        target = base.FileHelper.tempDirectory('restore.trg', 'unittest')
+        base.FileHelper.ensureFileDoesNotExist(target)
+        base.FileHelper.ensureDirectory(f'{source}/sub')
+        base.StringUtils.toFile(f'{source}/a.txt', 'a')
+        base.StringUtils.toFile(f'{source}/sub/b.txt', 'b')
+        if not os.path.lexists(f'{source}/link'):
+            os.symlink('a.txt', f'{source}/link')
+        os.chmod(f'{source}/a.txt', 0o640)
+        os.utime(f'{source}/a.txt', (1700000000, 1700000000))
+        fnArchive = base.FileHelper.tempFile('restore.tar.gz', 'unittest')
+        with Archiver.TarWriter(fnArchive) as writer:
+            writer.add([source])
+        form2linux.main(['form2linux', '-v', 'setup', 'restore', fnArchive, f'--target={target}'])
+        restored = target + source
+        self.assertEqual(base.StringUtils.fromFile(f'{restored}/sub/b.txt'), 'b')
+        self.assertEqual(os.readlink(f'{restored}/link'), 'a.txt')
+        self.assertEqual(os.stat(f'{restored}/a.txt').st_mode & 0o777, 0o640)
+        self.assertEqual(os.stat(f'{restored}/a.txt').st_mtime, 1700000000)
+        base.StringUtils.toFile(f'{restored}/sub/b.txt', 'changed')
+        form2linux.main(['form2linux', '-v', 'setup', 'restore', fnArchive, f'--target={target}',
+                         f'--pattern={source}/sub'])
+        logger = Builder.BuilderStatus.lastLogger()
+        lines = '\n'.join(logger.getMessages())
+        self.assertTrue(lines.find('# restored: 1 unchanged: 0 deleted: 0') >= 0)
+        self.assertEqual(base.StringUtils.fromFile(f'{restored}/sub/b.txt'), 'b')
+        form2linux.main(['form2linux', '-v', 'setup', 'restore', fnArchive, f'--target={target}'])
+        logger = Builder.BuilderStatus.lastLogger()
+        lines = '\n'.join(logger.getMessages())
+        self.assertTrue(lines.find('# restored: 0 unchanged: 3 deleted: 0') >= 0)
+
+    def testRestoreManifest(self):
+        if inDebug(): return
+        repository = '/tmp/unittest/restore.repo'
+        source = base.FileHelper.tempDirectory('restore2.src', 'unittest')
+        target = base.FileHelper.tempDirectory('restore2.trg', 'unittest')
+        base.FileHelper.ensureFileDoesNotExist(target)
+        base.FileHelper.ensureFileDoesNotExist(repository)
+        data = ''.join(f'{ix}\n' for ix in range(50000))
+        base.StringUtils.toFile(f'{source}/big.txt', data)
+        with ChunkStore.ChunkStore(repository) as store:
+            manifest = store.store([f'{source}/big.txt'], 'restore2')
+        form2linux.main(['form2linux', '-v', 'setup', 'restore', manifest, f'--target={target}', '--parallel=2'])
+        self.assertEqual(base.StringUtils.fromFile(f'{target}{source}/big.txt'), data)
+
+    def testRingBuffer(self):
+        if inDebug(): return
+        buffer = Sampler.RingBuffer(3)
+        self.assertIsNone(buffer.statistics())
+        for value in (1.0, 2.0, 3.0, 4.0, 8.0):
+            buffer.append(value)
+        self.assertEqual(len(buffer), 3)
+        self.assertEqual(buffer.values(), [3.0, 4.0, 8.0])
+        self.assertEqual(buffer.statistics(), (3.0, 8.0, 5.0, 8.0))
@@ -0,0 +1,121 @@
+'''
+StructuredLoggerTest.py
+
+Created on: 19.10.2026
+    Author: SeaPlusPro
+   License: CC0 1.0 Universal
+'''
+import gc
+import io
+import json
+import unittest
+import contextlib
+import form2linux
+from base import Const
+from base import StructuredLogger
+
+
+def inDebug(): return False
+
+
+class Counter:
+    '''Counts the conversions into a string.'''
+
+    def __init__(self):
+        self.calls = 0
+
+    def __str__(self):
+        self.calls += 1
+        return 'counter'
+
+
+class StructuredLoggerTest(unittest.TestCase):
+
+    def testLazy(self):
+        if inDebug():
+            return
+        output = io.StringIO()
+        logger = StructuredLogger.StructuredLogger(Const.LEVEL_SUMMARY, Const.LEVEL_SUMMARY, output=output)
+        counter = Counter()
+        # neither written nor stored: not formatted
+        logger.log('%s', Const.LEVEL_DETAIL, counter)
+        self.assertEqual(counter.calls, 0)
+        logger.info('value: %s', counter)
+        self.assertEqual(counter.calls, 0)
+        self.assertEqual(logger.getMessages(), ['value: counter'])
+        self.assertEqual(counter.calls, 1)
+        self.assertTrue(logger.contains('value: c'))
+        # no arguments: a % is not a placeholder
+        logger.info('100%')
+        logger.flush()
+        self.assertEqual(output.getvalue(), 'value: counter\n100%\n')
+
+    def testRingBuffer(self):
+        if inDebug():
+            return
+        logger = StructuredLogger.StructuredLogger(0, capacity=3)
+        for ix in range(10):
+            logger.info('line %d', ix)
+        self.assertEqual(logger.getMessages(), ['line 7', 'line 8', 'line 9'])
+        logger.clear()
+        self.assertEqual(logger.getMessages(), [])
+        logger.info('new')
+        self.assertEqual(logger.getMessages(), ['new'])
+
+    def testBuffered(self):
+        if inDebug():
+            return
+        output = io.StringIO()
+        logger = StructuredLogger.StructuredLogger(Const.LEVEL_SUMMARY, bufferSize=3, output=output)
+        logger.info('a')
+        logger.info('b')
+        self.assertEqual(output.getvalue(), '')
+        logger.info('c')
+        self.assertEqual(output.getvalue(), 'a\nb\nc\n')
+        logger.info('d')
+        # an error is written at once, together with the buffered messages:
+        logger.error('wrong')
+        self.assertEqual(output.getvalue(), 'a\nb\nc\nd\n+++ wrong\n')
+        self.assertEqual(logger.errors(), 1)
+        logger.info('e')
+        StructuredLogger.StructuredLogger.flushAll()
+        self.assertEqual(output.getvalue(), 'a\nb\nc\nd\n+++ wrong\ne\n')
+
+    def testDestroyed(self):
+        if inDebug():
+            return
+        output = io.StringIO()
+        logger = StructuredLogger.StructuredLogger(Const.LEVEL_SUMMARY, output=output)
+        logger.info('last %s', 'words')
+        del logger
+        # the last created logger is referenced by Logger.globalLogger():
+        StructuredLogger.StructuredLogger()
+        gc.collect()
+        self.assertEqual(output.getvalue(), 'last words\n')
+
+    def testJsonLines(self):
+        if inDebug():
+            return
+        output = io.StringIO()
+        logger = StructuredLogger.StructuredLogger(Const.LEVEL_SUMMARY, jsonLines=True, output=output)
+        logger.info('%s -> %s', 'a', 'b')
+        logger.error('missing')
+        records = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual([(item['Level'], item['Message']) for item in records], [('info', 'a -> b'), ('error', 'missing')])
+        self.assertTrue(records[0]['Time'] > 0)
+
+    def testLogJsonOption(self):
+        if inDebug():
+            return
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            form2linux.main(['form2linux', '--log-json', 'service', 'example'])
+        # the multi line example is one record:
+        records = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]['Level'], 'info')
+        self.assertEqual(json.loads(records[0]['Message'])['Variables']['SERVICE'], 'examplesv')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+'''
+UnitTemplateTest.py
+
+Created on: 19.10.2026
+    Author: SeaPlusPro
+   License: CC0 1.0 Universal
+'''
+import os
+import time
+import unittest
+from text import UnitTemplate
+from base import StringUtils
+from base import FileHelper
+
+
+def inDebug(): return False
+
+
+class UnitTemplateTest(unittest.TestCase):
+
+    def testRender(self):
+        if inDebug():
+            return
+        template = UnitTemplate.UnitTemplate('''[Service]
+ExecStart={{Program}} --port={{Port}}
+?Group={{Group}}
+#?ExecReload={{Reload}}
+''')
+        self.assertEqual(template.fields, ['Program', 'Port', 'Group', 'Reload'])
+        self.assertEqual(template.render({'Program': '/usr/bin/x', 'Port': 80, 'Group': 'www', 'Reload': 'kill'}),
+                         '[Service]\nExecStart=/usr/bin/x --port=80\nGroup=www\nExecReload=kill\n')
+        self.assertEqual(template.render({'Program': '/usr/bin/x', 'Port': 80, 'Group': '', 'Reload': None}),
+                         '[Service]\nExecStart=/usr/bin/x --port=80\n# ExecReload=\n')
+
+    def testBuiltin(self):
+        if inDebug():
+            return
+        self.assertIs(UnitTemplate.templateOf('service'), UnitTemplate.templateOf('service'))
+        self.assertEqual(UnitTemplate.templateOf('timer').render({'Description': 'daily', 'OnCalendar': 'daily'}),
+                         '''[Unit]
+Description=daily
+[Timer]
+OnCalendar=daily
+[Install]
+WantedBy=timers.target
+''')
+        self.assertEqual(UnitTemplate.templateOf('socket').render({'Description': 'web', 'ListenStream': 8080}),
+                         '''[Unit]
+Description=web
+[Socket]
+ListenStream=8080
+[Install]
+WantedBy=sockets.target
+''')
+        self.assertEqual(UnitTemplate.templateOf('drop-in').render({'Section': 'Service', 'Settings': 'Nice=5'}),
+                         '[Service]\nNice=5\n')
+
+    def testTemplateFromFile(self):
+        if inDebug():
+            return
+        filename = FileHelper.tempFile('unit.template', 'unittest')
+        StringUtils.toFile(filename, 'A={{A}}\n')
+        template = UnitTemplate.templateFromFile(filename)
+        self.assertIs(template, UnitTemplate.templateFromFile(filename))
+        StringUtils.toFile(filename, 'B={{A}}\n')
+        os.utime(filename, ns=(time.time_ns(), time.time_ns() + 10**9))
+        self.assertEqual(UnitTemplate.templateFromFile(filename).render({'A': 1}), 'B=1\n')
+
+    def testHasChanged(self):
+        if inDebug():
+            return
+        filename = FileHelper.tempFile('unit.service', 'unittest')
+        if os.path.exists(filename):
+            os.unlink(filename)
+        self.assertTrue(UnitTemplate.hasChanged(filename, 'a=1\n'))
+        StringUtils.toFile(filename, 'a=1\n')
+        self.assertFalse(UnitTemplate.hasChanged(filename, 'a=1\n'))
+        self.assertTrue(UnitTemplate.hasChanged(filename, 'a=2\n'))
+        self.assertTrue(UnitTemplate.hasChanged(filename, 'a=12\n'))
+
+
+if __name__ == '__main__':
+    unittest.main()